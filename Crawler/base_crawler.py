@@ -0,0 +1,1533 @@
+#!/usr/bin/env python3
+"""
+Shared Firecrawl crawler core.
+
+BaseDocsCrawler holds everything the per-site crawlers have in common:
+filename mapping (see layout.py), markdown/frontmatter writing, the crawl modes (blocking,
+streaming, concurrent, changed-only and queue coordinator/worker, see
+work_queue.py) and the index file. Site-specific
+crawlers only supply defaults, usually from the site registry in sites.toml.
+"""
+
+import asyncio
+import sqlite3
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from catalog import CATALOG_FILENAME, DocsCatalog
+from checkpoint import CrawlCheckpoint
+from clients import CrawlClient, firecrawl_client
+from dataset_export import FORMATS as EXPORT_FORMATS, DatasetExporter, default_path, export_directory
+from frontmatter import iter_page_files, read_page, render_frontmatter
+from layout import LAYOUTS, display_name, page_filename, relative_filename, sharded_filename
+from manifest import CrawlManifest, content_hash, fetch_validators, probe_changed, parse_since
+from metrics import METRICS, add_metrics_arguments
+from page_writer import PageWriter, WriteResult, write_atomic
+from planner import CrawlPlan, PathFilter, SitemapEntry, fetch_sitemap, plan_crawl
+from ratelimit import HostRateLimiter, call_with_backoff, error_info, shared_limiter
+from scrape_cache import CachedClient, ScrapeCache, add_cache_arguments, cache_from_args
+from scrape_engine import ScrapeEngine, load_seed_file
+from search_index import SEARCH_FILENAME, SearchIndex
+from work_queue import (
+    DEFAULT_LEASE,
+    LeaseKeeper,
+    WorkQueue,
+    default_worker_id,
+    remove_worker_dir,
+    worker_dirs,
+    worker_state_dir,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: crawls of one directory are not locked
+    fcntl = None
+
+LOCK_FILENAME = '.crawl.lock'
+
+
+class PendingPage(NamedTuple):
+    """A page queued to the writer, recorded once it is on disk."""
+
+    url: str
+    filename: str
+    content: str
+    metadata: Optional[dict]
+    digest: str
+    size: int
+    saved_at: float
+    manifest_fields: dict
+
+
+class BaseDocsCrawler:
+    """Firecrawl-backed crawler shared by every documentation site."""
+    
+    def __init__(
+        self,
+        base_url: str,
+        output_dir: str,
+        api_key: Optional[str] = None,
+        limit: Optional[int] = None,
+        stream: bool = False,
+        poll_interval: int = 5,
+        concurrency: int = 8,
+        rate_per_host: float = 5.0,
+        rate_limiter: Optional[HostRateLimiter] = None,
+        index_title: Optional[str] = None,
+        write_index: bool = True,
+        collect_pages: bool = False,
+        resume: bool = False,
+        max_retries: int = 5,
+        rate_lock_dir: Optional[str] = None,
+        categorizer=None,
+        api_url: Optional[str] = None,
+        client: Optional[CrawlClient] = None,
+        write_workers: int = 2,
+        fsync: bool = True,
+        include_paths: Optional[List[str]] = None,
+        exclude_paths: Optional[List[str]] = None,
+        max_depth: Optional[int] = None,
+        sitemap_url: Optional[str] = None,
+        cache: Optional[ScrapeCache] = None,
+        layout: str = 'flat',
+        worker_id: Optional[str] = None,
+        exporter: Optional[DatasetExporter] = None,
+    ):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout: {layout!r} (use one of {', '.join(LAYOUTS)})")
+        self.base_url = base_url
+        self.output_dir = Path(output_dir)
+        self.layout = layout
+        self.limit = limit
+        self.stream = stream
+        self.poll_interval = poll_interval
+        self.concurrency = concurrency
+        self.rate_per_host = rate_per_host
+        self.max_retries = max_retries
+        # Crawlers in one process share a limiter (and with rate_lock_dir,
+        # processes share it too), so together they stay within the budget
+        self.rate_limiter = rate_limiter or shared_limiter(rate_per_host, rate_lock_dir)
+        self.index_title = index_title or f"{urlparse(base_url).netloc} Documentation"
+        self.write_index = write_index
+        self.collect_pages = collect_pages
+        self.resume = resume
+        # Optional sites.Categorizer used to record page categories in the catalog
+        self.categorizer = categorizer
+        # Scope of the crawl: path globs and depth below base_url
+        self.path_filter = PathFilter(base_url, include_paths or (), exclude_paths or (), max_depth)
+        self.sitemap_url = sitemap_url
+        # Optional dataset export fed with every page saved or found unchanged
+        self.exporter = exporter
+        self.failed_urls: List[str] = []
+        self.unchanged = 0
+        self.saved = 0
+        # Saved pages, kept only when collect_pages is set (e.g. for combining)
+        self.pages: List[dict] = []
+        # Pages saved without ETag/Last-Modified; fetched when the batch finishes
+        self._unvalidated: List[str] = []
+        # File names given out this run, by name; the catalog only has finished writes
+        self._filenames: Dict[str, str] = {}
+        
+        # Create output directory
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        # Queue workers save pages into output_dir but keep their own manifest,
+        # catalog and search index, which the coordinator merges
+        self.worker_id = worker_id
+        self.state_dir = worker_state_dir(self.output_dir, worker_id) if worker_id else self.output_dir
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest = CrawlManifest(self.state_dir)
+        # Page files are written atomically by background threads; the
+        # manifest, catalog and index are updated once a write is on disk
+        self.writer = PageWriter(write_workers, fsync=fsync)
+        # Never checkpoint past pages that are still queued
+        self.checkpoint = CrawlCheckpoint(self.output_dir, before_save=self._flush_writes)
+        self.catalog = DocsCatalog.for_directory(self.state_dir)
+        try:
+            self.search_index: Optional[SearchIndex] = SearchIndex.for_directory(self.state_dir)
+        except sqlite3.OperationalError as e:
+            # SQLite builds without FTS5 can still crawl, just not search
+            print(f"Warning: search index disabled ({e})")
+            self.search_index = None
+        
+        # Initialize Firecrawl client (any CrawlClient can be passed instead)
+        if not api_key:
+            raise ValueError("Firecrawl API key is required. Set FIRECRAWL_API_KEY in .env file or pass as argument.")
+        
+        self.firecrawl = client or firecrawl_client(api_key, api_url)
+        self.api_key = api_key
+        # Optional response cache; crawl jobs are cached in crawl_all/crawl_stream
+        self.cache = cache
+        if cache is not None:
+            self.firecrawl = CachedClient(self.firecrawl, cache)
+        
+        # Reused HTTP session for polling crawl status in streaming mode
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {api_key}',
+        })
+        # Separate session for conditional requests to the docs site itself,
+        # so the Firecrawl key is never sent to third parties
+        self.probe_session = requests.Session()
+        # Scrape engine (and its connection pool), created on first use and
+        # kept for later batches and runs
+        self._engine: Optional[ScrapeEngine] = None
+        
+    def start_run(self) -> None:
+        """
+        Reset the per-run counters before reusing the crawler for another run.
+        
+        The manifest stays in memory between runs; it is only read again if
+        another process changed it in the meantime.
+        """
+        self.failed_urls = []
+        self.unchanged = 0
+        self.saved = 0
+        self.pages = []
+        self._filenames = {}
+        if self.manifest.changed_on_disk():
+            self.manifest.reload()
+    
+    @contextmanager
+    def crawl_lock(self):
+        """
+        Held while the output directory is being crawled.
+        
+        Raises:
+            ValueError: If another crawl of the output directory is running
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(self.output_dir / LOCK_FILENAME, 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                raise ValueError(f"Another crawl of {self.output_dir} is running")
+            yield
+    
+    def close(self) -> None:
+        """Finish queued writes and release the crawler's connections and files."""
+        self._apply_writes(self.writer.close())
+        self._finish_batch()
+        if self._engine is not None:
+            self._engine.close()
+            self._engine = None
+        self.session.close()
+        self.probe_session.close()
+        self.catalog.close()
+        if self.search_index is not None:
+            self.search_index.close()
+    
+    def _url_to_filename(self, url: str) -> str:
+        """Name of a page's file relative to output_dir, in the crawler's layout."""
+        filename = page_filename(url, self.layout)
+        claimed = self._filenames.get(filename)
+        if claimed and claimed != url:
+            others = [claimed]
+        else:
+            others = [u for u in self.catalog.urls_for_filename(filename) if u != url]
+        if others:
+            if self.layout == 'sharded':
+                # Same slug and hash prefix: fall back to the full hash
+                return sharded_filename(url, hash_chars=64)
+            METRICS.incr('filename_collisions')
+            print(f"  Warning: {url} and {others[0]} are both saved as {filename}; "
+                  f"use --layout sharded to keep both")
+        return filename
+    
+    @METRICS.timed('save_markdown')
+    def save_markdown(
+        self,
+        url: str,
+        content: str,
+        metadata: Optional[dict] = None,
+        manifest_fields: Optional[dict] = None,
+    ) -> bool:
+        """
+        Queue markdown content to be written to a file.
+        
+        The file is written by the background writer; the manifest, catalog
+        and search index are updated once it is on disk.
+        
+        Args:
+            url: Source URL
+            content: Markdown content
+            metadata: Optional metadata dictionary
+            manifest_fields: Extra manifest fields, e.g. ETag validators
+            
+        Returns:
+            True if the page was queued (or unchanged), False otherwise
+        """
+        filename = self._url_to_filename(url)
+        self._filenames.setdefault(filename, url)
+        filepath = self.output_dir / filename
+        if filepath.parent != self.output_dir:
+            filepath.parent.mkdir(exist_ok=True)
+        digest = content_hash(content)
+        now = time.time()
+        manifest_fields = manifest_fields or {}
+        
+        # Record writes that finished in the meantime
+        self._apply_writes(self.writer.completed())
+        
+        if self.manifest.is_unchanged(url, digest, filepath):
+            entry = self.manifest.update(url, checked_at=now, **manifest_fields)
+            size = filepath.stat().st_size
+            category = self._catalog_page(url, filename, content, metadata, digest, size,
+                                          entry.get('crawled_at'), now)
+            self._index_page(url, filename, content, metadata, digest)
+            self._export_page(url, filename, content, metadata, digest, size, entry.get('crawled_at'), category)
+            self.unchanged += 1
+            METRICS.incr('pages_unchanged')
+            if not (entry.get('etag') or entry.get('last_modified') or 'etag' in manifest_fields):
+                self._unvalidated.append(url)
+            print(f"  = Unchanged: {filepath.name}")
+            return True
+        
+        try:
+            # Build frontmatter with source URL and metadata
+            frontmatter = render_frontmatter(url, metadata)
+            data = (frontmatter + content).encode('utf-8')
+            
+            with METRICS.span('save_markdown.queue'):
+                self.writer.write(
+                    filepath,
+                    data,
+                    PendingPage(url, filename, content, metadata, digest, len(data), now, manifest_fields),
+                )
+            return True
+        except Exception as e:
+            METRICS.incr('save_errors')
+            print(f"  ✗ Error saving {filepath}: {str(e)}")
+            return False
+    
+    def _apply_writes(self, results: List[WriteResult]) -> None:
+        """Record finished page writes in the manifest, catalog and search index."""
+        for filepath, page, error in results:
+            if error:
+                METRICS.incr('save_errors')
+                print(f"  ✗ Error saving {filepath}: {str(error)}")
+                self.failed_urls.append(page.url)
+                if self.collect_pages:
+                    self.pages = [p for p in self.pages if p['url'] != page.url]
+                continue
+            previous = (self.manifest.get(page.url) or {}).get('filename')
+            if previous and previous != page.filename:
+                self._forget_old_file(page.url, previous)
+            self.manifest.update(
+                page.url,
+                filename=page.filename,
+                content_hash=page.digest,
+                crawled_at=page.saved_at,
+                checked_at=page.saved_at,
+                **page.manifest_fields,
+            )
+            category = self._catalog_page(page.url, page.filename, page.content, page.metadata, page.digest,
+                                          page.size, page.saved_at, page.saved_at)
+            self._index_page(page.url, page.filename, page.content, page.metadata, page.digest)
+            self._export_page(page.url, page.filename, page.content, page.metadata, page.digest,
+                              page.size, page.saved_at, category)
+            if 'etag' not in page.manifest_fields:
+                self._unvalidated.append(page.url)
+            self.saved += 1
+            METRICS.incr('pages_saved')
+            METRICS.incr('bytes_written', page.size)
+            print(f"  ✓ Saved: {filepath.name}")
+    
+    def _forget_old_file(self, url: str, filename: str) -> None:
+        """Remove a page's file from before it moved, keeping its name as an alias."""
+        self.catalog.add_alias(filename, url)
+        if any(u != url for u in self.catalog.urls_for_filename(filename)):
+            # Another page is stored under the old name too
+            return
+        try:
+            (self.output_dir / filename).unlink()
+        except OSError:
+            pass
+    
+    @METRICS.timed('save_markdown.flush')
+    def _flush_writes(self) -> None:
+        """Wait for every queued page write and record it."""
+        self._apply_writes(self.writer.flush())
+    
+    @METRICS.timed('save_markdown.catalog')
+    def _catalog_page(
+        self,
+        url: str,
+        filename: str,
+        content: str,
+        metadata: Optional[dict],
+        digest: str,
+        size: int,
+        crawled_at: Optional[float],
+        checked_at: float,
+    ) -> Optional[str]:
+        """Record a saved page in the catalog and return its category."""
+        metadata = metadata or {}
+        title = str(metadata.get('title') or '').replace('\n', ' ')
+        category = None
+        if self.categorizer:
+            with METRICS.span('categorize'):
+                category = self.categorizer.categorize(
+                    url=url, title=title, filename=display_name(filename), content=content
+                )
+        self.catalog.upsert(
+            url,
+            filename=filename,
+            title=title,
+            description=str(metadata.get('description') or '').replace('\n', ' '),
+            content_hash=digest,
+            size=size,
+            crawled_at=crawled_at,
+            checked_at=checked_at,
+            category=category,
+        )
+        return category
+    
+    @METRICS.timed('save_markdown.search_index')
+    def _index_page(self, url: str, filename: str, content: str, metadata: Optional[dict], digest: str) -> None:
+        """Add a saved page to the search index unless it is already current."""
+        if self.search_index is None or self.search_index.is_current(url, digest):
+            return
+        title = str((metadata or {}).get('title') or '').replace('\n', ' ')
+        self.search_index.index_page(url, filename, title, content, digest)
+    
+    def _export_page(
+        self,
+        url: str,
+        filename: str,
+        content: str,
+        metadata: Optional[dict],
+        digest: str,
+        size: int,
+        crawled_at: Optional[float],
+        category: Optional[str],
+    ) -> None:
+        """Add a saved or unchanged page to the dataset export, if any."""
+        if self.exporter is None:
+            return
+        metadata = metadata or {}
+        self.exporter.add(
+            url=url,
+            filename=filename,
+            markdown=content,
+            title=str(metadata.get('title') or '').replace('\n', ' '),
+            description=str(metadata.get('description') or '').replace('\n', ' '),
+            category=category,
+            content_hash=digest,
+            size=size,
+            crawled_at=crawled_at,
+        )
+    
+    @METRICS.timed('finish_batch')
+    def _finish_batch(self) -> None:
+        """Persist the pages, manifest, catalog and search index at the end of a crawl or batch."""
+        self._flush_writes()
+        self._record_validators()
+        self.manifest.compact()
+        self.catalog.commit()
+        if self.search_index is not None:
+            self.search_index.commit()
+    
+    @METRICS.timed('probe.validators')
+    def _record_validators(self) -> None:
+        """
+        Record the ETag/Last-Modified of the pages saved without them.
+        
+        Firecrawl does not pass the site's validators on, so each page gets
+        one HEAD request. Without them, --changed-only would re-scrape every
+        page after a full crawl. A host that cannot be reached is not asked
+        again in this batch.
+        """
+        urls, self._unvalidated = self._unvalidated, []
+        if not urls:
+            return
+        unreachable = set()
+        
+        def fetch(url: str) -> Tuple[str, Optional[str], Optional[str]]:
+            host = urlparse(url).netloc
+            if host in unreachable:
+                return url, None, None
+            self.rate_limiter.bucket(host).acquire()
+            try:
+                return (url, *fetch_validators(self.probe_session, url))
+            except requests.RequestException:
+                unreachable.add(host)
+                return url, None, None
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, 8))) as executor:
+            for url, etag, last_modified in executor.map(fetch, urls):
+                if etag or last_modified:
+                    self.manifest.update(url, etag=etag, last_modified=last_modified)
+                    METRICS.incr('validators_recorded')
+    
+    def _api_bucket(self):
+        """Token bucket pacing requests to the Firecrawl API host."""
+        return self.rate_limiter.bucket(urlparse(self.firecrawl.api_url).netloc)
+    
+    def _report_retry(self, attempt: int, delay: float, error: Exception) -> None:
+        """Print a notice before a retry."""
+        status, _ = error_info(error)
+        METRICS.incr('retries')
+        METRICS.incr('retry_wait_seconds', delay)
+        if status == 429:
+            METRICS.incr('rate_limited')
+        reason = "Rate limit exceeded" if status == 429 else f"Request failed ({status or error.__class__.__name__})"
+        print(f"{reason}. Waiting {delay:.1f} seconds before retry {attempt + 2}/{self.max_retries + 1}...")
+    
+    @METRICS.timed('api.submit')
+    def _submit_with_retry(self, submit, crawl_params: dict):
+        """
+        Call a Firecrawl submit function, retrying on rate limits.
+        
+        Waits as long as the API's Retry-After/rate-limit headers ask, or
+        uses jittered exponential backoff when they are absent.
+        
+        Args:
+            submit: Firecrawl client method taking (url, params, ...)
+            crawl_params: Crawl parameters to pass through
+            
+        Returns:
+            The client result, or None if all attempts failed
+        """
+        try:
+            return call_with_backoff(
+                lambda: submit(crawl_params),
+                bucket=self._api_bucket(),
+                max_retries=self.max_retries,
+                on_retry=self._report_retry,
+            )
+        except Exception as e:
+            print(f"Error during crawl: {str(e)}")
+            return None
+    
+    @METRICS.timed('api.status')
+    def _get_job_status(self, job_id: str, skip: Optional[int] = None) -> dict:
+        """
+        Fetch a crawl job's status, retrying rate limits and transient errors.
+        
+        Raises:
+            requests.HTTPError: If the API returns an error status
+        """
+        status_url = f"{self.firecrawl.api_url}/v1/crawl/{job_id}"
+        params = {'skip': skip} if skip is not None else None
+        
+        def fetch() -> dict:
+            response = self.session.get(status_url, params=params, timeout=60)
+            response.raise_for_status()
+            return response.json()
+        
+        return call_with_backoff(
+            fetch,
+            bucket=self._api_bucket(),
+            max_retries=self.max_retries,
+            on_retry=self._report_retry,
+        )
+    
+    def _process_page(
+        self,
+        i: int,
+        page: dict,
+        total: Optional[int] = None,
+        manifest_fields: Optional[dict] = None,
+    ) -> Optional[str]:
+        """
+        Save a single page returned by Firecrawl.
+        
+        Args:
+            i: 1-based position of the page in the crawl
+            page: Page dictionary from Firecrawl
+            total: Total number of pages, if known
+            manifest_fields: Extra manifest fields to record with the page
+            
+        Returns:
+            The page URL if it was queued for writing or unchanged, None otherwise
+        """
+        url = page.get('metadata', {}).get('sourceURL', '') or page.get('url', '')
+        markdown = page.get('markdown', '')
+        metadata = page.get('metadata', {})
+        
+        if not url:
+            print(f"  ✗ Page {i}: No URL found, skipping")
+            return None
+        
+        if not markdown:
+            METRICS.incr('pages_empty')
+            print(f"  ✗ Page {i} ({url}): No markdown content")
+            self.failed_urls.append(url)
+            return None
+        
+        print(f"  [{i}/{total or '?'}] Processing: {url}")
+        if self.save_markdown(url, markdown, metadata, manifest_fields):
+            if self.collect_pages:
+                self.pages.append({'url': url, 'markdown': markdown, 'metadata': metadata})
+            return url
+        self.failed_urls.append(url)
+        return None
+    
+    def _summary_start(self) -> Tuple[int, int, int]:
+        """Saved, unchanged and failed counts for _print_summary to count from."""
+        return self.saved, self.unchanged, len(self.failed_urls)
+    
+    def _print_summary(self, total: int, start: Tuple[int, int, int]) -> None:
+        """
+        Print the end-of-crawl summary.
+        
+        A page only counts as saved once its file is written, so call this
+        after the writes are flushed.
+        
+        Args:
+            total: Number of pages received or requested
+            start: _summary_start() from before the pages were processed
+        """
+        saved = self.saved - start[0]
+        unchanged = self.unchanged - start[1]
+        failed_urls = self.failed_urls[start[2]:]
+        print(f"\n{'='*60}")
+        print(f"Crawling complete!")
+        print(f"Successfully saved: {saved}/{total}")
+        if unchanged:
+            print(f"Unchanged (not rewritten): {unchanged}")
+        print(f"Failed: {len(failed_urls)}")
+        
+        if failed_urls:
+            print(f"\nFailed URLs:")
+            for url in failed_urls:
+                print(f"  - {url}")
+    
+    @METRICS.timed('crawl_all')
+    def crawl_all(self) -> List[dict]:
+        """
+        Crawl all pages from the developer docs site using Firecrawl.
+        
+        The job ID is checkpointed as soon as the crawl is submitted, so an
+        interrupted run can be continued with `resume=True`.
+        """
+        if self.stream:
+            return self.crawl_stream()
+        
+        print(f"Starting crawl of {self.base_url}...")
+        print(f"Using Firecrawl API...")
+        if self.limit:
+            print(f"Limit: {self.limit} pages")
+        print()
+        
+        cached = self._cached_job()
+        if cached is not None:
+            return self._replay_cached_job(cached)
+        
+        job_id = self._start_job()
+        if not job_id:
+            return self.pages
+        
+        print("Waiting for the crawl job to complete...")
+        print("(This may take a few minutes depending on the site size)")
+        
+        try:
+            total = self._wait_for_job(job_id)
+        except KeyboardInterrupt:
+            print(f"\nInterrupted. Continue this crawl later with --resume (job {job_id})")
+            return self.pages
+        except Exception as e:
+            print(f"Error during crawl: {str(e)}")
+            print(f"The job is checkpointed; retry with --resume (job {job_id})")
+            return self.pages
+        
+        print(f"\nCrawl completed! Received {total} pages\n")
+        return self._consume_job(job_id, total)
+    
+    def _start_job(self) -> Optional[str]:
+        """
+        Submit a crawl job, or reattach to the checkpointed one when resuming.
+        
+        Returns:
+            The Firecrawl job ID, or None if no job could be started
+        """
+        previous = self.checkpoint.load()
+        if previous and self.checkpoint.matches(self.base_url):
+            if self.resume:
+                job_id = self.checkpoint.job_id
+                state = self._job_status(job_id)
+                if state is not None:
+                    print(f"Resuming crawl job {job_id} at page {self.checkpoint.cursor + 1} (status: {state})")
+                    return job_id
+                print(f"Checkpointed job {job_id} is no longer available, starting a new crawl")
+            else:
+                print(f"Found checkpoint for crawl job {self.checkpoint.job_id}; "
+                      f"pass --resume to continue it. Starting a new crawl.")
+        elif self.resume:
+            print("No checkpoint to resume from, starting a new crawl")
+        
+        crawl_params = self._crawl_params()
+        job = self._submit_with_retry(
+            lambda params: self.firecrawl.async_crawl_url(self.base_url, params=params),
+            crawl_params,
+        )
+        if not job or not job.get('id'):
+            print("Failed to submit crawl job.")
+            return None
+        
+        self.checkpoint.start(job['id'], self.base_url, crawl_params)
+        print(f"Submitted crawl job {job['id']}")
+        return job['id']
+    
+    def _crawl_params(self) -> dict:
+        """Parameters of the crawl job for this crawler's scope and limit."""
+        crawl_params = self.path_filter.crawl_params()
+        if self.limit:
+            crawl_params['limit'] = self.limit
+        return crawl_params
+    
+    def _cached_job(self) -> Optional[List[str]]:
+        """Pages of a cached crawl of the same scope, unless resuming or uncached."""
+        if self.cache is None or self.resume:
+            return None
+        return self.cache.job_pages(self.base_url, self._crawl_params())
+    
+    @METRICS.timed('crawl.replay')
+    def _replay_cached_job(self, digests: List[str]) -> List[dict]:
+        """Save the pages of a cached crawl job instead of submitting one."""
+        print(f"Replaying {len(digests)} pages from the response cache ({self.cache.directory})\n")
+        start = self._summary_start()
+        saved_urls: List[str] = []
+        for i, page in enumerate(self.cache.iter_job(digests), 1):
+            saved = self._process_page(i, page, len(digests))
+            if saved:
+                saved_urls.append(saved)
+        
+        self._finish_batch()
+        self._print_summary(len(digests), start)
+        self.create_index(saved_urls)
+        return self.pages
+    
+    def _job_status(self, job_id: str) -> Optional[str]:
+        """Return the status of a crawl job, or None if it no longer exists."""
+        try:
+            return self._get_job_status(job_id, skip=self.checkpoint.cursor).get('status')
+        except Exception:
+            return None
+    
+    @METRICS.timed('crawl.poll')
+    def _wait_for_job(self, job_id: str) -> int:
+        """
+        Poll a crawl job until it completes.
+        
+        Returns:
+            Total number of pages in the job
+        """
+        while True:
+            status = self._get_job_status(job_id)
+            state = status.get('status')
+            if state == 'completed':
+                return status.get('total') or status.get('completed') or 0
+            if state not in ('active', 'paused', 'pending', 'queued', 'waiting', 'scraping'):
+                raise Exception(f"Crawl job failed or was stopped. Status: {state}")
+            print(f"  ... {status.get('completed', 0)}/{status.get('total', '?')} pages scraped")
+            time.sleep(self.poll_interval)
+    
+    def _iter_crawl_pages(self, job_id: str, skip: int = 0) -> Iterator[dict]:
+        """
+        Yield pages of a crawl job as soon as Firecrawl has scraped them.
+        
+        Polls the job status endpoint with a `skip` cursor so each page is
+        fetched exactly once, and follows `next` links while a batch is
+        paginated instead of waiting for the whole job to finish.
+        
+        Args:
+            job_id: Firecrawl crawl job ID
+            skip: Number of pages to skip (already processed)
+            
+        Yields:
+            Page dictionaries in the same shape as `crawl_url` results
+        """
+        while True:
+            status = self._get_job_status(job_id, skip=skip)
+            batch = status.get('data') or []
+            
+            for page in batch:
+                yield page
+            skip += len(batch)
+            
+            state = status.get('status')
+            if batch and status.get('next'):
+                # More completed pages are waiting, fetch them right away
+                continue
+            if state == 'completed':
+                return
+            if state not in ('active', 'paused', 'pending', 'queued', 'waiting', 'scraping'):
+                raise Exception(f"Crawl job failed or was stopped. Status: {state}")
+            
+            time.sleep(self.poll_interval)
+    
+    @METRICS.timed('crawl.consume')
+    def _consume_job(self, job_id: str, total: Optional[int] = None) -> List[dict]:
+        """
+        Save every page of a crawl job from the checkpoint cursor onwards.
+        
+        The cursor is advanced after each page, so a crash or Ctrl-C only
+        repeats the pages since the last checkpoint write.
+        """
+        cursor = self.checkpoint.cursor
+        start = self._summary_start()
+        received = 0
+        completed = False
+        # Only a job consumed from its first page can be cached whole
+        recording = self.cache.begin_job(self.base_url, self._crawl_params()) if self.cache and not cursor else None
+        try:
+            for page in self._iter_crawl_pages(job_id, skip=cursor):
+                received += 1
+                if recording:
+                    self.cache.add_job_page(recording, received, page)
+                self._process_page(cursor + received, page, total)
+                self.checkpoint.advance(cursor + received)
+            completed = True
+            if recording:
+                self.cache.finish_job(recording)
+        except KeyboardInterrupt:
+            print(f"\nInterrupted. Continue this crawl later with --resume (job {job_id})")
+        except Exception as e:
+            print(f"Error during crawl: {str(e)}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            self.checkpoint.save()
+            self._finish_batch()
+        
+        if not completed:
+            print(f"Saved progress at page {self.checkpoint.cursor}; retry with --resume")
+            return self.pages
+        
+        if not cursor + received:
+            print("No pages returned from Firecrawl.")
+            self.checkpoint.clear()
+            return self.pages
+        
+        self._print_summary(received, start)
+        # Include pages saved by earlier, interrupted runs of the same job
+        self.create_index(self.manifest.fresh_urls(self.checkpoint.started_at))
+        self.checkpoint.clear()
+        return self.pages
+    
+    @METRICS.timed('crawl_stream')
+    def crawl_stream(self) -> List[dict]:
+        """
+        Crawl the docs site, saving each page as soon as Firecrawl returns it.
+        
+        Unlike the blocking mode, pages are never collected in memory; only
+        the saved URLs are kept for the index.
+        """
+        print(f"Starting streaming crawl of {self.base_url}...")
+        if self.limit:
+            print(f"Limit: {self.limit} pages")
+        print()
+        
+        cached = self._cached_job()
+        if cached is not None:
+            return self._replay_cached_job(cached)
+        
+        job_id = self._start_job()
+        if not job_id:
+            return self.pages
+        
+        print("Saving pages as they complete...\n")
+        return self._consume_job(job_id)
+    
+    @METRICS.timed('crawl_changed')
+    def crawl_changed(self, since: Optional[float] = None) -> List[dict]:
+        """
+        Re-scrape only pages that changed since the last crawl.
+        
+        Each URL in the manifest is first probed with a conditional request
+        against the live site; only pages that report a change are scraped
+        through single-page Firecrawl calls.
+        
+        Args:
+            since: Only consider pages last checked before this UNIX time
+        """
+        urls = self.manifest.stale_urls(since)
+        if not urls:
+            print("No previously crawled pages are due for a re-check.")
+            print("Run a full crawl first, or widen --since.")
+            return self.pages
+        
+        print(f"Checking {len(urls)} previously crawled pages for changes...\n")
+        
+        start = self._summary_start()
+        scraped = 0
+        for i, url in enumerate(urls, 1):
+            entry = self.manifest.get(url)
+            self.rate_limiter.bucket(urlparse(url).netloc).acquire()
+            with METRICS.span('probe'):
+                changed, etag, last_modified = probe_changed(self.probe_session, url, entry)
+            if not changed:
+                self.manifest.update(url, checked_at=time.time(), etag=etag, last_modified=last_modified)
+                self.unchanged += 1
+                print(f"  [{i}/{len(urls)}] = Not modified: {url}")
+                continue
+            
+            scraped += 1
+            page = self._submit_with_retry(
+                lambda params: self.firecrawl.scrape_url(url, params=params),
+                {'formats': ['markdown']},
+            )
+            if not page:
+                self.failed_urls.append(url)
+                continue
+            page.setdefault('metadata', {}).setdefault('sourceURL', url)
+            # The validators are only recorded once the new content is on disk
+            validators = {'etag': etag, 'last_modified': last_modified}
+            self._process_page(i, page, len(urls), validators)
+        
+        self._finish_batch()
+        print(f"\nScraped {scraped} changed pages")
+        self._print_summary(scraped, start)
+        self.create_index(sorted(self.manifest.entries))
+        return self.pages
+    
+    def discover_urls(self) -> List[str]:
+        """
+        List the site's URLs with a Firecrawl map call.
+        
+        Returns:
+            Discovered URLs within the include/exclude paths and depth,
+            capped at `limit` if set
+        """
+        params = {}
+        # With path filters the cap applies after filtering
+        if self.limit and not self.path_filter.active:
+            params['limit'] = self.limit
+        links = self._map_links(params)
+        if self.path_filter.active:
+            links = [url for url in links if not self.path_filter.rejects(url)]
+        return links[:self.limit] if self.limit else links
+    
+    def _map_links(self, params: dict) -> List[str]:
+        """Run a Firecrawl map call of base_url and return the links."""
+        result = self._submit_with_retry(
+            lambda p: self.firecrawl.map_url(self.base_url, params=p),
+            params,
+        )
+        if not result:
+            return []
+        return result.get('links', []) if isinstance(result, dict) else list(result)
+    
+    @METRICS.timed('plan')
+    def plan(self) -> CrawlPlan:
+        """
+        Plan a crawl from the site's sitemap (or a map call if it has none).
+        
+        Returns:
+            The pages in scope and the ones among them that need scraping
+        """
+        def throttle(url: str) -> None:
+            self.rate_limiter.bucket(urlparse(url).netloc).acquire()
+        
+        print(f"Reading the sitemap of {self.base_url}...")
+        source, entries = fetch_sitemap(self.probe_session, self.base_url, self.sitemap_url, throttle)
+        map_calls = 0
+        if not entries:
+            print("No sitemap found, listing pages with a Firecrawl map call...")
+            entries = [SitemapEntry(url) for url in self._map_links({})]
+            source = f"Firecrawl map of {self.base_url}"
+            map_calls = 1
+        
+        plan = plan_crawl(entries, self.path_filter, self.manifest, self.output_dir, source, self.limit)
+        plan.map_calls = map_calls
+        return plan
+    
+    @METRICS.timed('crawl_planned')
+    def crawl_planned(self) -> List[dict]:
+        """
+        Scrape only the new and updated pages of the site's sitemap.
+        
+        Pages outside the include/exclude paths or beyond max_depth are
+        never requested, and pages whose <lastmod> is not newer than their
+        last scrape are kept as they are.
+        """
+        plan = self.plan()
+        print(plan.summary())
+        print()
+        self.unchanged += plan.unchanged
+        METRICS.incr('pages_planned', len(plan.to_scrape))
+        METRICS.incr('pages_skipped_unchanged', plan.unchanged)
+        
+        if plan.to_scrape:
+            # The sitemap date is kept so the next plan compares against it
+            fields = {url: {'lastmod': plan.lastmod[url]} for url in plan.to_scrape if url in plan.lastmod}
+            self._scrape_urls(plan.to_scrape, fields)
+        else:
+            print("Every page in scope is unchanged, nothing to scrape.")
+        
+        self.create_index([url for url in plan.urls if self.manifest.get(url)])
+        return self.pages
+    
+    @METRICS.timed('crawl_concurrent')
+    def crawl_concurrent(self, urls: Optional[List[str]] = None) -> List[dict]:
+        """
+        Scrape pages one URL at a time with a bounded pool of workers.
+        
+        Args:
+            urls: URLs to scrape; discovered with a map call if omitted
+        """
+        if urls is None:
+            print(f"Mapping {self.base_url}...")
+            urls = self.discover_urls()
+        if not urls:
+            print("No URLs to scrape.")
+            return self.pages
+        
+        self.create_index(self._scrape_urls(urls))
+        return self.pages
+    
+    def _scrape_urls(
+        self,
+        urls: List[str],
+        manifest_fields: Optional[Dict[str, dict]] = None,
+        outcomes: Optional[Dict[str, Optional[str]]] = None,
+    ) -> List[str]:
+        """
+        Scrape and save a list of URLs with the concurrent scrape engine.
+        
+        Args:
+            urls: URLs to scrape
+            manifest_fields: Extra manifest fields by URL
+            outcomes: Filled with the saved page URL (or None) by requested URL
+        
+        Returns:
+            URLs of the saved pages
+        """
+        manifest_fields = manifest_fields or {}
+        print(f"Scraping {len(urls)} pages with concurrency {self.concurrency}...\n")
+        
+        if self._engine is None:
+            self._engine = ScrapeEngine(
+                api_key=self.api_key,
+                api_url=self.firecrawl.api_url,
+                concurrency=self.concurrency,
+                max_retries=self.max_retries,
+                rate_limiter=self.rate_limiter,
+                cache=self.cache,
+            )
+        start = self._summary_start()
+        saved_urls: List[str] = []
+        done = 0
+        
+        def on_result(url: str, page: Optional[dict], error: Optional[Exception]) -> None:
+            nonlocal done
+            done += 1
+            if error:
+                METRICS.incr('scrape_errors')
+                print(f"  ✗ Page {done} ({url}): {error}")
+                self.failed_urls.append(url)
+                saved = None
+            else:
+                saved = self._process_page(done, page, len(urls), manifest_fields.get(url))
+            if saved:
+                saved_urls.append(saved)
+            if outcomes is not None:
+                outcomes[url] = saved
+        
+        asyncio.run(self._engine.run(urls, on_result))
+        
+        self._finish_batch()
+        self._print_summary(len(urls), start)
+        return saved_urls
+    
+    @METRICS.timed('coordinate')
+    def coordinate(
+        self,
+        queue: WorkQueue,
+        urls: Optional[List[str]] = None,
+        workers: int = 0,
+        command: Optional[List[str]] = None,
+        poll_interval: float = 1.0,
+    ) -> List[dict]:
+        """
+        Queue the pages to scrape for worker processes and merge their results.
+        
+        Waits until every queued URL is done or failed, then merges the
+        workers' manifests, catalogs and search indexes into the output
+        directory's and writes the index. If URLs of an interrupted run are
+        still queued, that run is finished instead of planning a new one.
+        
+        Args:
+            queue: Work queue of the output directory
+            urls: URLs to scrape; planned from the sitemap (or a map call) if omitted
+            workers: Local worker processes to start
+            command: Command line of a local worker
+            poll_interval: Seconds between progress checks
+        """
+        # Pages saved by an earlier run's workers count as crawled
+        self.merge_workers(queue)
+        if not queue.drained():
+            print(f"Resuming the crawl queued in {queue.path}")
+            scope, to_scrape, fields = None, [], {}
+        elif urls is None:
+            plan = self.plan()
+            print(plan.summary())
+            self.unchanged += plan.unchanged
+            scope, to_scrape = plan.urls, plan.to_scrape
+            fields = {url: {'lastmod': plan.lastmod[url]} for url in to_scrape if url in plan.lastmod}
+        else:
+            scope, to_scrape, fields = urls, urls, {}
+        if to_scrape:
+            queued = queue.enqueue(to_scrape, fields)
+            METRICS.incr('pages_queued', queued)
+            print(f"\nQueued {queued} URLs in {queue.path}")
+        
+        processes = []
+        if workers and command:
+            print(f"Starting {workers} local workers...")
+            processes = [subprocess.Popen(command) for _ in range(workers)]
+        elif not queue.live_workers() and not queue.drained():
+            print("Waiting for workers (run the same command with --worker instead of --coordinate)...")
+        
+        last = None
+        try:
+            while not queue.drained():
+                counts = queue.counts()
+                if counts != last:
+                    print(f"  Queue: {counts['pending']} pending, {counts['leased']} leased, "
+                          f"{counts['done']} done, {counts['failed']} failed "
+                          f"({len(queue.live_workers())} workers)")
+                    last = counts
+                if processes and all(p.poll() is not None for p in processes):
+                    print("✗ Every local worker exited before the queue was drained; "
+                          "run more workers and coordinate again to finish")
+                    break
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+            raise
+        finally:
+            for process in processes:
+                process.wait()
+        
+        merged = self.merge_workers(queue)
+        print(f"\nMerged {merged} page records from the workers")
+        for row in queue.failed():
+            self.failed_urls.append(row['url'])
+            print(f"  ✗ Failed after {row['attempts']} attempts: {row['url']} ({row['error']})")
+        if scope is None:
+            scope = sorted(self.manifest.entries)
+        self.create_index([url for url in scope if self.manifest.get(url)])
+        return self.pages
+    
+    @METRICS.timed('merge_workers')
+    def merge_workers(self, queue: WorkQueue) -> int:
+        """
+        Merge every queue worker's manifest, catalog and search index into ours.
+        
+        State directories of workers that stopped or died are removed once
+        merged; those of running workers are kept and merged again later.
+        
+        Returns:
+            Number of manifest records taken over
+        """
+        running = {w['worker'] for w in queue.live_workers()}
+        merged = 0
+        for state_dir in worker_dirs(self.output_dir):
+            if state_dir == self.state_dir:
+                continue
+            merged += self.manifest.merge(CrawlManifest(state_dir))
+            if (state_dir / CATALOG_FILENAME).exists():
+                self.catalog.merge(state_dir / CATALOG_FILENAME)
+            if self.search_index is not None and (state_dir / SEARCH_FILENAME).exists():
+                self.search_index.merge(state_dir / SEARCH_FILENAME)
+            if state_dir.name not in running:
+                remove_worker_dir(state_dir)
+        self._finish_batch()
+        return merged
+    
+    @METRICS.timed('work')
+    def work(self, queue: WorkQueue, batch_size: Optional[int] = None) -> List[dict]:
+        """
+        Scrape URLs from the work queue until it is drained.
+        
+        URLs are leased in batches and the leases renewed while the batch is
+        scraped; if this process dies they expire and other workers take
+        the URLs over.
+        
+        Args:
+            queue: Work queue of the output directory
+            batch_size: URLs leased at a time (default: four times the concurrency)
+        """
+        worker = self.worker_id or default_worker_id()
+        batch_size = batch_size or self.concurrency * 4
+        queue.register_worker(worker)
+        print(f"Worker {worker} scraping from {queue.path} in batches of {batch_size}")
+        saved = 0
+        try:
+            with LeaseKeeper(queue, worker):
+                while True:
+                    tasks = queue.claim(worker, batch_size)
+                    if not tasks:
+                        if queue.drained():
+                            break
+                        # Other workers hold the rest; their leases may still expire
+                        time.sleep(min(1.0, queue.lease_seconds / 3))
+                        continue
+                    
+                    urls = [task.url for task in tasks]
+                    fields = {task.url: task.fields for task in tasks if task.fields}
+                    first_failure = len(self.failed_urls)
+                    outcomes: Dict[str, Optional[str]] = {}
+                    self._scrape_urls(urls, fields, outcomes)
+                    # Pages whose write failed are only known after the batch is flushed
+                    write_failures = set(self.failed_urls[first_failure:])
+                    done = {url for url in urls if outcomes.get(url) and outcomes[url] not in write_failures}
+                    queue.complete(worker, sorted(done))
+                    failed = [url for url in urls if url not in done]
+                    if failed:
+                        queue.fail(worker, failed, 'scrape or save failed')
+                    saved += len(done)
+        except BaseException:
+            queue.release(worker)
+            raise
+        finally:
+            queue.stop_worker(worker)
+        print(f"\nWorker {worker} finished: {saved} pages saved")
+        return self.pages
+    
+    @METRICS.timed('create_index')
+    def create_index(self, urls: List[str]) -> None:
+        """Create an index markdown file listing all crawled pages."""
+        if not self.write_index:
+            return
+        
+        # Filter out empty URLs
+        urls = [u for u in urls if u]
+        # Titles and filenames come from the catalog rather than the files
+        self.catalog.commit()
+        entries = self.catalog.get_many(urls)
+        
+        index_content = f"""# {self.index_title}
+
+This directory contains the crawled markdown files from {self.base_url}
+
+## Pages
+
+"""
+        for url in sorted(urls):
+            entry = entries.get(url) or {}
+            filename = entry.get('filename') or self._url_to_filename(url)
+            # Use the page title, or a readable title from the filename
+            title = entry.get('title') or display_name(filename).replace('.md', '').replace('_', ' ').title()
+            index_content += f"- [{title}]({filename}) - `{url}`\n"
+        
+        index_content += f"\n---\n\nTotal pages: {len(urls)}\n"
+        index_content += f"Crawled at: {time.strftime('%Y-%m-%d %H:%M:%S')}\n"
+        
+        index_path = self.output_dir / "INDEX.md"
+        write_atomic(index_path, index_content.encode('utf-8'), fsync=self.writer.fsync)
+        print(f"\nCreated index: {index_path}")
+
+
+def load_existing_pages(output_dir: Path) -> List[dict]:
+    """Load previously saved pages from an output directory."""
+    pages = []
+    
+    for md_file in iter_page_files(output_dir):
+        if md_file.name.startswith('combined_') or md_file.name.startswith('0'):
+            continue
+        try:
+            meta, content = read_page(md_file)
+            pages.append({
+                'url': meta.source_url or str(md_file),
+                'markdown': content.strip(),
+                'metadata': {'title': meta.title},
+                'filename': relative_filename(md_file, output_dir),
+            })
+        except Exception as e:
+            print(f"Error reading {md_file}: {e}")
+    
+    return pages
+
+
+def add_crawl_arguments(parser, output_dir: Optional[str] = None) -> None:
+    """Add the command line options shared by every crawler entry point."""
+    if output_dir is not None:
+        parser.add_argument(
+            '--output-dir',
+            default=output_dir,
+            help=f'Output directory for markdown files (default: {output_dir})'
+        )
+    parser.add_argument(
+        '--api-key',
+        default=None,
+        help='Firecrawl API key (or set FIRECRAWL_API_KEY in .env file)'
+    )
+    parser.add_argument(
+        '--limit',
+        type=int,
+        default=None,
+        help='Limit the number of pages to crawl (default: no limit)'
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Save pages as soon as Firecrawl completes them instead of waiting for the whole crawl'
+    )
+    parser.add_argument(
+        '--changed-only',
+        action='store_true',
+        help='Only re-scrape previously crawled pages that changed (uses the crawl manifest)'
+    )
+    parser.add_argument(
+        '--since',
+        default=None,
+        help='With --changed-only, only re-check pages last checked before this time (e.g. 12h, 7d, 2025-11-01)'
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=None,
+        help='Scrape pages individually with this many requests in flight instead of one crawl job'
+    )
+    parser.add_argument(
+        '--seed-file',
+        default=None,
+        help='File with one URL per line to scrape concurrently (default: discover with a map call)'
+    )
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=5.0,
+        help='Maximum requests per second per host (default: 5)'
+    )
+    parser.add_argument(
+        '--rate-lock-dir',
+        default=None,
+        help='Directory of lock files used to share the rate limit between processes'
+    )
+    parser.add_argument(
+        '--max-retries',
+        type=int,
+        default=5,
+        help='Retries for rate-limited or failed API requests (default: 5)'
+    )
+    parser.add_argument(
+        '--api-url',
+        default=None,
+        help='Firecrawl API base URL, e.g. a self-hosted or fake_firecrawl.py server (or set FIRECRAWL_API_URL)'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Reattach to the checkpointed crawl job and continue where the last run stopped'
+    )
+    parser.add_argument(
+        '--include',
+        action='append',
+        default=None,
+        metavar='GLOB',
+        help='Only crawl URL paths matching this glob, e.g. "/developers/**" (repeatable; default: include_paths in sites.toml)'
+    )
+    parser.add_argument(
+        '--exclude',
+        action='append',
+        default=None,
+        metavar='GLOB',
+        help='Never crawl URL paths matching this glob, e.g. "**/changelog/**" (repeatable; default: exclude_paths in sites.toml)'
+    )
+    parser.add_argument(
+        '--max-depth',
+        type=int,
+        default=None,
+        help='Only crawl pages at most this many path segments below the base URL'
+    )
+    parser.add_argument(
+        '--sitemap',
+        nargs='?',
+        const='',
+        default=None,
+        metavar='URL',
+        help='Plan the crawl from the sitemap (found automatically unless given) and only scrape new or updated pages'
+    )
+    parser.add_argument(
+        '--plan',
+        action='store_true',
+        help='Print which pages a sitemap-planned crawl would scrape and the estimated credits, then exit'
+    )
+    queue_mode = parser.add_mutually_exclusive_group()
+    queue_mode.add_argument(
+        '--coordinate',
+        action='store_true',
+        help='Queue the planned pages (or --seed-file URLs) for --worker processes, wait for them and merge their results'
+    )
+    queue_mode.add_argument(
+        '--worker',
+        action='store_true',
+        help='Scrape URLs from the work queue in the output directory until it is drained'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=0,
+        help='With --coordinate, also start this many local worker processes'
+    )
+    parser.add_argument(
+        '--lease',
+        type=float,
+        default=DEFAULT_LEASE,
+        help=f'Seconds before the URLs of an unresponsive worker are handed to another (default: {DEFAULT_LEASE:.0f})'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=None,
+        help='URLs a worker leases at a time (default: four times --concurrency)'
+    )
+    parser.add_argument(
+        '--export',
+        choices=EXPORT_FORMATS,
+        default=None,
+        help='Also write the pages of this run as one dataset file: gzipped JSON lines, or Parquet (needs pyarrow)'
+    )
+    parser.add_argument(
+        '--export-path',
+        default=None,
+        help='Dataset file for --export (default: pages.jsonl.gz or pages.parquet in the output directory)'
+    )
+    parser.add_argument(
+        '--no-fsync',
+        action='store_true',
+        help='Do not fsync written pages (faster; a power loss may lose the last pages, never corrupt them)'
+    )
+    parser.add_argument(
+        '--layout',
+        choices=LAYOUTS,
+        default=None,
+        help='Page file layout: flat, or sharded with collision-free hashed names (default: layout in sites.toml, else flat)'
+    )
+    add_cache_arguments(parser)
+    add_metrics_arguments(parser)
+
+
+def crawler_options(args) -> dict:
+    """
+    Translate parsed shared arguments into BaseDocsCrawler keyword arguments.
+    
+    Raises:
+        ValueError: If --cache-ttl or --cache-max-size cannot be parsed
+    """
+    options = {
+        'limit': args.limit,
+        'stream': args.stream,
+        'concurrency': args.concurrency or 8,
+        'rate_per_host': args.rate,
+        'resume': args.resume,
+        'max_retries': args.max_retries,
+        'rate_lock_dir': args.rate_lock_dir,
+        'api_url': args.api_url,
+        'fsync': not args.no_fsync,
+        'cache': cache_from_args(args),
+    }
+    # Scope options are only passed when given, so site defaults still apply
+    if args.include:
+        options['include_paths'] = args.include
+    if args.exclude:
+        options['exclude_paths'] = args.exclude
+    if args.max_depth is not None:
+        options['max_depth'] = args.max_depth
+    if args.sitemap:
+        options['sitemap_url'] = args.sitemap
+    if args.layout:
+        options['layout'] = args.layout
+    if args.worker:
+        options['worker_id'] = default_worker_id()
+    return options
+
+
+# Options of the coordinator that its local workers must not inherit
+_COORDINATOR_ONLY = {'--coordinate', '--plan'}
+_COORDINATOR_ONLY_WITH_VALUE = {
+    '--workers', '--metrics-json', '--metrics-prom', '--profile', '--export', '--export-path',
+}
+
+
+def worker_command(argv: Optional[List[str]] = None) -> List[str]:
+    """The coordinator's command line turned into a queue worker's."""
+    argv = list(sys.argv if argv is None else argv)
+    command = [sys.executable, argv[0]]
+    args = iter(argv[1:])
+    for arg in args:
+        name, has_value, _ = arg.partition('=')
+        if arg in _COORDINATOR_ONLY or (has_value and name in _COORDINATOR_ONLY_WITH_VALUE):
+            continue
+        if arg in _COORDINATOR_ONLY_WITH_VALUE:
+            next(args, None)
+            continue
+        command.append(arg)
+    return command + ['--worker']
+
+
+def run_crawler(crawler: BaseDocsCrawler, args) -> List[dict]:
+    """
+    Run the crawl mode selected on the command line.
+    
+    Raises:
+        ValueError: If --since cannot be parsed, another crawl of the
+            output directory is running or the --export format cannot be written
+    """
+    since = parse_since(args.since) if args.since else None
+    
+    if args.plan:
+        print(crawler.plan().summary())
+        return crawler.pages
+    
+    # Workers share the directory with their coordinator, which holds the lock
+    with nullcontext() if args.worker else crawler.crawl_lock():
+        exporter = None
+        # Workers leave exporting to the coordinator, which exports the merged directory
+        if args.export and not args.worker:
+            path = Path(args.export_path) if args.export_path else default_path(crawler.output_dir, args.export)
+            exporter = DatasetExporter(path, args.export)
+            if not args.coordinate:
+                crawler.exporter = exporter
+        try:
+            pages = _run_mode(crawler, args, since)
+            if exporter is not None and args.coordinate:
+                export_directory(crawler.output_dir, exporter)
+        except BaseException:
+            if exporter is not None:
+                # Keep the previous export rather than replace it with part of one
+                crawler.exporter = None
+                exporter.discard()
+                print(f"✗ Export to {exporter.path} skipped: the crawl did not finish")
+            raise
+        if exporter is not None:
+            crawler.exporter = None
+            exporter.close()
+            print(f"✓ Exported {exporter.rows} pages to {exporter.path}")
+    return pages
+
+
+def _run_mode(crawler: BaseDocsCrawler, args, since: Optional[float]) -> List[dict]:
+    if args.worker or args.coordinate:
+        queue = WorkQueue.for_directory(crawler.output_dir, lease_seconds=args.lease)
+        try:
+            if args.worker:
+                return crawler.work(queue, args.batch_size)
+            urls = load_seed_file(args.seed_file) if args.seed_file else None
+            return crawler.coordinate(queue, urls, args.workers, worker_command() if args.workers else None)
+        finally:
+            queue.close()
+    if args.sitemap is not None:
+        return crawler.crawl_planned()
+    if args.changed_only or since is not None:
+        return crawler.crawl_changed(since)
+    if args.concurrency or args.seed_file:
+        urls = load_seed_file(args.seed_file) if args.seed_file else None
+        return crawler.crawl_concurrent(urls)
+    return crawler.crawl_all()
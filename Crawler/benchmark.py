@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+End-to-end crawler benchmarks against the local fake Firecrawl server.
+
+Each scenario runs in a fresh process so peak RSS is measured per scenario,
+and reports pages/sec, time to the first saved file, peak RSS and retry
+overhead (retries, time spent waiting, and 429s the server sent).
+
+Scenarios:
+    crawl_all         Blocking crawl job, then save every page
+    crawl_stream      Crawl job with pages saved as they complete
+    crawl_concurrent  Map the site, then scrape every URL concurrently
+    save_markdown     save_markdown() alone, without any HTTP
+    combine_archive   combine_docs.combine_directory() on the saved pages
+    recombine_archive combine_directory() again after 1% of the pages changed
+    combine_clanker   crawl_clanker_docs.combine_into_documents() on them
+
+Usage:
+    python3 benchmark.py --sizes 100
+    python3 benchmark.py --sizes 100,10000 --latency 0.01 --rate-limit 0.02
+    python3 benchmark.py --json results.json
+    python3 benchmark.py --baseline results.json --tolerance 0.2
+"""
+
+import contextlib
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+from fake_firecrawl import DEFAULT_BASE_URL, FakeFirecrawl, SyntheticSite
+
+SCENARIOS = (
+    'crawl_all',
+    'crawl_stream',
+    'crawl_concurrent',
+    'save_markdown',
+    'combine_archive',
+    'recombine_archive',
+    'combine_clanker',
+)
+DEFAULT_SCENARIOS = (
+    'crawl_all', 'crawl_stream', 'save_markdown', 'combine_archive', 'recombine_archive', 'combine_clanker',
+)
+DEFAULT_SIZES = (100, 10_000, 100_000)
+# Scenarios whose input is the page directory written by save_markdown
+CORPUS_SCENARIOS = ('combine_archive', 'recombine_archive', 'combine_clanker')
+
+
+def _bench_crawler_class():
+    """BaseDocsCrawler that records when the first page was saved."""
+    from base_crawler import BaseDocsCrawler
+
+    class BenchCrawler(BaseDocsCrawler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.started = time.perf_counter()
+            self.first_file: Optional[float] = None
+
+        def save_markdown(self, url, content, metadata=None, manifest_fields=None):
+            saved = super().save_markdown(url, content, metadata, manifest_fields)
+            if saved and self.first_file is None:
+                self.first_file = time.perf_counter() - self.started
+            return saved
+
+    return BenchCrawler
+
+
+def _crawler(output_dir: Path, size: int, options: dict, **kwargs):
+    return _bench_crawler_class()(
+        base_url=DEFAULT_BASE_URL,
+        output_dir=str(output_dir),
+        api_key='benchmark',
+        api_url=options['api_url'],
+        limit=size,
+        poll_interval=options['poll_interval'],
+        rate_per_host=options['rate'],
+        **kwargs,
+    )
+
+
+def _crawl_result(crawler) -> dict:
+    from metrics import METRICS
+
+    # Every scenario runs in a fresh process, so the counters are this run's.
+    # Both the crawl job retries and the scrape engine's per-URL retries count.
+    return {
+        'pages': crawler.catalog.count(),
+        'first_file': crawler.first_file,
+        'retries': int(METRICS.counters.get('retries', 0)),
+        'retry_wait': METRICS.counters.get('retry_wait_seconds', 0.0),
+    }
+
+
+def bench_crawl_all(size: int, workdir: Path, options: dict) -> dict:
+    crawler = _crawler(workdir / 'crawl_all', size, options)
+    crawler.crawl_all()
+    return _crawl_result(crawler)
+
+
+def bench_crawl_stream(size: int, workdir: Path, options: dict) -> dict:
+    crawler = _crawler(workdir / 'crawl_stream', size, options, stream=True)
+    crawler.crawl_all()
+    return _crawl_result(crawler)
+
+
+def bench_crawl_concurrent(size: int, workdir: Path, options: dict) -> dict:
+    crawler = _crawler(workdir / 'crawl_concurrent', size, options, concurrency=options['concurrency'])
+    crawler.crawl_concurrent()
+    return _crawl_result(crawler)
+
+
+def bench_save_markdown(size: int, workdir: Path, options: dict) -> dict:
+    crawler = _crawler(workdir / 'save_markdown', size, options)
+    # A small pool of page bodies, made unique per URL, keeps generation cost out of the timing
+    site = SyntheticSite(size)
+    pool = [site.page(i) for i in range(min(size, 100))]
+    crawler.started = time.perf_counter()
+    for i in range(size):
+        page = pool[i % len(pool)]
+        crawler.save_markdown(site.url(i), f"{page['markdown']}\n\n<!-- {i} -->\n", page['metadata'])
+    crawler._finish_batch()
+    crawler.create_index([site.url(i) for i in range(size)])
+    return _crawl_result(crawler)
+
+
+def bench_combine_archive(size: int, workdir: Path, options: dict) -> dict:
+    from combine_docs import combine_directory
+    from sites import get_site
+
+    corpus = workdir / 'save_markdown'
+    combine_directory(corpus, workdir / 'combined_archive', get_site('archive'))
+    return {'pages': size}
+
+
+def bench_recombine_archive(size: int, workdir: Path, options: dict) -> dict:
+    from combine_docs import combine_directory
+    from frontmatter import iter_page_files
+    from section_cache import SECTION_CACHE_FILENAME
+    from sites import get_site
+
+    corpus = workdir / 'save_markdown'
+    output = workdir / 'combined_archive'
+    site = get_site('archive')
+    if not (output / SECTION_CACHE_FILENAME).exists():
+        combine_directory(corpus, output, site)
+    changed = list(iter_page_files(corpus))[::100]
+    for path in changed:
+        with path.open('a', encoding='utf-8') as f:
+            f.write(f"\n<!-- edited {time.time()} -->\n")
+    # Only the incremental rerun is timed
+    start = time.perf_counter()
+    combine_directory(corpus, output, site)
+    return {'pages': size, 'seconds': time.perf_counter() - start}
+
+
+def bench_combine_clanker(size: int, workdir: Path, options: dict) -> dict:
+    from base_crawler import load_existing_pages
+    from crawl_clanker_docs import combine_into_documents
+    from sites import get_site
+
+    pages = load_existing_pages(workdir / 'save_markdown')
+    combine_into_documents(pages, workdir / 'combined_clanker', get_site('clanker'))
+    return {'pages': len(pages)}
+
+
+BENCHMARKS = {
+    'crawl_all': bench_crawl_all,
+    'crawl_stream': bench_crawl_stream,
+    'crawl_concurrent': bench_crawl_concurrent,
+    'save_markdown': bench_save_markdown,
+    'combine_archive': bench_combine_archive,
+    'recombine_archive': bench_recombine_archive,
+    'combine_clanker': bench_combine_clanker,
+}
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MiB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if os.uname().sysname == 'Darwin' else peak / 1024
+
+
+def _child(scenario: str, size: int, workdir: str, options: dict, conn) -> None:
+    """Run one scenario in this (fresh) process and send back its metrics."""
+    try:
+        # Crawler output goes to /dev/null so buffering it never counts towards RSS
+        with open(os.devnull, 'w') as devnull:
+            output = contextlib.nullcontext() if options['verbose'] else contextlib.redirect_stdout(devnull)
+            with output:
+                start = time.perf_counter()
+                result = BENCHMARKS[scenario](size, Path(workdir), options)
+                result.setdefault('seconds', time.perf_counter() - start)
+        result['peak_rss_mb'] = peak_rss_mb()
+        conn.send(result)
+    except BaseException as e:
+        conn.send({'error': f"{e.__class__.__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def run_scenario(scenario: str, size: int, workdir: Path, options: dict) -> dict:
+    """Run a scenario in a spawned process and return its metrics."""
+    context = multiprocessing.get_context('spawn')
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=_child, args=(scenario, size, str(workdir), options, child))
+    process.start()
+    child.close()
+    try:
+        result = parent.recv()
+    except EOFError:
+        result = {'error': f"benchmark process exited with code {process.exitcode}"}
+    process.join()
+    return result
+
+
+def print_table(rows: List[dict]) -> None:
+    """Print results as a table."""
+    def fmt(value, spec):
+        width = int(spec.split('.')[0].rstrip('df'))
+        return format(value, spec) if value is not None else '-'.rjust(width)
+
+    print(f"{'scenario':<18} {'size':>7} {'pages':>7} {'seconds':>8} {'pages/s':>9} "
+          f"{'first(s)':>8} {'rss(MB)':>8} {'retries':>7} {'wait(s)':>7} {'429s':>5}")
+    for row in rows:
+        if row.get('error'):
+            print(f"{row['scenario']:<18} {row['size']:>7}  ✗ {row['error']}")
+            continue
+        print(f"{row['scenario']:<18} {row['size']:>7} {row['pages']:>7} {row['seconds']:>8.2f} "
+              f"{fmt(row.get('pages_per_sec'), '9.1f')} {fmt(row.get('first_file'), '8.3f')} "
+              f"{fmt(row.get('peak_rss_mb'), '8.1f')} {fmt(row.get('retries'), '7d')} "
+              f"{fmt(row.get('retry_wait'), '7.2f')} {fmt(row.get('rate_limited'), '5d')}")
+
+
+def compare(rows: List[dict], baseline: List[dict], tolerance: float) -> List[str]:
+    """
+    Compare results with a baseline run.
+
+    Returns:
+        Descriptions of throughput drops or memory growth beyond tolerance
+    """
+    previous = {(r['scenario'], r['size']): r for r in baseline if not r.get('error')}
+    problems = []
+    for row in rows:
+        before = previous.get((row['scenario'], row['size']))
+        if not before or row.get('error'):
+            continue
+        name = f"{row['scenario']} @ {row['size']}"
+        if before.get('pages_per_sec') and row['pages_per_sec'] < before['pages_per_sec'] * (1 - tolerance):
+            problems.append(f"{name}: {row['pages_per_sec']:.1f} pages/s, baseline {before['pages_per_sec']:.1f}")
+        if before.get('peak_rss_mb') and row.get('peak_rss_mb') and row['peak_rss_mb'] > before['peak_rss_mb'] * (1 + tolerance):
+            problems.append(f"{name}: peak RSS {row['peak_rss_mb']:.1f} MB, baseline {before['peak_rss_mb']:.1f}")
+    return problems
+
+
+def main():
+    """Main entry point."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the crawlers and combine steps against a local fake Firecrawl server"
+    )
+    parser.add_argument(
+        '--sizes',
+        default=','.join(str(s) for s in DEFAULT_SIZES),
+        help='Comma-separated site sizes in pages (default: 100,10000,100000)'
+    )
+    parser.add_argument(
+        '--scenarios',
+        default=','.join(DEFAULT_SCENARIOS),
+        help=f"Comma-separated scenarios (default: {','.join(DEFAULT_SCENARIOS)}; all: {','.join(SCENARIOS)})"
+    )
+    parser.add_argument('--latency', type=float, default=0.0, help='Fake server latency per request in seconds (default: 0)')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Share of requests the fake server answers with 429 (default: 0)')
+    parser.add_argument('--retry-after', type=float, default=0.2, help='Retry-After sent with 429s in seconds (default: 0.2)')
+    parser.add_argument('--crawl-rate', type=float, default=0.0, help='Pages per second fake crawl jobs complete (default: instantly)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrency for crawl_concurrent (default: 16)')
+    parser.add_argument('--rate', type=float, default=1000.0, help='Crawler requests per second per host (default: 1000)')
+    parser.add_argument('--workdir', default=None, help='Directory for benchmark output (default: a temporary directory)')
+    parser.add_argument('--keep', action='store_true', help='Keep the benchmark output')
+    parser.add_argument('--json', default=None, help='Write results to this JSON file')
+    parser.add_argument('--baseline', default=None, help='Compare with results from an earlier --json run')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown or memory growth vs the baseline (default: 0.2)')
+    parser.add_argument('--verbose', action='store_true', help='Show crawler output')
+
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = [s for s in scenarios if s not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    fake = FakeFirecrawl(
+        SyntheticSite(max(sizes)),
+        latency=args.latency,
+        rate_limit_ratio=args.rate_limit,
+        retry_after=args.retry_after,
+        crawl_rate=args.crawl_rate,
+    )
+    options = {
+        'api_url': fake.start(),
+        'poll_interval': 0.1,
+        'rate': args.rate,
+        'concurrency': args.concurrency,
+        'verbose': args.verbose,
+    }
+    root = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix='docs-bench-'))
+    print(f"Fake Firecrawl API at {options['api_url']}, output in {root}\n")
+
+    rows: List[dict] = []
+    try:
+        for size in sizes:
+            workdir = root / f"{size}_pages"
+            if workdir.exists():
+                shutil.rmtree(workdir)
+            workdir.mkdir(parents=True)
+            for scenario in scenarios:
+                if scenario in CORPUS_SCENARIOS and not (workdir / 'save_markdown').exists():
+                    # The combine steps read the pages written by save_markdown
+                    run_scenario('save_markdown', size, workdir, options)
+                before: Dict[str, int] = dict(fake.stats)
+                result = run_scenario(scenario, size, workdir, options)
+                result.update(scenario=scenario, size=size)
+                result['rate_limited'] = fake.stats['rate_limited'] - before.get('rate_limited', 0)
+                if result.get('seconds'):
+                    result['pages_per_sec'] = result['pages'] / result['seconds']
+                rows.append(result)
+                status = f"✗ {result['error']}" if result.get('error') else f"{result.get('pages_per_sec', 0):.1f} pages/s"
+                print(f"  ✓ {scenario} @ {size}: {status}")
+    finally:
+        fake.stop()
+        if not args.keep and not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+
+    print()
+    print_table(rows)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2) + '\n', encoding='utf-8')
+        print(f"\nWrote {args.json}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        problems = compare(rows, baseline, args.tolerance)
+        if problems:
+            print(f"\n✗ Regressions beyond {args.tolerance:.0%}:")
+            for problem in problems:
+                print(f"  - {problem}")
+            exit(1)
+        print(f"\n✓ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
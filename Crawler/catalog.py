@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+SQLite catalog of crawled pages.
+
+The crawlers record every saved page in `.catalog.sqlite` inside the output
+directory: URL, filename, title, description, content hash, size, crawl
+times and category. INDEX.md generation and other tools read from the
+catalog instead of globbing and reparsing the page files. Names a page was
+stored under before it moved (see layout.py) are kept as aliases.
+
+Usage:
+    python3 catalog.py archive_docs stats
+    python3 catalog.py archive_docs list --category tutorials
+    python3 catalog.py archive_docs find https://archive.org/developers/internetarchive/
+    python3 catalog.py archive_docs stale 7d
+    python3 catalog.py archive_docs show https://archive.org/developers/index.html
+    python3 catalog.py archive_docs resolve developers_index.md
+    python3 catalog.py archive_docs rebuild --site archive
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+CATALOG_FILENAME = '.catalog.sqlite'
+
+COLUMNS = (
+    'url', 'filename', 'title', 'description', 'content_hash',
+    'size', 'crawled_at', 'checked_at', 'category',
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    filename TEXT,
+    title TEXT,
+    description TEXT,
+    content_hash TEXT,
+    size INTEGER,
+    crawled_at REAL,
+    checked_at REAL,
+    category TEXT
+);
+CREATE INDEX IF NOT EXISTS pages_category ON pages (category);
+CREATE INDEX IF NOT EXISTS pages_filename ON pages (filename);
+CREATE INDEX IF NOT EXISTS pages_checked_at ON pages (checked_at);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias TEXT PRIMARY KEY,
+    url TEXT NOT NULL
+);
+"""
+
+
+class DocsCatalog:
+    """Page catalog stored in an SQLite database."""
+
+    def __init__(self, path: Path, commit_every: int = 100):
+        self.path = Path(path)
+        self.commit_every = commit_every
+        self._pending = 0
+        self._lock = threading.Lock()
+        # The crawlers may write from worker threads; access is serialised by _lock
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    @classmethod
+    def for_directory(cls, output_dir: Path) -> 'DocsCatalog':
+        """Open the catalog of a crawler output directory."""
+        return cls(Path(output_dir) / CATALOG_FILENAME)
+
+    def upsert(self, url: str, **fields) -> None:
+        """Insert a page or update the given fields of an existing one."""
+        unknown = set(fields) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown catalog columns: {sorted(unknown)}")
+        fields = {k: v for k, v in fields.items() if v is not None}
+        columns = ['url'] + list(fields)
+        placeholders = ', '.join('?' for _ in columns)
+        updates = ', '.join(f"{c} = excluded.{c}" for c in fields) or 'url = excluded.url'
+        sql = (
+            f"INSERT INTO pages ({', '.join(columns)}) VALUES ({placeholders}) "
+            f"ON CONFLICT(url) DO UPDATE SET {updates}"
+        )
+        with self._lock:
+            self.conn.execute(sql, [url] + list(fields.values()))
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self.conn.commit()
+                self._pending = 0
+
+    def commit(self) -> None:
+        """Commit pending writes."""
+        with self._lock:
+            self.conn.commit()
+            self._pending = 0
+
+    def close(self) -> None:
+        """Commit and close the database."""
+        self.commit()
+        self.conn.close()
+
+    def merge(self, path: Path) -> int:
+        """
+        Take over the pages and aliases of another catalog, e.g. a queue worker's.
+
+        A page replaces ours only if it was checked at least as recently.
+
+        Returns:
+            Number of pages taken over
+        """
+        columns = ', '.join(COLUMNS)
+        updates = ', '.join(f"{c} = excluded.{c}" for c in COLUMNS[1:])
+        with self._lock:
+            self.conn.commit()
+            self.conn.execute("ATTACH DATABASE ? AS other", (str(path),))
+            try:
+                before = self.conn.total_changes
+                # WHERE true lets SQLite tell the upsert clause from a join
+                self.conn.execute(
+                    f"INSERT INTO pages ({columns}) SELECT {columns} FROM other.pages WHERE true "
+                    f"ON CONFLICT(url) DO UPDATE SET {updates} "
+                    f"WHERE COALESCE(excluded.checked_at, 0) >= COALESCE(pages.checked_at, 0)"
+                )
+                merged = self.conn.total_changes - before
+                self.conn.execute("INSERT OR REPLACE INTO aliases (alias, url) SELECT alias, url FROM other.aliases")
+                self.conn.commit()
+            finally:
+                self.conn.execute("DETACH DATABASE other")
+            self._pending = 0
+        return merged
+
+    def _query(self, sql: str, params: Iterable = ()) -> List[dict]:
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(sql, tuple(params))]
+
+    def get(self, url: str) -> Optional[dict]:
+        """Return the catalog row for a URL."""
+        rows = self._query("SELECT * FROM pages WHERE url = ?", (url,))
+        return rows[0] if rows else None
+
+    def get_many(self, urls: List[str]) -> dict:
+        """Return catalog rows for several URLs, keyed by URL."""
+        found = {}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(urls), 500):
+            batch = urls[start:start + 500]
+            placeholders = ', '.join('?' for _ in batch)
+            for row in self._query(f"SELECT * FROM pages WHERE url IN ({placeholders})", batch):
+                found[row['url']] = row
+        return found
+
+    def urls_for_filename(self, filename: str) -> List[str]:
+        """URLs of the pages stored under filename (more than one is a collision)."""
+        return [row['url'] for row in self._query("SELECT url FROM pages WHERE filename = ?", (filename,))]
+
+    def add_alias(self, alias: str, url: str) -> None:
+        """Remember that a page used to be stored under another name."""
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO aliases (alias, url) VALUES (?, ?)", (alias, url))
+            self._pending += 1
+
+    def resolve(self, name: str) -> Optional[dict]:
+        """The page stored under a filename, a former filename or a URL."""
+        rows = self._query("SELECT * FROM pages WHERE filename = ? OR url = ? LIMIT 1", (name, name))
+        if rows:
+            return rows[0]
+        rows = self._query(
+            "SELECT p.* FROM aliases a JOIN pages p ON p.url = a.url WHERE a.alias = ?", (name,)
+        )
+        return rows[0] if rows else None
+
+    def all(self) -> List[dict]:
+        """Every page, sorted by URL."""
+        return self._query("SELECT * FROM pages ORDER BY url")
+
+    def by_category(self, category: str) -> List[dict]:
+        """Pages in a category, sorted by URL."""
+        return self._query("SELECT * FROM pages WHERE category = ? ORDER BY url", (category,))
+
+    def find_prefix(self, prefix: str) -> List[dict]:
+        """Pages whose URL starts with prefix."""
+        # Range scan on the primary key instead of LIKE, which ignores the index
+        return self._query(
+            "SELECT * FROM pages WHERE url >= ? AND url < ? ORDER BY url",
+            (prefix, prefix + '\U0010ffff'),
+        )
+
+    def stale(self, before: float) -> List[dict]:
+        """Pages last checked before a UNIX timestamp."""
+        return self._query(
+            "SELECT * FROM pages WHERE COALESCE(checked_at, 0) < ? ORDER BY checked_at, url",
+            (before,),
+        )
+
+    def category_counts(self) -> dict:
+        """Number of pages per category."""
+        rows = self._query("SELECT COALESCE(category, '') AS category, COUNT(*) AS n FROM pages GROUP BY category")
+        return {row['category']: row['n'] for row in rows}
+
+    def count(self) -> int:
+        return self._query("SELECT COUNT(*) AS n FROM pages")[0]['n']
+
+    def remove_missing(self, directory: Path) -> int:
+        """Drop rows whose file no longer exists in directory."""
+        directory = Path(directory)
+        missing = [row['url'] for row in self._query("SELECT url, filename FROM pages")
+                   if not row['filename'] or not (directory / row['filename']).exists()]
+        with self._lock:
+            self.conn.executemany("DELETE FROM pages WHERE url = ?", [(u,) for u in missing])
+            self.conn.commit()
+        return len(missing)
+
+
+def rebuild_catalog(output_dir: Path, categorizer=None) -> int:
+    """
+    Populate the catalog of an existing output directory from its files.
+
+    Only frontmatter is read unless the categorizer needs page content.
+
+    Returns:
+        Number of pages recorded
+    """
+    from frontmatter import iter_page_files, read_body, read_frontmatter
+    from layout import display_name, relative_filename
+    from manifest import CrawlManifest, content_hash
+
+    output_dir = Path(output_dir)
+    manifest = CrawlManifest(output_dir)
+    catalog = DocsCatalog.for_directory(output_dir)
+    count = 0
+    for path in iter_page_files(output_dir):
+        meta = read_frontmatter(path)
+        if not meta.source_url:
+            continue
+        filename = relative_filename(path, output_dir)
+        entry = manifest.get(meta.source_url) or {}
+        digest = entry.get('content_hash')
+        body = None
+        if not digest or (categorizer and categorizer.needs_content):
+            body = read_body(meta)
+            # save_markdown separates header and content with one blank line
+            digest = digest or content_hash(body[1:] if body.startswith('\n') else body)
+        category = None
+        if categorizer:
+            category = categorizer.categorize(
+                url=meta.source_url, title=meta.title, filename=display_name(filename), content=body or '',
+            )
+        catalog.upsert(
+            meta.source_url,
+            filename=filename,
+            title=meta.title,
+            description=meta.description,
+            content_hash=digest,
+            size=meta.size,
+            crawled_at=entry.get('crawled_at') or path.stat().st_mtime,
+            checked_at=entry.get('checked_at') or path.stat().st_mtime,
+            category=category,
+        )
+        count += 1
+    removed = catalog.remove_missing(output_dir)
+    catalog.close()
+    if removed:
+        print(f"Removed {removed} entries whose files no longer exist")
+    return count
+
+
+def _print_rows(rows: List[dict]) -> None:
+    for row in rows:
+        checked = time.strftime('%Y-%m-%d %H:%M', time.localtime(row['checked_at'])) if row.get('checked_at') else '-'
+        print(f"{row.get('category') or '-':<20} {checked:<16} {row['filename'] or '-':<50} {row['url']}")
+    print(f"\n{len(rows)} page(s)")
+
+
+def main():
+    """Query or rebuild a crawl catalog."""
+    import argparse
+
+    from manifest import parse_since
+
+    parser = argparse.ArgumentParser(description="Query the catalog of a crawler output directory")
+    parser.add_argument('output_dir', help='Crawler output directory (e.g. archive_docs)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = sub.add_parser('list', help='List pages, optionally by category')
+    list_parser.add_argument('--category', default=None, help='Only pages in this category')
+
+    find_parser = sub.add_parser('find', help='Find pages by URL prefix')
+    find_parser.add_argument('prefix', help='URL prefix')
+
+    stale_parser = sub.add_parser('stale', help='Pages last checked before a time')
+    stale_parser.add_argument('since', help='Age or date, e.g. 12h, 7d or 2025-11-01')
+
+    show_parser = sub.add_parser('show', help='Show one page')
+    show_parser.add_argument('url', help='Page URL')
+
+    resolve_parser = sub.add_parser('resolve', help='Find the current file of a page by its (former) filename')
+    resolve_parser.add_argument('name', help='Filename, e.g. from an old link, or URL')
+
+    sub.add_parser('stats', help='Page counts per category')
+
+    rebuild_parser = sub.add_parser('rebuild', help='Rebuild the catalog from the page files')
+    rebuild_parser.add_argument('--site', default=None, help='Site from sites.toml whose rules set categories')
+
+    args = parser.parse_args()
+    output_dir = Path(args.output_dir)
+    if not output_dir.exists():
+        print(f"Error: {output_dir} directory not found")
+        exit(1)
+
+    if args.command == 'rebuild':
+        categorizer = None
+        if args.site:
+            from sites import get_site
+            categorizer = get_site(args.site).categorizer
+        count = rebuild_catalog(output_dir, categorizer)
+        print(f"Catalogued {count} pages in {output_dir / CATALOG_FILENAME}")
+        return
+
+    catalog = DocsCatalog.for_directory(output_dir)
+    if args.command == 'list':
+        _print_rows(catalog.by_category(args.category) if args.category else catalog.all())
+    elif args.command == 'find':
+        _print_rows(catalog.find_prefix(args.prefix))
+    elif args.command == 'stale':
+        try:
+            before = parse_since(args.since)
+        except ValueError as e:
+            print(f"Error: {e}")
+            exit(1)
+        _print_rows(catalog.stale(before))
+    elif args.command == 'show':
+        row = catalog.get(args.url)
+        if not row:
+            print(f"Not in catalog: {args.url}")
+            exit(1)
+        for column in COLUMNS:
+            print(f"{column:<14} {row.get(column)}")
+    elif args.command == 'resolve':
+        row = catalog.resolve(args.name)
+        if not row:
+            print(f"Not in catalog: {args.name}")
+            exit(1)
+        print(f"{output_dir / row['filename']}  {row['url']}")
+    elif args.command == 'stats':
+        counts = catalog.category_counts()
+        for category, n in sorted(counts.items()):
+            print(f"{category or '(uncategorized)':<24} {n}")
+        print(f"{'total':<24} {sum(counts.values())}")
+    catalog.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+On-disk checkpoint of a running Firecrawl crawl job.
+
+The checkpoint records the job ID and how many of the job's pages have
+already been saved, so an interrupted run can reattach to the same job with
+--resume instead of submitting (and paying for) a new crawl.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+CHECKPOINT_FILENAME = '.crawl_checkpoint.json'
+
+
+class CrawlCheckpoint:
+    """Job ID and page cursor of the crawl in an output directory."""
+
+    def __init__(self, output_dir: Path, save_every: int = 25, before_save: Optional[Callable[[], None]] = None):
+        self.path = Path(output_dir) / CHECKPOINT_FILENAME
+        self.save_every = save_every
+        # Called before the cursor is written, e.g. to flush queued pages
+        self.before_save = before_save
+        self.state: Optional[dict] = None
+        self._unsaved = 0
+
+    def load(self) -> Optional[dict]:
+        """Load the checkpoint from disk, if there is a usable one."""
+        if not self.path.exists():
+            return None
+        try:
+            self.state = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, json.JSONDecodeError):
+            self.state = None
+        return self.state
+
+    def matches(self, base_url: str) -> bool:
+        """True if the loaded checkpoint belongs to a crawl of base_url."""
+        return bool(self.state) and self.state.get('base_url') == base_url and bool(self.state.get('job_id'))
+
+    @property
+    def job_id(self) -> Optional[str]:
+        return self.state.get('job_id') if self.state else None
+
+    @property
+    def cursor(self) -> int:
+        return self.state.get('cursor', 0) if self.state else 0
+
+    @property
+    def started_at(self) -> float:
+        return self.state.get('started_at', 0.0) if self.state else 0.0
+
+    def start(self, job_id: str, base_url: str, params: Optional[dict] = None) -> None:
+        """Record a newly submitted job."""
+        self.state = {
+            'job_id': job_id,
+            'base_url': base_url,
+            'params': params or {},
+            'started_at': time.time(),
+            'cursor': 0,
+        }
+        self.save()
+
+    def advance(self, cursor: int) -> None:
+        """Move the cursor, writing to disk every `save_every` pages."""
+        if not self.state:
+            return
+        self.state['cursor'] = cursor
+        self._unsaved += 1
+        if self._unsaved >= self.save_every:
+            self.save()
+
+    def save(self) -> None:
+        """Write the checkpoint atomically."""
+        if not self.state:
+            return
+        if self.before_save:
+            self.before_save()
+        self.state['updated_at'] = time.time()
+        tmp_path = self.path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self.state, indent=2), encoding='utf-8')
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
+
+    def clear(self) -> None:
+        """Remove the checkpoint once the job has been fully processed."""
+        self.state = None
+        self._unsaved = 0
+        if self.path.exists():
+            self.path.unlink()
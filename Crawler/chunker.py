@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Split combined documents into parts under a token budget.
+
+Combined documents can grow far past the knowledge-file and context limits
+of the builder GPT. This stage cuts them at `##`/`###` headings into parts
+of at most --max-tokens tokens. A part that starts inside a page repeats
+the page heading and its source URL, so every part can be read on its own.
+A manifest (chunks.json) maps every part to the sections it holds, so a
+retriever can load just the parts it needs.
+
+Tokens are counted with tiktoken when it is installed, otherwise estimated
+from the UTF-8 size, which overestimates for English prose.
+
+Usage:
+    python3 chunker.py combined_docs
+    python3 chunker.py clanker_docs/combined --max-tokens 4000
+    python3 chunker.py combined_docs/03_api_reference.md --output-dir parts
+"""
+
+import json
+import math
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from metrics import METRICS
+from page_writer import write_atomic
+from section_cache import file_stamp
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to a byte estimate
+    tiktoken = None
+
+DEFAULT_MAX_TOKENS = 8000
+DEFAULT_ENCODING = 'cl100k_base'
+# Conservative for markdown with code; English prose is closer to 4
+BYTES_PER_TOKEN = 3
+MANIFEST_FILENAME = 'chunks.json'
+
+HEADING_RE = re.compile(r'^(#{2,3})\s+(.+?)\s*$')
+SOURCE_RE = re.compile(r'^\*Source: (.+)\*$')
+FENCE_RE = re.compile(r'^\s*(```|~~~)')
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text from its UTF-8 size."""
+    return math.ceil(len(text.encode('utf-8')) / BYTES_PER_TOKEN)
+
+
+def token_counter(encoding: Optional[str] = DEFAULT_ENCODING) -> Tuple[Callable[[str], int], str]:
+    """
+    Return a token counting function and a description of it.
+
+    Uses tiktoken with the given encoding when available, otherwise the
+    byte estimate.
+    """
+    if tiktoken is not None and encoding:
+        enc = tiktoken.get_encoding(encoding)
+        return (lambda text: len(enc.encode(text, disallowed_special=()))), f"tiktoken:{encoding}"
+    return estimate_tokens, f"bytes/{BYTES_PER_TOKEN}"
+
+
+@dataclass
+class Unit:
+    """A run of lines starting at a `##` or `###` heading."""
+
+    page_title: str
+    source_url: str
+    heading: str
+    text: str
+    starts_page: bool = False
+
+
+@dataclass
+class Chunk:
+    """One output part and the sections it contains."""
+
+    parts: List[str] = field(default_factory=list)
+    sections: List[dict] = field(default_factory=list)
+    tokens: int = 0
+
+    @property
+    def text(self) -> str:
+        return ''.join(self.parts)
+
+
+def split_document(text: str) -> Tuple[str, List[Unit]]:
+    """
+    Split a combined document into its header and heading-level units.
+
+    A `##` heading followed by a `*Source: ...*` line starts a new page;
+    every other `##`/`###` heading starts a unit inside the current page.
+    Headings inside fenced code blocks are ignored.
+    """
+    lines = text.splitlines(keepends=True)
+    header: List[str] = []
+    units: List[Unit] = []
+    current: Optional[List[str]] = None
+    page_title, source_url = '', ''
+    heading, starts_page = '', False
+    in_fence = False
+
+    def flush():
+        if current is not None:
+            units.append(Unit(page_title, source_url, heading, ''.join(current), starts_page))
+
+    for i, line in enumerate(lines):
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING_RE.match(line.rstrip('\n'))
+        if match:
+            flush()
+            heading = match.group(2)
+            # The page's source line follows its heading after one blank line
+            following = [l.strip() for l in lines[i + 1:i + 3]]
+            source = next((SOURCE_RE.match(l) for l in following if SOURCE_RE.match(l)), None)
+            starts_page = len(match.group(1)) == 2 and source is not None
+            if starts_page:
+                page_title, source_url = heading, source.group(1)
+            current = [line]
+        elif current is None:
+            header.append(line)
+        else:
+            current.append(line)
+    flush()
+    return ''.join(header), units
+
+
+def _split_blocks(text: str) -> List[str]:
+    """Split text at blank lines outside code fences, keeping separators."""
+    blocks, current = [], []
+    in_fence = False
+    for line in text.splitlines(keepends=True):
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+        current.append(line)
+        if not in_fence and not line.strip():
+            blocks.append(''.join(current))
+            current = []
+    if current:
+        blocks.append(''.join(current))
+    return blocks
+
+
+def _split_oversized(text: str, budget: int, count: Callable[[str], int]) -> List[str]:
+    """Cut text that is over budget at blank lines, then lines, words and characters."""
+    pieces = []
+    for splitter in (_split_blocks, lambda t: t.splitlines(keepends=True), lambda t: re.findall(r'\s*\S+\s*', t)):
+        pieces = splitter(text)
+        if len(pieces) > 1:
+            break
+    if len(pieces) <= 1:
+        # One enormous word: cut it by an estimated number of characters
+        size = max(1, len(text) * budget // max(1, count(text)))
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        if len(pieces) == 1:
+            return pieces
+
+    # Break oversized pieces down first, then pack them greedily
+    small = []
+    for piece in pieces:
+        if count(piece) > budget:
+            small.extend(_split_oversized(piece, budget, count))
+        else:
+            small.append(piece)
+
+    out, current, tokens = [], '', 0
+    for piece in small:
+        piece_tokens = count(piece)
+        if current and tokens + piece_tokens > budget:
+            out.append(current)
+            current, tokens = '', 0
+        current += piece
+        tokens += piece_tokens
+    if current:
+        out.append(current)
+    return out
+
+
+def chunk_document(
+    text: str,
+    title: str,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    count: Callable[[str], int] = estimate_tokens,
+) -> List[Chunk]:
+    """
+    Pack the units of a combined document into chunks under max_tokens.
+
+    Args:
+        text: Combined document
+        title: Title repeated at the top of every chunk
+        max_tokens: Token budget per chunk
+        count: Token counting function
+    """
+    _, units = split_document(text)
+    chunks: List[Chunk] = []
+    chunk: Optional[Chunk] = None
+
+    def header(unit: Unit) -> List[str]:
+        parts = [f"# {title} (part {len(chunks) + 1})\n\n"]
+        if not unit.starts_page and unit.page_title:
+            # Carry the page heading and source into parts that start mid-page
+            context = f"## {unit.page_title} (continued)\n\n"
+            if unit.source_url:
+                context += f"*Source: {unit.source_url}*\n\n"
+            parts.append(context)
+        return parts
+
+    def open_chunk(unit: Unit) -> Chunk:
+        new = Chunk(parts=header(unit))
+        new.tokens = count(''.join(new.parts))
+        chunks.append(new)
+        return new
+
+    def add(target: Chunk, unit: Unit, text: str, tokens: int) -> None:
+        target.parts.append(text)
+        target.tokens += tokens
+        section = {
+            'title': unit.page_title,
+            'heading': unit.heading,
+            'source_url': unit.source_url,
+        }
+        if not target.sections or target.sections[-1] != section:
+            target.sections.append(section)
+
+    for unit in units:
+        tokens = count(unit.text)
+        if chunk is not None and chunk.tokens + tokens <= max_tokens:
+            add(chunk, unit, unit.text, tokens)
+            continue
+        chunk = open_chunk(unit)
+        if chunk.tokens + tokens <= max_tokens:
+            add(chunk, unit, unit.text, tokens)
+            continue
+        # Unit alone is over budget: spread it over as many chunks as needed.
+        # The later chunks open with a continuation heading, so leave room for it.
+        continued = Unit(unit.page_title, unit.source_url, unit.heading, '')
+        budget = max(1, max_tokens - max(chunk.tokens, count(''.join(header(continued)))))
+        pieces = _split_oversized(unit.text, budget, count)
+        first = True
+        while pieces:
+            piece = pieces.pop(0)
+            if not first:
+                chunk = open_chunk(continued)
+            first = False
+            tokens = count(piece)
+            room = max(1, max_tokens - chunk.tokens)
+            if tokens > room:
+                # The part's header came out longer, e.g. a wider part number
+                piece, *rest = _split_oversized(piece, room, count)
+                pieces[:0] = rest
+                tokens = count(piece)
+            add(chunk, unit, piece, tokens)
+    return chunks
+
+
+def _document_title(header: str, fallback: str) -> str:
+    for line in header.splitlines():
+        if line.startswith('# '):
+            return line[2:].strip()
+    return fallback
+
+
+@METRICS.timed('chunk')
+def chunk_files(
+    paths: List[Path],
+    output_dir: Path,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    encoding: Optional[str] = DEFAULT_ENCODING,
+) -> dict:
+    """
+    Chunk combined documents into output_dir and write the manifest.
+
+    Parts left over from earlier runs of the same documents are removed.
+    Documents that did not change since their parts were written (same
+    size and modification time) are skipped.
+
+    Returns:
+        The manifest
+    """
+    count, tokenizer = token_counter(encoding)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest_path = output_dir / MANIFEST_FILENAME
+    manifest = {'max_tokens': max_tokens, 'tokenizer': tokenizer, 'documents': {}, 'sources': {}, 'chunks': []}
+    if manifest_path.exists():
+        previous = json.loads(manifest_path.read_text(encoding='utf-8'))
+        if previous.get('max_tokens') == max_tokens and previous.get('tokenizer') == tokenizer:
+            manifest['documents'] = previous.get('documents', {})
+            manifest['sources'] = previous.get('sources', {})
+            manifest['chunks'] = previous.get('chunks', [])
+
+    for path in paths:
+        path = Path(path)
+        stamp = file_stamp(path)
+        parts = manifest['documents'].get(path.name)
+        if (
+            parts is not None
+            and manifest['sources'].get(path.name) == stamp
+            and all((output_dir / name).exists() for name in parts)
+        ):
+            print(f"= Unchanged: {path.name} ({len(parts)} part(s))")
+            continue
+        for old in output_dir.glob(f"{path.stem}.part*.md"):
+            old.unlink()
+        manifest['chunks'] = [c for c in manifest['chunks'] if c['document'] != path.name]
+
+        text = path.read_text(encoding='utf-8')
+        header, _ = split_document(text)
+        chunks = chunk_document(text, _document_title(header, path.stem), max_tokens, count)
+        width = max(2, len(str(len(chunks))))
+        files = []
+        for i, chunk in enumerate(chunks, 1):
+            name = f"{path.stem}.part{i:0{width}d}.md"
+            data = chunk.text.encode('utf-8')
+            write_atomic(output_dir / name, data, fsync=False)
+            files.append(name)
+            manifest['chunks'].append({
+                'file': name,
+                'document': path.name,
+                'part': i,
+                'tokens': chunk.tokens,
+                'bytes': len(data),
+                'sections': chunk.sections,
+            })
+        manifest['documents'][path.name] = files
+        manifest['sources'][path.name] = stamp
+        print(f"✓ Split {path.name} into {len(chunks)} part(s) of at most {max_tokens} tokens")
+
+    tmp = manifest_path.with_suffix('.json.tmp')
+    tmp.write_text(json.dumps(manifest, indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
+    tmp.replace(manifest_path)
+    return manifest
+
+
+def chunk_site(site, max_tokens: Optional[int] = None, encoding: Optional[str] = DEFAULT_ENCODING) -> None:
+    """Chunk the combined documents of a registered site into <combined_dir>/chunks."""
+    max_tokens = max_tokens if max_tokens is not None else site.chunk_tokens
+    if not max_tokens:
+        return
+    paths = [site.combined_dir / c['filename'] for c in site.categories]
+    paths = [p for p in paths if p.exists()]
+    if paths:
+        chunk_files(paths, site.combined_dir / 'chunks', max_tokens, encoding)
+
+
+def main():
+    """Main entry point."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Split combined documents into parts under a token budget"
+    )
+    parser.add_argument(
+        'inputs',
+        nargs='+',
+        help='Combined documents, or directories of them'
+    )
+    parser.add_argument(
+        '--output-dir',
+        default=None,
+        help='Directory for the parts and manifest (default: <input dir>/chunks)'
+    )
+    parser.add_argument(
+        '--max-tokens',
+        type=int,
+        default=DEFAULT_MAX_TOKENS,
+        help=f'Token budget per part (default: {DEFAULT_MAX_TOKENS})'
+    )
+    parser.add_argument(
+        '--encoding',
+        default=DEFAULT_ENCODING,
+        help=f'tiktoken encoding used when tiktoken is installed (default: {DEFAULT_ENCODING})'
+    )
+
+    args = parser.parse_args()
+
+    if args.max_tokens < 100:
+        parser.error("--max-tokens must be at least 100")
+
+    paths = []
+    for name in args.inputs:
+        path = Path(name)
+        if path.is_dir():
+            paths.extend(sorted(path.glob('*.md')))
+        elif path.exists():
+            paths.append(path)
+        else:
+            print(f"Error: {path} not found")
+            exit(1)
+    if not paths:
+        print("Error: no combined documents found")
+        exit(1)
+
+    output_dir = Path(args.output_dir) if args.output_dir else paths[0].parent / 'chunks'
+    manifest = chunk_files(paths, output_dir, args.max_tokens, args.encoding)
+    print(f"\nWrote {len(manifest['chunks'])} part(s) and {MANIFEST_FILENAME} to {output_dir} ({manifest['tokenizer']})")
+
+
+if __name__ == "__main__":
+    main()
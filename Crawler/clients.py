@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Firecrawl client interface.
+
+BaseDocsCrawler only needs a client with the calls in CrawlClient and the
+`api_url` of the Firecrawl API, which it also polls and scrapes directly.
+firecrawl-py's FirecrawlApp is the default. Pointing api_url at another
+server (for example fake_firecrawl.py) or passing any object with these
+methods as `client=` swaps the backend without touching the crawlers.
+"""
+
+from typing import Optional
+
+try:
+    from typing import Protocol
+except ImportError:  # Python < 3.8
+    Protocol = object
+
+try:
+    from firecrawl import FirecrawlApp
+except ImportError:
+    FirecrawlApp = None
+
+
+class CrawlClient(Protocol):
+    """The Firecrawl calls the crawlers make."""
+
+    api_url: str
+
+    def async_crawl_url(self, url: str, params: Optional[dict] = None) -> dict:
+        """Submit a crawl job; returns a dict with its 'id'."""
+        ...
+
+    def scrape_url(self, url: str, params: Optional[dict] = None) -> dict:
+        """Scrape one page; returns a dict with 'markdown' and 'metadata'."""
+        ...
+
+    def map_url(self, url: str, params: Optional[dict] = None) -> dict:
+        """List a site's URLs; returns a dict with 'links'."""
+        ...
+
+
+def firecrawl_client(api_key: str, api_url: Optional[str] = None) -> CrawlClient:
+    """
+    Create the default firecrawl-py client.
+
+    Args:
+        api_key: Firecrawl API key
+        api_url: API base URL (default: FIRECRAWL_API_URL or the hosted API)
+    """
+    if FirecrawlApp is None:
+        print("Error: firecrawl-py package not installed.")
+        print("Please run: pip install firecrawl-py")
+        exit(1)
+    return FirecrawlApp(api_key=api_key, api_url=api_url)
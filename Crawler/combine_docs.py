@@ -3,189 +3,339 @@
 Combine Internet Archive developer docs into 3 organized documents for GPT instructions.
 """
 
+import hashlib
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 import re
-from typing import List, Tuple
+from typing import Iterator, List, Optional, Set, Tuple
+
+from chunker import chunk_files
+from combined_writer import section_text
+from dedup import Fingerprint, fingerprint, page_block_keys, strip_blocks
+from frontmatter import iter_page_files, read_page
+from layout import display_name, relative_filename
+from metrics import METRICS, add_metrics_arguments, run_report
+from section_cache import CachedSection, ScanResult, combine_cached, file_stamp
+from sites import Categorizer, SiteConfig, get_site
+
+SITE = get_site('archive')
+CATEGORIZER = SITE.categorizer
+# Bump when render_section changes, so cached sections are rendered again
+RENDER_VERSION = 1
 
 
 def read_markdown_file(filepath: Path) -> Tuple[str, str]:
     """Read a markdown file and extract content (removing frontmatter)."""
-    content = filepath.read_text(encoding='utf-8')
-    
-    # Remove frontmatter if present
-    if content.startswith('---'):
-        parts = content.split('---', 2)
-        if len(parts) >= 3:
-            # Extract source URL from frontmatter for reference
-            frontmatter = parts[1]
-            source_url = ''
-            for line in frontmatter.split('\n'):
-                if line.startswith('source_url:'):
-                    source_url = line.split(':', 1)[1].strip()
-                    break
-            content = parts[2].strip()
-        else:
-            content = parts[1] if len(parts) > 1 else content
+    meta, content = read_page(filepath)
+    source_url = meta.source_url if meta.has_frontmatter else str(filepath)
+    return content.strip(), source_url
+
+
+def render_section(filepath: Path, content: str, source_url: str) -> str:
+    """Render one file as a combined-document section."""
+    # Extract a title from the filename or content
+    stem = display_name(filepath)[:-len('.md')]
+    filename = stem.replace('developers_', '').replace('__sources_', '').replace('_', ' ').title()
+    
+    # Try to get the actual title from content
+    title_match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
+    if title_match:
+        doc_title = title_match.group(1)
     else:
-        source_url = str(filepath)
+        doc_title = filename
     
-    return content.strip(), source_url
+    lines = [f"## {doc_title}", ""]
+    if source_url and source_url.startswith('http'):
+        lines.append(f"*Source: {source_url}*")
+        lines.append("")
+    lines.append(content)
+    lines.append("")
+    lines.append("---")
+    lines.append("")
+    return section_text(lines)
 
 
-def categorize_file(filename: str, content: str) -> str:
-    """Categorize a file into one of three groups."""
-    filename_lower = filename.lower()
-    content_lower = content.lower()
+ParseResult = Tuple[Path, Optional[str], Optional[str], Optional[str], Optional[Fingerprint], str]
+
+
+def parse_file(
+    filepath: Path,
+    categorizer: Optional[Categorizer] = CATEGORIZER,
+    boilerplate: Optional[Set[str]] = None,
+) -> ParseResult:
+    """
+    Read, categorize and render one file.
     
-    # Category 1: Getting Started & Quick Start
-    if any(keyword in filename_lower for keyword in [
-        'quick-start', 'installation', 'setup', 'getting-started',
-        'index', 'developers.md', 'introduction'
-    ]) or filename_lower == 'developers.md':
-        return 'getting_started'
+    Runs in a worker pool, so each file is read exactly once. Without a
+    categorizer the category is left as None for the caller to fill in. With a
+    boilerplate set (deduplication on), those blocks are stripped and the
+    page is fingerprinted for duplicate detection.
     
-    # Category 2: Tutorials & How-To Guides
-    if any(keyword in filename_lower for keyword in [
-        'tutorial', 'how-to', 'guide', 'example', 'walkthrough'
-    ]):
-        return 'tutorials'
+    Returns:
+        (filepath, category, rendered section, error message, fingerprint, source URL)
+    """
+    try:
+        content, source_url = read_markdown_file(filepath)
+        fp = None
+        if boilerplate is not None:
+            content = strip_blocks(content, boilerplate)
+            fp = fingerprint(content)
+        category = None
+        if categorizer:
+            with METRICS.span('categorize'):
+                category = categorizer.categorize(filename=display_name(filepath), content=content)
+        return filepath, category, render_section(filepath, content, source_url), None, fp, source_url
+    except Exception as e:
+        return filepath, None, None, str(e), None, str(filepath)
+
+
+def iter_parsed(
+    files: List[Path],
+    categorizer: Optional[Categorizer] = CATEGORIZER,
+    workers: Optional[int] = None,
+    use_threads: bool = False,
+    boilerplate: Optional[Set[str]] = None,
+) -> Iterator[ParseResult]:
+    """
+    Parse files in a worker pool and yield results in input order.
     
-    # Category 3: API Reference & Advanced Topics
-    # Everything else (APIs, metadata, advanced features, reference)
-    return 'api_reference'
+    Only a bounded window of results is in flight at a time, so memory use
+    depends on the number of workers, not on the number of files.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        for filepath in files:
+            yield parse_file(filepath, categorizer, boilerplate)
+        return
+    
+    pool_class = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+    window = workers * 4
+    with pool_class(max_workers=workers) as executor:
+        pending = deque()
+        files_iter = iter(files)
+        for filepath in files_iter:
+            pending.append(executor.submit(parse_file, filepath, categorizer, boilerplate))
+            if len(pending) >= window:
+                break
+        while pending:
+            yield pending.popleft().result()
+            next_file = next(files_iter, None)
+            if next_file is not None:
+                pending.append(executor.submit(parse_file, next_file, categorizer, boilerplate))
 
 
-def create_combined_document(
-    files: List[Tuple[Path, str]],
-    output_path: Path,
-    title: str,
-    description: str
-) -> None:
-    """Combine multiple markdown files into a single document."""
-    lines = [
-        f"# {title}",
-        "",
-        description,
-        "",
-        "---",
-        "",
-        ""
-    ]
-    
-    for i, (filepath, category) in enumerate(files, 1):
-        try:
-            content, source_url = read_markdown_file(filepath)
-            
-            # Extract a title from the filename or content
-            filename = filepath.stem.replace('developers_', '').replace('__sources_', '').replace('_', ' ').title()
-            
-            # Try to get the actual title from content
-            title_match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
-            if title_match:
-                doc_title = title_match.group(1)
-            else:
-                doc_title = filename
-            
-            lines.append(f"## {doc_title}")
-            lines.append("")
-            if source_url and source_url.startswith('http'):
-                lines.append(f"*Source: {source_url}*")
-                lines.append("")
-            lines.append(content)
-            lines.append("")
-            lines.append("---")
-            lines.append("")
-            
-        except Exception as e:
-            print(f"Error processing {filepath}: {e}")
-            continue
-    
-    output_path.write_text('\n'.join(lines), encoding='utf-8')
-    print(f"✓ Created {output_path.name} with {len(files)} sections")
+def source_hash(content: str, source_url: str) -> str:
+    """Hash of everything in a page file that affects its section."""
+    return hashlib.sha256(f"{source_url}\0{content}".encode('utf-8')).hexdigest()
 
 
-def main():
-    """Main function to combine all docs."""
-    archive_docs_dir = Path('archive_docs')
+def scan_file(filepath: Path, need_blocks: bool = False, key: Optional[str] = None) -> Optional[ScanResult]:
+    """
+    Hash one file for the section cache, with its candidate boilerplate blocks.
     
-    if not archive_docs_dir.exists():
-        print(f"Error: {archive_docs_dir} directory not found")
+    Args:
+        key: Key of the file in the cache (default: its name)
+    
+    Returns:
+        (key, source hash, stamp, block keys), or None if unreadable
+    """
+    try:
+        stamp = file_stamp(filepath)
+        content, source_url = read_markdown_file(filepath)
+    except Exception as e:
+        print(f"Warning: Could not read {filepath}: {e}")
+        return None
+    blocks = page_block_keys(content) if need_blocks else None
+    return key or filepath.name, source_hash(content, source_url), stamp, blocks
+
+
+def iter_scanned(
+    files: List[Path],
+    need_blocks: bool = False,
+    workers: Optional[int] = None,
+    use_threads: bool = False,
+    keys: Optional[List[str]] = None,
+) -> Iterator[ScanResult]:
+    """Scan files for the section cache in a worker pool."""
+    workers = workers or os.cpu_count() or 1
+    flags = [need_blocks] * len(files)
+    keys = keys or [None] * len(files)
+    if workers <= 1 or len(files) < 2:
+        yield from filter(None, map(scan_file, files, flags, keys))
         return
     
-    # Get all markdown files except INDEX.md
-    all_files = [
-        f for f in archive_docs_dir.glob('*.md')
-        if f.name != 'INDEX.md' and not f.name.startswith('combined_')
-    ]
+    pool_class = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+    with pool_class(max_workers=workers) as executor:
+        yield from filter(None, executor.map(scan_file, files, flags, keys, chunksize=16))
+
+
+@METRICS.timed('combine')
+def combine_directory(
+    docs_dir: Path,
+    output_dir: Path,
+    site: SiteConfig = SITE,
+    workers: Optional[int] = None,
+    use_threads: bool = False,
+    dedup: Optional[bool] = None,
+    full: bool = False,
+) -> None:
+    """
+    Combine a directory of crawled pages into the site's category documents.
+    
+    Rendered sections are cached in the output directory. Only files whose
+    size, modification time and then content changed are parsed again, in
+    parallel, and only documents whose list of sections changed are
+    rewritten, by splicing the cached sections in sorted filename order.
     
-    print(f"Found {len(all_files)} markdown files to combine\n")
+    With deduplication (dedup, or the site's dedup setting when None),
+    boilerplate blocks found across the directory are stripped and
+    duplicate pages are skipped.
     
-    # Read and categorize all files
-    categorized = {
-        'getting_started': [],
-        'tutorials': [],
-        'api_reference': []
-    }
+    Args:
+        full: Ignore the section cache and render every file again
+    """
+    if not docs_dir.exists():
+        print(f"Error: {docs_dir} directory not found")
+        return
     
-    for filepath in all_files:
-        try:
-            content, _ = read_markdown_file(filepath)
-            category = categorize_file(filepath.name, content)
-            categorized[category].append((filepath, category))
-        except Exception as e:
-            print(f"Warning: Could not categorize {filepath}: {e}")
-    
-    # Also handle files that might need manual categorization
-    # Move internetarchive library docs to getting_started
-    for filepath in categorized['api_reference']:
-        if 'internetarchive' in filepath[0].name.lower() and 'api' not in filepath[0].name.lower():
-            # Move non-API internetarchive docs to getting_started
-            categorized['getting_started'].append(filepath)
-            categorized['api_reference'].remove(filepath)
+    # Get all markdown files except INDEX.md, keyed by their name relative
+    # to docs_dir and ordered by their flat-style name, so sections come out
+    # in the same order in either layout
+    listing = sorted(
+        (display_name(name), name, f)
+        for f in iter_page_files(docs_dir) if not f.name.startswith('combined_')
+        for name in [relative_filename(f, docs_dir)]
+    )
+    files = {name: f for _, name, f in listing}
     
-    # Print categorization summary
-    print("Categorization:")
-    print(f"  Getting Started: {len(categorized['getting_started'])} files")
-    print(f"  Tutorials: {len(categorized['tutorials'])} files")
-    print(f"  API Reference: {len(categorized['api_reference'])} files")
-    print()
+    print(f"Found {len(files)} markdown files to combine\n")
     
     # Create output directory
-    output_dir = Path('combined_docs')
-    output_dir.mkdir(exist_ok=True)
-    
-    # Combine files
-    create_combined_document(
-        categorized['getting_started'],
-        output_dir / '01_getting_started.md',
-        "Internet Archive Developer Documentation - Getting Started",
-        "This document contains all getting started guides, quick start tutorials, installation instructions, and basic setup information for the Internet Archive Developer APIs."
-    )
+    output_dir.mkdir(parents=True, exist_ok=True)
     
-    create_combined_document(
-        categorized['tutorials'],
-        output_dir / '02_tutorials.md',
-        "Internet Archive Developer Documentation - Tutorials",
-        "This document contains step-by-step tutorials and how-to guides for common tasks using the Internet Archive APIs."
-    )
+    if dedup is None:
+        dedup = site.dedup
+    deduplicator = site.deduplicator if dedup else None
+    
+    def scan(names: List[str], need_blocks: bool) -> Iterator[ScanResult]:
+        return iter_scanned([files[n] for n in names], need_blocks, workers, use_threads, names)
+    
+    def render(names: List[str], boilerplate: Optional[Set[str]]) -> Iterator[CachedSection]:
+        # Rules that only look at file names categorize all changed files
+        # in one batch up front instead of file by file in the workers
+        categorizer = site.categorizer
+        categories = {}
+        if not categorizer.needs_content:
+            with METRICS.span('categorize'):
+                categories = dict(zip(names, categorizer.categorize_many({'filename': display_name(n)} for n in names)))
+            categorizer = None
+        parsed = iter_parsed([files[n] for n in names], categorizer, workers, use_threads, boilerplate)
+        for name, (filepath, category, section, error, fp, source_url) in zip(names, parsed):
+            if error:
+                print(f"Warning: Could not process {filepath}: {error}")
+                continue
+            yield CachedSection(name, category or categories[name], section, source_url, fp)
     
-    create_combined_document(
-        categorized['api_reference'],
-        output_dir / '03_api_reference.md',
-        "Internet Archive Developer Documentation - API Reference",
-        "This document contains complete API reference documentation, advanced topics, metadata schemas, and detailed technical specifications for the Internet Archive Developer APIs."
+    settings = {
+        'combiner': 'archive',
+        'version': RENDER_VERSION,
+        'rules': site.rules,
+        'default_category': site.default_category,
+        'content_chars': site.content_chars,
+        'dedup': bool(deduplicator),
+    }
+    counts = combine_cached(
+        list(files),
+        output_dir,
+        site.categories,
+        settings,
+        scan,
+        render,
+        stamps={name: file_stamp(f) for name, f in files.items()},
+        deduplicator=deduplicator,
+        full=full,
     )
     
+    if deduplicator:
+        print(f"Deduplication: {deduplicator.report.summary()}\n")
+    
+    # Print categorization summary
+    print("Categorization:")
+    for c in site.categories:
+        print(f"  {c.get('label', c['name'])}: {counts[c['name']]} files")
+    
     print(f"\n✅ All documents combined successfully!")
     print(f"Output directory: {output_dir}")
     print(f"\nCreated files:")
-    print(f"  - 01_getting_started.md ({len(categorized['getting_started'])} sections)")
-    print(f"  - 02_tutorials.md ({len(categorized['tutorials'])} sections)")
-    print(f"  - 03_api_reference.md ({len(categorized['api_reference'])} sections)")
+    for c in site.categories:
+        print(f"  - {c['filename']} ({counts[c['name']]} sections)")
 
 
-if __name__ == "__main__":
-    main()
-
+def main():
+    """Main function to combine all docs."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description="Combine crawled Internet Archive docs into organized documents"
+    )
+    parser.add_argument(
+        '--input-dir',
+        default=SITE.output_dir,
+        help=f'Directory with the crawled markdown files (default: {SITE.output_dir})'
+    )
+    parser.add_argument(
+        '--output-dir',
+        default=str(SITE.combined_dir),
+        help=f'Output directory for the combined documents (default: {SITE.combined_dir})'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Number of parallel parsing workers (default: number of CPUs)'
+    )
+    parser.add_argument(
+        '--threads',
+        action='store_true',
+        help='Parse in threads instead of processes'
+    )
+    parser.add_argument(
+        '--no-dedup',
+        action='store_true',
+        help='Keep duplicate pages and boilerplate blocks'
+    )
+    parser.add_argument(
+        '--full',
+        action='store_true',
+        help='Ignore the section cache and rebuild every section'
+    )
+    add_metrics_arguments(parser)
+    parser.add_argument(
+        '--chunk-tokens',
+        type=int,
+        default=SITE.chunk_tokens,
+        help=f'Also split the documents into parts of at most this many tokens (default: {SITE.chunk_tokens}, 0 to disable)'
+    )
+    
+    args = parser.parse_args()
+    
+    output_dir = Path(args.output_dir)
+    with run_report(args, 'combine_archive', {'site': SITE.name}):
+        combine_directory(
+            Path(args.input_dir),
+            output_dir,
+            workers=args.workers,
+            use_threads=args.threads,
+            dedup=False if args.no_dedup else None,
+            full=args.full,
+        )
+        
+        if args.chunk_tokens:
+            paths = [output_dir / c['filename'] for c in SITE.categories if (output_dir / c['filename']).exists()]
+            chunk_files(paths, output_dir / 'chunks', args.chunk_tokens)
 
 
+if __name__ == "__main__":
+    main()
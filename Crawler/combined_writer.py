@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Buffered writer for combined documentation files.
+
+Combined documents are written section by section through a buffered file
+instead of being assembled as one big list of lines, so memory use does not
+grow with the size of the output. The file is written under a temporary
+name and only replaces the previous document once it is complete. Each
+document gets a sidecar index of its sections' byte ranges (see
+section_index.py).
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import List, Optional
+
+from page_writer import temp_path
+from section_index import section_title, write_index
+
+DEFAULT_BUFFER_SIZE = 1 << 20
+
+
+def header_text(title: str, description: str) -> str:
+    """Render the document header."""
+    return '\n'.join([
+        f"# {title}",
+        "",
+        description,
+        "",
+        "---",
+        "",
+        ""
+    ])
+
+
+def section_text(lines: List[str]) -> str:
+    """
+    Render a section from its lines.
+
+    Every section starts with the newline that separated it from the
+    previous one when documents were built with a single '\\n'.join.
+    """
+    return '\n' + '\n'.join(lines)
+
+
+class CombinedDocumentWriter:
+    """Stream a header and sections into one combined markdown file."""
+
+    def __init__(self, output_path: Path, title: str, description: str, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        self.output_path = Path(output_path)
+        self.sections = 0
+        # Byte range and hash of every section, for the sidecar index
+        self.index: List[dict] = []
+        self._tmp_path = temp_path(self.output_path)
+        self._file = self._tmp_path.open('wb', buffering=buffer_size)
+        self._offset = 0
+        self._write(header_text(title, description).encode('utf-8'))
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._offset += len(data)
+
+    def write_section(self, text: str, source_url: Optional[str] = None, category: Optional[str] = None) -> None:
+        """Append a rendered section."""
+        data = text.encode('utf-8')
+        # The index covers the section from its heading on, without the
+        # newline separating it from the previous one
+        skip = 1 if data.startswith(b'\n') else 0
+        body = data[skip:]
+        self.index.append({
+            'title': section_title(text),
+            'source_url': source_url or '',
+            'category': category or '',
+            'offset': self._offset + skip,
+            'length': len(body),
+            'sha256': hashlib.sha256(body).hexdigest(),
+        })
+        self._write(data)
+        self.sections += 1
+
+    def close(self) -> None:
+        """Flush the output file, move it into place and write its section index."""
+        if not self._file.closed:
+            self._file.close()
+            os.replace(self._tmp_path, self.output_path)
+            write_index(self.output_path, self._offset, self.index)
+
+    def abort(self) -> None:
+        """Discard the output, keeping any previous document."""
+        if not self._file.closed:
+            self._file.close()
+            self._tmp_path.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Long-running daemon that re-crawls documentation sites on a schedule.
+
+Run from cron, every crawl pays for interpreter startup, imports and new
+clients, and it re-reads each output directory's manifest. The daemon
+instead keeps one crawler per site for as long as it runs. Each crawler's
+HTTP sessions, scrape connection pool, manifest, catalog and search index
+stay open between runs. Every site shares the per-host rate limiter. Each
+site is re-crawled on its own schedule (`schedule` in sites.toml, default
+--every); the first runs start right away.
+
+A site never runs twice at once. In the daemon, a site that is still running
+(or waiting for a free --parallel slot) is not started again. Other
+processes are kept out by the output directory lock that the crawl scripts
+also take, so a manual or cron crawl of the same site fails instead of
+racing the daemon. The daemon's crawl does the same when it finds the lock
+taken.
+
+The daemon is controlled through a Unix socket that only its owner can use
+(default .crawl_daemon.sock next to this script). Each request is one line
+of JSON, e.g. {"command": "trigger", "site": "archive"}, and is answered
+with one line of JSON. The subcommands below send these requests. SIGTERM or
+SIGINT stop the daemon once the running crawls are done.
+
+Usage:
+    python3 crawl_daemon.py serve --all --changed-only
+    python3 crawl_daemon.py serve archive clanker --every 12h --parallel 2
+    python3 crawl_daemon.py status
+    python3 crawl_daemon.py trigger archive
+    python3 crawl_daemon.py pause clanker
+    python3 crawl_daemon.py resume clanker
+    python3 crawl_daemon.py stop
+"""
+
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from base_crawler import BaseDocsCrawler, add_crawl_arguments, crawler_options, run_crawler
+from docs_crawl import build_crawler, combine_site
+from manifest import parse_duration
+from metrics import METRICS, write_reports
+from ratelimit import shared_limiter
+from sites import SiteConfig, load_sites
+
+SOCKET_FILE = Path(__file__).with_name('.crawl_daemon.sock')
+DEFAULT_EVERY = '24h'
+COMMANDS = ('status', 'trigger', 'pause', 'resume', 'stop', 'metrics')
+# Longest the scheduler sleeps without looking at the clock again
+MAX_SLEEP = 60.0
+
+
+def _duration(seconds: float) -> str:
+    """Readable interval: 21600 -> 6h."""
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size and seconds % size == 0:
+            return f"{seconds / size:g}{unit}"
+    return f"{seconds:g}s"
+
+
+def _timestamp(value: Optional[float]) -> Optional[str]:
+    if value is None:
+        return None
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(value))
+
+
+class SiteSchedule:
+    """Schedule, state and last result of one site in the daemon."""
+
+    def __init__(self, site: SiteConfig, interval: float):
+        self.site = site
+        self.interval = interval
+        self.next_run = time.time()
+        # idle, queued (waiting for a --parallel slot) or running
+        self.state = 'idle'
+        self.paused = False
+        # Set by a trigger request; runs the site once even while paused
+        self.triggered = False
+        self.runs = 0
+        self.last_run: Optional[dict] = None
+        # Kept between runs so its connections and in-memory state stay warm
+        self.crawler: Optional[BaseDocsCrawler] = None
+
+    def due(self, now: float) -> bool:
+        return self.state == 'idle' and (self.triggered or (not self.paused and self.next_run <= now))
+
+    def status(self) -> dict:
+        return {
+            'site': self.site.name,
+            'state': self.state,
+            'paused': self.paused,
+            'interval_seconds': self.interval,
+            'next_run': _timestamp(self.next_run) if self.state == 'idle' and not self.paused else None,
+            'runs': self.runs,
+            'last_run': self.last_run,
+        }
+
+
+class CrawlDaemon:
+    """Runs the scheduled crawls of several sites and answers control requests."""
+
+    def __init__(self, sites: List[SiteConfig], api_key: str, args, every: float):
+        """
+        Args:
+            sites: Sites to crawl
+            api_key: Firecrawl API key
+            args: Parsed crawl arguments (see add_crawl_arguments), applied to every run
+            every: Seconds between runs of sites without a schedule of their own
+        """
+        self.api_key = api_key
+        self.args = args
+        self.parallel = max(1, args.parallel)
+        # One limiter for every site, so parallel crawls share the request budget
+        self.rate_limiter = shared_limiter(args.rate, args.rate_lock_dir)
+        self.schedules: Dict[str, SiteSchedule] = {
+            site.name: SiteSchedule(site, parse_duration(site.schedule) if site.schedule else every)
+            for site in sites
+        }
+        self.started_at = time.time()
+        self.stopping = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def run(self) -> None:
+        """Start due crawls until stop() is called, then wait for the running ones."""
+        with ThreadPoolExecutor(max_workers=self.parallel) as executor:
+            while not self.stopping:
+                self._wake.clear()
+                now = time.time()
+                with self._lock:
+                    due = [s for s in self.schedules.values() if s.due(now)]
+                    for schedule in due:
+                        schedule.state = 'queued'
+                        schedule.triggered = False
+                for schedule in due:
+                    executor.submit(self._run_site, schedule)
+                self._wake.wait(self._sleep_time())
+        for schedule in self.schedules.values():
+            if schedule.crawler is not None:
+                schedule.crawler.close()
+
+    def _sleep_time(self) -> float:
+        with self._lock:
+            waiting = [s.next_run for s in self.schedules.values() if s.state == 'idle' and not s.paused]
+        if not waiting:
+            return MAX_SLEEP
+        return min(max(0.0, min(waiting) - time.time()), MAX_SLEEP)
+
+    def _run_site(self, schedule: SiteSchedule) -> None:
+        """Crawl (and combine) one site, then schedule its next run."""
+        site = schedule.site
+        with self._lock:
+            if self.stopping:
+                schedule.state = 'idle'
+                return
+            schedule.state = 'running'
+        started = time.time()
+        result: dict = {'started_at': _timestamp(started)}
+        print(f"[{site.name}] Crawling {site.base_url} into {site.output_dir}/")
+        try:
+            if schedule.crawler is None:
+                schedule.crawler = build_crawler(site, self.api_key, self.rate_limiter, **crawler_options(self.args))
+            else:
+                schedule.crawler.start_run()
+            crawler = schedule.crawler
+            run_crawler(crawler, self.args)
+            # Combined documents of a site where nothing changed are still current
+            if not self.args.skip_combine and (crawler.saved or not site.combined_dir.exists()):
+                combine_site(site, self.args.chunk_tokens)
+            result.update(saved=crawler.saved, unchanged=crawler.unchanged, failed=len(crawler.failed_urls))
+            METRICS.incr('daemon_runs')
+        except Exception as e:
+            result['error'] = str(e)
+            METRICS.incr('daemon_errors')
+            print(f"[{site.name}] ✗ Crawl failed: {e}")
+        finished = time.time()
+        result.update(finished_at=_timestamp(finished), duration_seconds=round(finished - started, 3))
+
+        with self._lock:
+            schedule.state = 'idle'
+            schedule.runs += 1
+            schedule.last_run = result
+            schedule.next_run = started + schedule.interval
+            if schedule.next_run <= finished:
+                # The run took longer than the interval; skip the missed runs
+                schedule.next_run = finished + schedule.interval
+        print(f"[{site.name}] Next crawl at {_timestamp(schedule.next_run)}")
+        try:
+            write_reports(self.args, {'run': 'crawl_daemon'})
+        except OSError as e:
+            print(f"Warning: could not write metrics ({e})")
+        self._wake.set()
+
+    def stop(self) -> None:
+        """Stop starting crawls; run() returns once the running ones are done."""
+        self.stopping = True
+        self._wake.set()
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'started_at': _timestamp(self.started_at),
+                'stopping': self.stopping,
+                'sites': [self.schedules[name].status() for name in sorted(self.schedules)],
+            }
+
+    def handle(self, request: dict) -> dict:
+        """Answer one control request."""
+        command = request.get('command')
+        name = request.get('site')
+        if command not in COMMANDS:
+            return {'ok': False, 'error': f"Unknown command: {command!r} (use one of {', '.join(COMMANDS)})"}
+        if command == 'metrics':
+            return {'ok': True, 'metrics': METRICS.snapshot({'run': 'crawl_daemon'})}
+        if command == 'stop':
+            self.stop()
+        if name is not None and name not in self.schedules:
+            return {'ok': False, 'error': f"Unknown site: {name!r}"}
+
+        busy = []
+        with self._lock:
+            targets = [self.schedules[name]] if name else list(self.schedules.values())
+            for schedule in targets:
+                if command == 'trigger':
+                    if schedule.state == 'idle':
+                        schedule.triggered = True
+                    else:
+                        busy.append(schedule.site.name)
+                elif command == 'pause':
+                    schedule.paused = True
+                elif command == 'resume':
+                    schedule.paused = False
+        self._wake.set()
+        response = {'ok': True, **self.status()}
+        if busy:
+            response['already_running'] = busy
+        return response
+
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+    """Reads JSON requests from a control connection, one per line."""
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("a request is a JSON object")
+                response = self.server.crawl_daemon.handle(request)
+            except ValueError as e:
+                response = {'ok': False, 'error': f"Invalid request: {e}"}
+            self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+
+
+def open_control_socket(path: Path, crawl_daemon: CrawlDaemon) -> socketserver.BaseServer:
+    """
+    Listen for control requests on a Unix socket only the current user can use.
+
+    Raises:
+        ValueError: If another daemon is listening on the socket
+    """
+    path = Path(path)
+    if path.exists():
+        try:
+            send_command(path, 'status')
+        except (OSError, ValueError):
+            # Left behind by a daemon that did not shut down cleanly
+            path.unlink()
+        else:
+            raise ValueError(f"A crawl daemon is already listening on {path}")
+    umask = os.umask(0o177)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(str(path), _ControlHandler)
+    finally:
+        os.umask(umask)
+    server.daemon_threads = True
+    server.crawl_daemon = crawl_daemon
+    return server
+
+
+def send_command(path: Path, command: str, site: Optional[str] = None, timeout: float = 10.0) -> dict:
+    """
+    Send one request to a running daemon and return its answer.
+
+    Raises:
+        OSError: If no daemon is listening on the socket
+        ValueError: If the answer is not JSON
+    """
+    request = {'command': command}
+    if site:
+        request['site'] = site
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(path))
+        sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise ValueError("The daemon closed the connection without answering")
+    return json.loads(line)
+
+
+def _print_status(status: dict) -> None:
+    print(f"Crawl daemon (pid {status['pid']}) running since {status['started_at']}"
+          + (", stopping" if status.get('stopping') else ""))
+    for entry in status['sites']:
+        state = 'paused' if entry['paused'] and entry['state'] == 'idle' else entry['state']
+        line = f"  {entry['site']:<16} {state:<8} every {_duration(entry['interval_seconds'])}"
+        if entry['next_run']:
+            line += f", next {entry['next_run']}"
+        last = entry['last_run']
+        if last:
+            if 'error' in last:
+                outcome = f"✗ {last['error']}"
+            else:
+                outcome = f"{last['saved']} saved, {last['unchanged']} unchanged, {last['failed']} failed"
+            line += f"; last {last['started_at']} ({outcome}, {last['duration_seconds']:.1f}s)"
+        print(line)
+
+
+def serve(args, parser) -> None:
+    """Run the daemon in the foreground until it is stopped."""
+    try:
+        registry = load_sites(args.config)
+    except (OSError, ValueError) as e:
+        print(f"Error loading site registry: {e}")
+        exit(1)
+
+    names = sorted(registry) if args.all else args.sites
+    if not names:
+        parser.error("name at least one site, or pass --all")
+    unknown = [n for n in names if n not in registry]
+    if unknown:
+        print(f"Error: unknown site(s): {', '.join(unknown)}")
+        print(f"Known sites: {', '.join(sorted(registry))}")
+        exit(1)
+    if args.worker or args.coordinate or args.plan:
+        print("Error: --worker, --coordinate and --plan cannot be scheduled; use docs_crawl.py")
+        exit(1)
+    every = parse_duration(args.every)
+    if not every:
+        print(f"Error: invalid --every value: {args.every!r} (use e.g. 6h or 1d)")
+        exit(1)
+
+    api_key = args.api_key or os.getenv('FIRECRAWL_API_KEY')
+    if not api_key:
+        print("Error: Firecrawl API key not found.")
+        print("Please either:")
+        print("  1. Set FIRECRAWL_API_KEY in your .env file")
+        print("  2. Pass --api-key argument")
+        exit(1)
+
+    crawl_daemon = CrawlDaemon([registry[name] for name in names], api_key, args, every)
+    try:
+        server = open_control_socket(Path(args.socket), crawl_daemon)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        exit(1)
+    threading.Thread(target=server.serve_forever, name='crawl-daemon-control', daemon=True).start()
+
+    def on_signal(signum, frame):
+        if not crawl_daemon.stopping:
+            print("\nStopping once the running crawls are done...")
+        crawl_daemon.stop()
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+
+    print(f"Crawl daemon scheduling {len(names)} site(s), control socket {args.socket}")
+    try:
+        crawl_daemon.run()
+    finally:
+        server.shutdown()
+        server.server_close()
+        Path(args.socket).unlink(missing_ok=True)
+    print("Crawl daemon stopped")
+
+
+def main():
+    """Run the daemon or send it a command."""
+    import argparse
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Re-crawl documentation sites on a schedule from one long-running process")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = sub.add_parser('serve', help='Run the daemon in the foreground')
+    serve_parser.add_argument('sites', nargs='*', help='Names of the sites to crawl')
+    serve_parser.add_argument('--all', action='store_true', help='Crawl every configured site')
+    serve_parser.add_argument('--config', default=None, help='Site registry file (default: sites.toml next to this script)')
+    serve_parser.add_argument('--every', default=DEFAULT_EVERY,
+                              help=f'Time between crawls of sites without a schedule in sites.toml, e.g. 6h (default: {DEFAULT_EVERY})')
+    serve_parser.add_argument('--parallel', type=int, default=1, help='Number of sites to crawl at the same time (default: 1)')
+    serve_parser.add_argument('--skip-combine', action='store_true', help='Only crawl, do not build the combined documents')
+    serve_parser.add_argument('--chunk-tokens', type=int, default=None,
+                              help='Split combined documents into parts of at most this many tokens (default: chunk_tokens in sites.toml, 0 to disable)')
+    add_crawl_arguments(serve_parser)
+
+    sub.add_parser('status', help='Show every site\'s state, next and last crawl')
+    sub.add_parser('metrics', help='Print the metrics collected since the daemon started')
+    for command, help_text in (
+        ('trigger', 'Crawl now (once, even if paused); all sites if none is named'),
+        ('pause', 'Stop starting scheduled crawls; all sites if none is named'),
+        ('resume', 'Start scheduled crawls again; all sites if none is named'),
+    ):
+        command_parser = sub.add_parser(command, help=help_text)
+        command_parser.add_argument('site', nargs='?', default=None, help='Site name')
+    sub.add_parser('stop', help='Stop the daemon once the running crawls are done')
+    for command_parser in sub.choices.values():
+        command_parser.add_argument('--socket', default=str(SOCKET_FILE),
+                                    help='Control socket of the daemon (default: .crawl_daemon.sock next to this script)')
+
+    args = parser.parse_args()
+    if not hasattr(socket, 'AF_UNIX'):
+        print("Error: the crawl daemon needs Unix domain sockets")
+        exit(1)
+
+    if args.command == 'serve':
+        serve(args, serve_parser)
+        return
+
+    try:
+        response = send_command(Path(args.socket), args.command, getattr(args, 'site', None))
+    except (OSError, ValueError) as e:
+        print(f"Error: no crawl daemon answering on {args.socket} ({e})")
+        exit(1)
+    if not response.get('ok'):
+        print(f"Error: {response.get('error')}")
+        exit(1)
+    if args.command == 'metrics':
+        print(json.dumps(response['metrics'], indent=2))
+        return
+    if args.command == 'stop':
+        print("✓ Crawl daemon is stopping once the running crawls are done")
+        return
+    for name in response.get('already_running', []):
+        print(f"= {name} is already running, not started again")
+    _print_status(response)
+
+
+if __name__ == "__main__":
+    main()
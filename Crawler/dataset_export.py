@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Export crawled pages as one dataset file.
+
+Analytics and embedding jobs would otherwise glob the output directory and
+parse every page file. The exporter writes every page as one row, with the
+columns below, to a gzip-compressed JSON-lines file or to Parquet. That way
+the corpus loads in one sequential read, and Parquet readers can load only
+the columns they need.
+
+    url, filename, title, description, category, content_hash, size,
+    crawled_at, markdown
+
+Rows are buffered and written batch_size at a time: one gzip write per batch
+for JSONL, one row group per batch for Parquet. The file is written under a
+temporary name and only replaces the previous export when it is complete.
+In JSONL crawled_at is a UNIX timestamp; in Parquet it is a UTC timestamp.
+
+Parquet needs pyarrow (`pip install pyarrow`); JSONL has no dependencies.
+
+The crawlers export the pages they save or confirm unchanged in a run with
+--export. Whole output directories are exported from their page files and
+catalog.
+
+Usage:
+    python3 dataset_export.py archive_docs
+    python3 dataset_export.py archive_docs --format parquet --output corpus.parquet
+"""
+
+import gzip
+import json
+import os
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+from metrics import METRICS
+from page_writer import temp_path
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional: only JSONL can be written
+    pyarrow = None
+
+FORMATS = ('jsonl', 'parquet')
+DEFAULT_NAME = 'pages'
+DEFAULT_BATCH_SIZE = 1000
+
+COLUMNS = (
+    'url', 'filename', 'title', 'description', 'category',
+    'content_hash', 'size', 'crawled_at', 'markdown',
+)
+
+
+def default_path(output_dir: Path, fmt: str) -> Path:
+    """Where an output directory's export goes unless told otherwise."""
+    suffix = '.parquet' if fmt == 'parquet' else '.jsonl.gz'
+    return Path(output_dir) / f"{DEFAULT_NAME}{suffix}"
+
+
+def format_for_path(path: Path) -> str:
+    """Dataset format implied by a file name."""
+    return 'parquet' if Path(path).suffix == '.parquet' else 'jsonl'
+
+
+def _parquet_schema():
+    return pyarrow.schema([
+        ('url', pyarrow.string()),
+        ('filename', pyarrow.string()),
+        ('title', pyarrow.string()),
+        ('description', pyarrow.string()),
+        ('category', pyarrow.string()),
+        ('content_hash', pyarrow.string()),
+        ('size', pyarrow.int64()),
+        ('crawled_at', pyarrow.timestamp('ms', tz='UTC')),
+        ('markdown', pyarrow.string()),
+    ])
+
+
+class DatasetExporter:
+    """Writes page rows to a JSONL or Parquet dataset in batches."""
+
+    def __init__(self, path: Path, fmt: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Args:
+            path: Dataset file; .jsonl.gz files are gzip-compressed
+            fmt: 'jsonl' or 'parquet' (default: from the file name)
+
+        Raises:
+            ValueError: If the format is unknown or Parquet is asked for
+                without pyarrow installed
+        """
+        self.path = Path(path)
+        self.format = fmt or format_for_path(self.path)
+        if self.format not in FORMATS:
+            raise ValueError(f"Unknown export format: {self.format!r} (use one of {', '.join(FORMATS)})")
+        if self.format == 'parquet' and pyarrow is None:
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+        self.batch_size = max(1, batch_size)
+        self.rows = 0
+        self._batch: List[dict] = []
+        self._seen = set()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp = temp_path(self.path)
+        if self.format == 'parquet':
+            self._writer = pyarrow.parquet.ParquetWriter(str(self._tmp), _parquet_schema(), compression='zstd')
+        elif self.path.suffix == '.gz':
+            self._writer = gzip.open(self._tmp, 'wb', compresslevel=6)
+        else:
+            self._writer = open(self._tmp, 'wb')
+
+    def add(
+        self,
+        url: str,
+        filename: str,
+        markdown: str,
+        title: str = '',
+        description: str = '',
+        category: Optional[str] = None,
+        content_hash: str = '',
+        size: Optional[int] = None,
+        crawled_at: Optional[float] = None,
+    ) -> None:
+        """
+        Add one page; a page added twice is only written the first time.
+
+        size is that of the page file, frontmatter included.
+        """
+        if url in self._seen:
+            return
+        self._seen.add(url)
+        self._batch.append({
+            'url': url,
+            'filename': filename,
+            'title': title,
+            'description': description,
+            'category': category,
+            'content_hash': content_hash,
+            'size': size,
+            'crawled_at': crawled_at,
+            'markdown': markdown,
+        })
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    @METRICS.timed('export.write')
+    def flush(self) -> None:
+        """Write the buffered rows as one batch."""
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        if self.format == 'parquet':
+            columns = {name: [row[name] for row in batch] for name in COLUMNS}
+            columns['crawled_at'] = [
+                int(t * 1000) if t is not None else None for t in columns['crawled_at']
+            ]
+            self._writer.write_table(pyarrow.Table.from_pydict(columns, schema=_parquet_schema()))
+        else:
+            lines = ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in batch)
+            self._writer.write(lines.encode('utf-8'))
+        self.rows += len(batch)
+        METRICS.incr('pages_exported', len(batch))
+
+    def close(self) -> None:
+        """Write the last batch and move the dataset into place."""
+        if self._writer is None:
+            return
+        try:
+            self.flush()
+            self._writer.close()
+            os.replace(self._tmp, self.path)
+        except BaseException:
+            self._tmp.unlink(missing_ok=True)
+            raise
+        finally:
+            self._writer = None
+
+    def discard(self) -> None:
+        """Drop the rows written so far, keeping any previous dataset."""
+        if self._writer is None:
+            return
+        try:
+            self._writer.close()
+        finally:
+            self._writer = None
+            self._batch = []
+            self._tmp.unlink(missing_ok=True)
+
+    def __enter__(self) -> 'DatasetExporter':
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def _timestamp(value: str) -> Optional[float]:
+    """UNIX time of a frontmatter crawled_at value."""
+    try:
+        return time.mktime(time.strptime(value, '%Y-%m-%d %H:%M:%S'))
+    except (TypeError, ValueError):
+        return None
+
+
+@METRICS.timed('export.directory')
+def export_directory(output_dir: Path, exporter: DatasetExporter) -> int:
+    """
+    Export every page of an output directory.
+
+    Titles and descriptions come from the frontmatter; categories, hashes
+    and crawl times from the catalog where it has them.
+
+    Returns:
+        Number of pages exported
+    """
+    from catalog import CATALOG_FILENAME, DocsCatalog
+    from frontmatter import iter_page_files, read_page
+    from layout import relative_filename
+    from manifest import content_hash
+
+    output_dir = Path(output_dir)
+    rows = {}
+    if (output_dir / CATALOG_FILENAME).exists():
+        catalog = DocsCatalog.for_directory(output_dir)
+        rows = {row['url']: row for row in catalog.all()}
+        catalog.close()
+
+    count = 0
+    for path in iter_page_files(output_dir):
+        meta, body = read_page(path)
+        if not meta.source_url:
+            continue
+        # save_markdown separates header and content with one blank line
+        markdown = body[1:] if body.startswith('\n') else body
+        row = rows.get(meta.source_url) or {}
+        exporter.add(
+            url=meta.source_url,
+            filename=relative_filename(path, output_dir),
+            markdown=markdown,
+            title=meta.title,
+            description=meta.description,
+            category=row.get('category'),
+            content_hash=row.get('content_hash') or content_hash(markdown),
+            size=meta.size,
+            crawled_at=row.get('crawled_at') or _timestamp(meta.crawled_at) or path.stat().st_mtime,
+        )
+        count += 1
+    return count
+
+
+def iter_dataset(path: Path, columns: Optional[Iterable[str]] = None) -> Iterator[dict]:
+    """
+    Read the rows of an exported dataset, optionally only some columns.
+
+    Parquet files are read one row group at a time and only the requested
+    columns are decoded.
+    """
+    path = Path(path)
+    columns = list(columns) if columns else None
+    if format_for_path(path) == 'parquet':
+        if pyarrow is None:
+            raise ValueError("Reading Parquet needs pyarrow (pip install pyarrow)")
+        for batch in pyarrow.parquet.ParquetFile(str(path)).iter_batches(columns=columns):
+            yield from batch.to_pylist()
+        return
+    opener = gzip.open if path.suffix == '.gz' else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            row = json.loads(line)
+            yield {name: row.get(name) for name in columns} if columns else row
+
+
+def main():
+    """Export an output directory as a dataset file."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the pages of a crawler output directory as JSONL or Parquet")
+    parser.add_argument('output_dir', help='Crawler output directory (e.g. archive_docs)')
+    parser.add_argument('--format', choices=FORMATS, default=None, help='Dataset format (default: from --output, else jsonl)')
+    parser.add_argument('--output', default=None, help='Dataset file (default: pages.jsonl.gz or pages.parquet in the output directory)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'Rows per write and Parquet row group (default: {DEFAULT_BATCH_SIZE})')
+
+    args = parser.parse_args()
+    output_dir = Path(args.output_dir)
+    if not output_dir.exists():
+        print(f"Error: {output_dir} directory not found")
+        exit(1)
+
+    fmt = args.format or (format_for_path(Path(args.output)) if args.output else 'jsonl')
+    path = Path(args.output) if args.output else default_path(output_dir, fmt)
+    try:
+        exporter = DatasetExporter(path, fmt, args.batch_size)
+    except ValueError as e:
+        print(f"Error: {e}")
+        exit(1)
+    with exporter:
+        count = export_directory(output_dir, exporter)
+    print(f"✓ Exported {count} pages to {path} ({path.stat().st_size / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Duplicate and boilerplate elimination for crawled pages.
+
+Firecrawl markdown repeats the same navigation menus, footers and
+"Was this helpful?" blocks on every page, and the same page is often
+reachable under several URLs. Before pages are combined, this stage:
+
+1. strips blocks (paragraphs, lists, link menus) that occur on more than
+   boilerplate_ratio of the pages,
+2. drops pages whose canonical URL was already seen,
+3. drops exact duplicates by a hash of the normalized content, and
+4. drops near-duplicates whose estimated Jaccard similarity of word
+   shingles with an earlier page is at least the threshold (MinHash with
+   LSH banding, so pages are never compared pairwise).
+
+The first page seen wins, so callers feed pages in a deterministic order.
+
+Usage:
+    python3 dedup.py archive_docs
+    python3 dedup.py clanker_docs --threshold 0.8 --boilerplate-ratio 0.3
+"""
+
+import hashlib
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_BOILERPLATE_RATIO = 0.5
+# Below this many pages a "recurring" block means little
+MIN_BOILERPLATE_PAGES = 5
+# Normalized blocks shorter than this are never treated as boilerplate
+MIN_BLOCK_CHARS = 12
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+BANDS = 32
+
+EMPTY_BIN = (1 << 64) - 1
+FENCE_RE = re.compile(r'^\s*(```|~~~)')
+WORD_RE = re.compile(r'\w+')
+
+
+def canonical_url(url: str) -> str:
+    """
+    Canonical form of a page URL.
+
+    Scheme and host are lowercased; the query, fragment, trailing slash,
+    `index.html` and `.html` suffixes are dropped.
+    """
+    parts = urlsplit(url.strip())
+    path = parts.path
+    if path.endswith('/index.html'):
+        path = path[:-len('index.html')]
+    elif path.endswith('.html'):
+        path = path[:-len('.html')]
+    path = path.rstrip('/') or '/'
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, '', ''))
+
+
+def split_blocks(markdown: str) -> List[str]:
+    """Split markdown at blank lines, keeping fenced code blocks whole."""
+    blocks, current = [], []
+    in_fence = False
+    for line in markdown.splitlines():
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+        if not in_fence and not line.strip():
+            if current:
+                blocks.append('\n'.join(current))
+                current = []
+            continue
+        current.append(line)
+    if current:
+        blocks.append('\n'.join(current))
+    return blocks
+
+
+def normalize(text: str) -> str:
+    """Lowercase and collapse whitespace."""
+    return ' '.join(text.lower().split())
+
+
+def block_key(block: str) -> Optional[str]:
+    """
+    Hash of a block that may be boilerplate, or None for blocks that never are.
+
+    Headings, horizontal rules, code blocks and very short blocks are kept
+    even if they recur, since they carry the structure of every page.
+    """
+    stripped = block.lstrip()
+    if stripped.startswith('#') or FENCE_RE.match(stripped) or set(stripped.strip()) <= set('-*_= '):
+        return None
+    text = normalize(block)
+    if len(text) < MIN_BLOCK_CHARS:
+        return None
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def page_block_keys(markdown: str) -> Set[str]:
+    """Distinct candidate boilerplate blocks of a page."""
+    return {key for key in map(block_key, split_blocks(markdown)) if key}
+
+
+def strip_blocks(markdown: str, boilerplate: Set[str]) -> str:
+    """Remove boilerplate blocks from a page."""
+    if not boilerplate:
+        return markdown
+    kept = [b for b in split_blocks(markdown) if block_key(b) not in boilerplate]
+    return '\n\n'.join(kept)
+
+
+def text_hash(markdown: str) -> str:
+    """Hash of the whitespace- and case-normalized text."""
+    return hashlib.sha256(normalize(markdown).encode('utf-8')).hexdigest()
+
+
+def minhash_signature(markdown: str, num_perm: int = NUM_PERM, shingle_words: int = SHINGLE_WORDS) -> Tuple[int, ...]:
+    """
+    MinHash signature of the word shingles of a text.
+
+    Uses one-permutation hashing: every shingle is hashed once and the hash
+    picks a bin, keeping the minimum per bin. Stable across processes.
+    """
+    words = WORD_RE.findall(markdown.lower())
+    if not words:
+        return ()
+    span = max(1, len(words) - shingle_words + 1)
+    signature = [EMPTY_BIN] * num_perm
+    for i in range(span):
+        shingle = ' '.join(words[i:i + shingle_words]).encode('utf-8')
+        h = int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), 'little')
+        slot, value = h % num_perm, h // num_perm
+        if value < signature[slot]:
+            signature[slot] = value
+    return tuple(signature)
+
+
+def estimate_similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    compared = equal = 0
+    for x, y in zip(a, b):
+        if x == EMPTY_BIN and y == EMPTY_BIN:
+            continue
+        compared += 1
+        equal += x == y
+    return equal / compared if compared else 0.0
+
+
+@dataclass
+class Fingerprint:
+    """What the deduplicator needs to know about one (stripped) page."""
+
+    content_hash: str
+    signature: Tuple[int, ...]
+
+
+def fingerprint(markdown: str, num_perm: int = NUM_PERM) -> Fingerprint:
+    """Fingerprint a page after boilerplate was stripped."""
+    return Fingerprint(text_hash(markdown), minhash_signature(markdown, num_perm))
+
+
+@dataclass
+class DedupReport:
+    """Counts and decisions of one deduplication run."""
+
+    pages: int = 0
+    url_duplicates: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    boilerplate_blocks: int = 0
+    dropped: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def kept(self) -> int:
+        return self.pages - len(self.dropped)
+
+    def summary(self) -> str:
+        return (
+            f"kept {self.kept}/{self.pages} pages "
+            f"({self.url_duplicates} URL, {self.exact_duplicates} exact and "
+            f"{self.near_duplicates} near duplicates dropped; "
+            f"{self.boilerplate_blocks} boilerplate blocks stripped)"
+        )
+
+
+class Deduplicator:
+    """Streaming duplicate filter; pages are checked in order, first one wins."""
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD,
+        boilerplate_ratio: float = DEFAULT_BOILERPLATE_RATIO,
+        num_perm: int = NUM_PERM,
+        bands: int = BANDS,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.boilerplate_ratio = boilerplate_ratio
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.boilerplate: Set[str] = set()
+        self.report = DedupReport()
+        self._urls: Dict[str, str] = {}
+        self._hashes: Dict[str, str] = {}
+        self._signatures: List[Tuple[str, Tuple[int, ...]]] = []
+        self._buckets: List[Dict[Tuple[int, ...], List[int]]] = [defaultdict(list) for _ in range(bands)]
+
+    def learn_boilerplate(self, page_keys: Iterable[Set[str]]) -> Set[str]:
+        """
+        Find the blocks that recur across too many pages.
+
+        Args:
+            page_keys: page_block_keys() of every page
+        """
+        counts = Counter()
+        pages = 0
+        for keys in page_keys:
+            counts.update(keys)
+            pages += 1
+        if self.boilerplate_ratio and pages >= MIN_BOILERPLATE_PAGES:
+            limit = self.boilerplate_ratio * pages
+            self.boilerplate = {key for key, n in counts.items() if n > limit}
+        self.report.boilerplate_blocks = len(self.boilerplate)
+        return self.boilerplate
+
+    def strip(self, markdown: str) -> str:
+        """Remove the learned boilerplate from a page."""
+        return strip_blocks(markdown, self.boilerplate)
+
+    def fingerprint(self, markdown: str) -> Fingerprint:
+        return fingerprint(markdown, self.num_perm)
+
+    def _bands(self, signature: Tuple[int, ...]) -> Iterable[Tuple[int, Tuple[int, ...]]]:
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def check(self, url: str, fp: Fingerprint) -> Optional[str]:
+        """
+        Check a page against the pages kept so far.
+
+        Returns:
+            Why the page is a duplicate, or None if it is kept (and remembered)
+        """
+        self.report.pages += 1
+        reason = None
+        canonical = canonical_url(url) if '://' in url else url
+        if canonical in self._urls:
+            self.report.url_duplicates += 1
+            reason = f"same URL as {self._urls[canonical]}"
+        elif fp.content_hash in self._hashes:
+            self.report.exact_duplicates += 1
+            reason = f"same content as {self._hashes[fp.content_hash]}"
+        elif self.threshold < 1 and fp.signature:
+            match = self._near_match(fp.signature)
+            if match:
+                self.report.near_duplicates += 1
+                reason = f"{match[1]:.0%} similar to {match[0]}"
+
+        if reason:
+            self.report.dropped[url] = reason
+            return reason
+
+        self._urls[canonical] = url
+        self._hashes[fp.content_hash] = url
+        if fp.signature:
+            index = len(self._signatures)
+            self._signatures.append((url, fp.signature))
+            for band, key in self._bands(fp.signature):
+                self._buckets[band][key].append(index)
+        return None
+
+    def _near_match(self, signature: Tuple[int, ...]) -> Optional[Tuple[str, float]]:
+        candidates = set()
+        for band, key in self._bands(signature):
+            candidates.update(self._buckets[band].get(key, ()))
+        best = None
+        for index in sorted(candidates):
+            url, other = self._signatures[index]
+            similarity = estimate_similarity(signature, other)
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (url, similarity)
+        return best
+
+
+def dedup_pages(pages: List[dict], dedup: Deduplicator) -> List[dict]:
+    """
+    Deduplicate crawled page dicts (url, markdown, metadata).
+
+    Returns:
+        The kept pages, in order, with boilerplate stripped from their markdown
+    """
+    dedup.learn_boilerplate(page_block_keys(page['markdown']) for page in pages)
+    kept = []
+    for page in pages:
+        markdown = dedup.strip(page['markdown'])
+        if dedup.check(page['url'], dedup.fingerprint(markdown)) is None:
+            kept.append(dict(page, markdown=markdown))
+    return kept
+
+
+def main():
+    """Report duplicates and boilerplate in a crawler output directory."""
+    import argparse
+
+    from base_crawler import load_existing_pages
+
+    parser = argparse.ArgumentParser(
+        description="Report duplicate pages and boilerplate blocks in crawled docs"
+    )
+    parser.add_argument('output_dir', help='Crawler output directory (e.g. archive_docs)')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f'Similarity at which pages count as near duplicates (default: {DEFAULT_THRESHOLD})'
+    )
+    parser.add_argument(
+        '--boilerplate-ratio',
+        type=float,
+        default=DEFAULT_BOILERPLATE_RATIO,
+        help=f'Strip blocks found on more than this share of pages (default: {DEFAULT_BOILERPLATE_RATIO})'
+    )
+
+    args = parser.parse_args()
+    output_dir = Path(args.output_dir)
+    if not output_dir.exists():
+        print(f"Error: {output_dir} directory not found")
+        exit(1)
+
+    pages = load_existing_pages(output_dir)
+    dedup = Deduplicator(args.threshold, args.boilerplate_ratio)
+    kept = dedup_pages(pages, dedup)
+
+    for url, reason in dedup.report.dropped.items():
+        print(f"  - {url}: {reason}")
+    before = sum(len(p['markdown'].encode('utf-8')) for p in pages)
+    after = sum(len(p['markdown'].encode('utf-8')) for p in kept)
+    print(f"\n{dedup.report.summary()}")
+    if before:
+        print(f"Content size: {before:,} -> {after:,} bytes ({1 - after / before:.0%} smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Crawl one or more documentation sites from the site registry.
+
+Usage:
+    python3 docs_crawl.py archive
+    python3 docs_crawl.py archive clanker --parallel 2
+    python3 docs_crawl.py --all
+    python3 docs_crawl.py --list
+
+Sites are configured in sites.toml. Several sites can be crawled in parallel
+from one process; they share a single per-host rate limiter so together they
+never exceed --rate against Firecrawl or any docs host.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+from base_crawler import (
+    BaseDocsCrawler,
+    add_crawl_arguments,
+    crawler_options,
+    load_existing_pages,
+    run_crawler,
+)
+from chunker import chunk_site
+from metrics import run_report
+from ratelimit import HostRateLimiter, shared_limiter
+from sites import SiteConfig, load_sites
+
+
+def combine_archive(site: SiteConfig) -> None:
+    """Combine a site with the file-based Internet Archive layout."""
+    from combine_docs import combine_directory
+    combine_directory(Path(site.output_dir), site.combined_dir, site)
+
+
+def combine_clanker(site: SiteConfig) -> None:
+    """Combine a site with the page-based Clanker layout."""
+    from crawl_clanker_docs import combine_into_documents
+    pages = load_existing_pages(Path(site.output_dir))
+    if pages:
+        combine_into_documents(pages, Path(site.output_dir), site)
+    else:
+        print(f"[{site.name}] No pages to combine.")
+
+
+COMBINERS = {
+    'archive': combine_archive,
+    'clanker': combine_clanker,
+}
+
+
+def build_crawler(
+    site: SiteConfig,
+    api_key: str,
+    rate_limiter: Optional[HostRateLimiter] = None,
+    **options,
+) -> BaseDocsCrawler:
+    """Create a crawler for a registered site."""
+    if options.get('limit') is None:
+        options['limit'] = site.limit
+    options.setdefault('include_paths', site.include_paths)
+    options.setdefault('exclude_paths', site.exclude_paths)
+    options.setdefault('max_depth', site.max_depth)
+    options.setdefault('layout', site.layout)
+    return BaseDocsCrawler(
+        base_url=site.base_url,
+        output_dir=site.output_dir,
+        api_key=api_key,
+        index_title=site.index_title,
+        write_index=site.write_index,
+        rate_limiter=rate_limiter,
+        categorizer=site.categorizer,
+        **options,
+    )
+
+
+def crawl_site(site: SiteConfig, api_key: str, args, rate_limiter: HostRateLimiter) -> int:
+    """Crawl and combine one site. Returns the number of failed URLs."""
+    print(f"[{site.name}] Crawling {site.base_url} into {site.output_dir}/")
+    crawler = build_crawler(site, api_key, rate_limiter, **crawler_options(args))
+    try:
+        run_crawler(crawler, args)
+    finally:
+        crawler.close()
+    
+    if not args.skip_combine and not args.plan and not args.worker:
+        combine_site(site, args.chunk_tokens)
+    
+    return len(crawler.failed_urls)
+
+
+def combine_site(site: SiteConfig, chunk_tokens: Optional[int] = None) -> None:
+    """Build a site's combined documents (and chunks) from its page files."""
+    if not site.combiner:
+        return
+    if site.combiner not in COMBINERS:
+        print(f"[{site.name}] Unknown combiner '{site.combiner}', skipping combine")
+        return
+    COMBINERS[site.combiner](site)
+    chunk_site(site, chunk_tokens)
+
+
+def main():
+    """Main entry point."""
+    import argparse
+    
+    load_dotenv()
+    
+    parser = argparse.ArgumentParser(
+        description="Crawl documentation sites configured in sites.toml"
+    )
+    parser.add_argument(
+        'sites',
+        nargs='*',
+        help='Names of the sites to crawl'
+    )
+    parser.add_argument(
+        '--all',
+        action='store_true',
+        help='Crawl every configured site'
+    )
+    parser.add_argument(
+        '--list',
+        action='store_true',
+        help='List configured sites and exit'
+    )
+    parser.add_argument(
+        '--config',
+        default=None,
+        help='Site registry file (default: sites.toml next to this script)'
+    )
+    parser.add_argument(
+        '--parallel',
+        type=int,
+        default=1,
+        help='Number of sites to crawl at the same time (default: 1)'
+    )
+    parser.add_argument(
+        '--skip-combine',
+        action='store_true',
+        help='Only crawl, do not build the combined documents'
+    )
+    parser.add_argument(
+        '--chunk-tokens',
+        type=int,
+        default=None,
+        help='Split combined documents into parts of at most this many tokens (default: chunk_tokens in sites.toml, 0 to disable)'
+    )
+    add_crawl_arguments(parser)
+    
+    args = parser.parse_args()
+    
+    try:
+        registry = load_sites(args.config)
+    except (OSError, ValueError) as e:
+        print(f"Error loading site registry: {e}")
+        exit(1)
+    
+    if args.list:
+        for name, site in sorted(registry.items()):
+            print(f"{name:<16} {site.base_url} -> {site.output_dir}/")
+        return
+    
+    names = sorted(registry) if args.all else args.sites
+    if not names:
+        parser.error("name at least one site, or pass --all")
+    unknown = [n for n in names if n not in registry]
+    if unknown:
+        print(f"Error: unknown site(s): {', '.join(unknown)}")
+        print(f"Known sites: {', '.join(sorted(registry))}")
+        exit(1)
+    
+    if args.workers and len(names) > 1:
+        # Local workers rerun this command line, so they would crawl every site
+        print("Error: --workers needs a single site; start --worker processes per site instead")
+        exit(1)
+    
+    api_key = args.api_key or os.getenv('FIRECRAWL_API_KEY')
+    if not api_key:
+        print("Error: Firecrawl API key not found.")
+        print("Please either:")
+        print("  1. Set FIRECRAWL_API_KEY in your .env file")
+        print("  2. Pass --api-key argument")
+        exit(1)
+    
+    # One limiter for every site, so parallel crawls share the request budget
+    rate_limiter = shared_limiter(args.rate, args.rate_lock_dir)
+    failures: Dict[str, object] = {}
+    
+    with run_report(args, 'docs_crawl', {'sites': ','.join(names)}):
+        with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as executor:
+            futures = {
+                executor.submit(crawl_site, registry[name], api_key, args, rate_limiter): name
+                for name in names
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    failed = future.result()
+                    if failed:
+                        failures[name] = f"{failed} failed URLs"
+                except Exception as e:
+                    failures[name] = e
+    
+    print(f"\n{'='*60}")
+    print(f"Crawled {len(names)} site(s)")
+    for name, problem in failures.items():
+        print(f"  ✗ {name}: {problem}")
+    if failures:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Search crawled documentation.
+
+Usage:
+    python3 docs_search.py "upload metadata"
+    python3 docs_search.py "rate limit" --site clanker --limit 5
+    python3 docs_search.py 'scrape NEAR(auth token)' --raw
+    python3 docs_search.py --rebuild
+
+Queries the full-text indexes (.search.sqlite) that the crawlers keep in
+each output directory and prints ranked, heading-level hits with their
+source URLs. --rebuild indexes pages that were crawled before the index
+existed, or after it was deleted.
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import List
+
+from search_index import SEARCH_FILENAME, SearchHit, SearchIndex, rebuild_search_index
+from sites import load_sites
+
+
+def search_directories(directories: List[Path], query: str, limit: int = 10, raw: bool = False) -> List[SearchHit]:
+    """
+    Search several output directories and merge the hits by rank.
+
+    Raises:
+        ValueError: If a raw query is not valid FTS5 syntax
+    """
+    hits = []
+    for directory in directories:
+        index = SearchIndex.for_directory(directory)
+        try:
+            hits.extend(index.search(query, limit=limit, raw=raw))
+        finally:
+            index.close()
+    # bm25() scores are negative; lower is a better match
+    hits.sort(key=lambda hit: hit.score)
+    return hits[:limit]
+
+
+def print_hits(hits: List[SearchHit]) -> None:
+    """Print hits for a terminal."""
+    for i, hit in enumerate(hits, 1):
+        location = hit.page_title or hit.filename
+        if hit.heading:
+            location += f" › {hit.heading}"
+        print(f"{i}. {location}  [{hit.source}]")
+        print(f"   {hit.link}")
+        if hit.snippet:
+            print(f"   {hit.snippet}")
+        print()
+
+
+def main():
+    """Main entry point."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Search crawled documentation"
+    )
+    parser.add_argument(
+        'query',
+        nargs='*',
+        help='Words to search for'
+    )
+    parser.add_argument(
+        '--site',
+        action='append',
+        default=[],
+        help='Only search this site from sites.toml (can be repeated; default: every site)'
+    )
+    parser.add_argument(
+        '--dir',
+        action='append',
+        default=[],
+        help='Search this output directory instead of registered sites (can be repeated)'
+    )
+    parser.add_argument(
+        '--config',
+        default=None,
+        help='Site registry file (default: sites.toml next to this script)'
+    )
+    parser.add_argument(
+        '--limit',
+        type=int,
+        default=10,
+        help='Maximum number of hits (default: 10)'
+    )
+    parser.add_argument(
+        '--raw',
+        action='store_true',
+        help='Pass the query to SQLite FTS5 unchanged (AND/OR/NOT, "phrases", NEAR, prefix*)'
+    )
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        help='Print hits as JSON lines'
+    )
+    parser.add_argument(
+        '--rebuild',
+        action='store_true',
+        help='Index the pages already on disk before searching'
+    )
+
+    args = parser.parse_args()
+
+    if args.dir:
+        directories = [Path(d) for d in args.dir]
+    else:
+        try:
+            registry = load_sites(args.config)
+        except (OSError, ValueError) as e:
+            print(f"Error loading site registry: {e}")
+            exit(1)
+        unknown = [n for n in args.site if n not in registry]
+        if unknown:
+            print(f"Error: unknown site(s): {', '.join(unknown)}")
+            exit(1)
+        names = args.site or sorted(registry)
+        directories = [Path(registry[n].output_dir) for n in names]
+
+    directories = [d for d in directories if d.is_dir()]
+    if not directories:
+        print("Error: no crawled output directories found")
+        exit(1)
+
+    if args.rebuild:
+        for directory in directories:
+            count = rebuild_search_index(directory)
+            print(f"Indexed {count} changed page(s) in {directory / SEARCH_FILENAME}")
+        if not args.query:
+            return
+
+    if not args.query:
+        parser.error("give a query, or pass --rebuild")
+
+    missing = [d for d in directories if not (d / SEARCH_FILENAME).exists()]
+    for directory in missing:
+        print(f"Warning: {directory} has no search index (run with --rebuild)")
+    directories = [d for d in directories if d not in missing]
+
+    start = time.perf_counter()
+    try:
+        hits = search_directories(directories, ' '.join(args.query), args.limit, args.raw)
+    except ValueError as e:
+        print(f"Error: {e}")
+        exit(1)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    if args.json:
+        for hit in hits:
+            print(json.dumps({
+                'url': hit.link,
+                'page_url': hit.url,
+                'title': hit.page_title,
+                'heading': hit.heading,
+                'filename': hit.filename,
+                'site_dir': hit.source,
+                'snippet': hit.snippet,
+                'score': round(hit.score, 4),
+            }, ensure_ascii=False))
+        return
+
+    print_hits(hits)
+    print(f"{len(hits)} hit(s) in {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
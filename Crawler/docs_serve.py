@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Serve the crawled documentation over local HTTP.
+
+Tools that read the docs over NFS read every file in full each time, even
+when it has not changed. docs-serve serves the docs over HTTP instead, so
+clients can send conditional requests. For every site in sites.toml it
+serves:
+
+    /<site>/                          INDEX.md
+    /<site>/<page>.md                 a page (sharded pages: /<site>/3f/<page>.md)
+    /<site>/combined/<document>.md    a combined document (and chunks/<part>.md)
+    /<site>/combined/<document>.md?section=3
+    /<site>/combined/<document>.md?title=Quick%20Start
+    /<site>/combined/<document>.md?url=https://...
+                                      one section, via the section index
+
+Files are kept in an in-memory LRU cache together with gzip (and, if the
+brotli package is installed, brotli) variants compressed when a file is
+loaded. Every response carries an ETag derived from the content hash and a
+Last-Modified date. Clients that send them back get 304 Not Modified without
+a body. Range requests are answered from the uncompressed bytes. A cached
+file is checked against its size and modification time at most every
+--check-interval seconds. When the crawler or combiner rewrites the file,
+the new version is loaded on the next request.
+
+Only .md files below a site's output and combined directories are served;
+hidden files (manifests, catalogs, indexes) are not.
+
+Usage:
+    python3 docs_serve.py
+    python3 docs_serve.py archive --port 9000 --host 0.0.0.0
+    python3 docs_serve.py --cache-size 1GB --max-age 60
+"""
+
+import gzip
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from metrics import METRICS, add_metrics_arguments, run_report
+from scrape_cache import parse_size
+from section_index import CombinedDocument
+from sites import SiteConfig, load_sites
+
+try:
+    import brotli
+except ImportError:  # Optional: only gzip variants are served
+    brotli = None
+
+DEFAULT_PORT = 8400
+DEFAULT_CACHE_SIZE = '256MB'
+CONTENT_TYPE = 'text/markdown; charset=utf-8'
+# Smaller files are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+BROTLI_QUALITY = 6
+SECTION_SELECTORS = ('section', 'title', 'url')
+LOAD_LOCKS = 64
+
+
+def file_stamp(path: Path) -> Tuple[int, int, int]:
+    """Change marker of a file; atomic rewrites change at least the inode."""
+    st = path.stat()
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+def compressed_variants(body: bytes) -> Dict[str, bytes]:
+    """gzip (and brotli) encodings of a body, where they are smaller."""
+    variants = {}
+    if len(body) < MIN_COMPRESS_SIZE:
+        return variants
+    with METRICS.span('serve.compress'):
+        data = gzip.compress(body, compresslevel=6, mtime=0)
+        if len(data) < len(body):
+            variants['gzip'] = data
+        if brotli is not None:
+            data = brotli.compress(body, quality=BROTLI_QUALITY)
+            if len(data) < len(body):
+                variants['br'] = data
+    return variants
+
+
+class CacheEntry:
+    """A served file or section with its compressed variants."""
+
+    __slots__ = ('stamp', 'body', 'etag', 'modified', 'variants', 'size', 'checked_at')
+
+    def __init__(self, stamp: Tuple[int, int, int], body: bytes, content_hash: str):
+        self.stamp = stamp
+        self.body = body
+        self.etag = content_hash[:32]
+        self.modified = stamp[0] / 1e9
+        self.variants = compressed_variants(body)
+        self.size = len(body) + sum(len(v) for v in self.variants.values())
+        self.checked_at = time.monotonic()
+
+
+class DocsCache:
+    """LRU cache of served files, bounded by the bytes it holds."""
+
+    def __init__(self, max_bytes: int, check_interval: float = 1.0):
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+        self.bytes = 0
+        self._entries: 'OrderedDict[tuple, CacheEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = [threading.Lock() for _ in range(LOAD_LOCKS)]
+
+    def get(self, key: tuple, path: Path, load: Callable[[], Tuple[bytes, str]]) -> CacheEntry:
+        """
+        The cached entry of key, loaded with load() if path changed since.
+
+        Args:
+            key: Cache key (the file, plus a section selector for sections)
+            path: File whose stamp decides whether the entry is current
+            load: Returns (body, content hash)
+
+        Raises:
+            FileNotFoundError: If path does not exist (any entry is dropped)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.checked_at < self.check_interval:
+                self._entries.move_to_end(key)
+                METRICS.incr('serve_cache_hits')
+                return entry
+        try:
+            stamp = file_stamp(path)
+        except FileNotFoundError:
+            self._drop(key)
+            raise
+        if entry is not None and entry.stamp == stamp:
+            entry.checked_at = now
+            METRICS.incr('serve_cache_hits')
+            return entry
+
+        # Clients asking for the same changed file at once wait for one load
+        with self._load_locks[hash(key) % len(self._load_locks)]:
+            with self._lock:
+                current = self._entries.get(key)
+            if current is not None and current.stamp == stamp:
+                METRICS.incr('serve_cache_hits')
+                return current
+            METRICS.incr('serve_cache_misses')
+            with METRICS.span('serve.load'):
+                body, content_hash = load()
+            entry = CacheEntry(stamp, body, content_hash)
+            self._store(key, entry)
+        return entry
+
+    def _store(self, key: tuple, entry: CacheEntry) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.size
+            # Entries larger than the whole cache are served but not kept
+            if entry.size <= self.max_bytes:
+                self._entries[key] = entry
+                self.bytes += entry.size
+                while self.bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.bytes -= evicted.size
+                    METRICS.incr('serve_cache_evictions')
+
+    def _drop(self, key: tuple) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _load_file(path: Path) -> Tuple[bytes, str]:
+    body = path.read_bytes()
+    return body, hashlib.sha256(body).hexdigest()
+
+
+def _load_section(path: Path, selector: str, value: str) -> Tuple[bytes, str]:
+    """
+    One section of a combined document and its hash from the section index.
+
+    Raises:
+        FileNotFoundError: If the document has no section index
+        ValueError: If the index is unreadable or out of date
+        KeyError: If there is no such section
+    """
+    with CombinedDocument(path) as document:
+        if selector == 'section':
+            position = int(value)
+            entry = document.entry(position) if 0 <= position < len(document) else None
+        elif selector == 'title':
+            entry = document.find_title(value)
+        else:
+            entry = document.find_url(value)
+        if entry is None:
+            raise KeyError(value)
+        view = document.read(entry)
+        body = bytes(view)
+        view.release()
+    return body, entry.sha256
+
+
+def resolve_path(root: Path, parts: List[str]) -> Optional[Path]:
+    """The .md file a URL path names below root, or None if it may not be served."""
+    if not parts or not parts[-1].endswith('.md'):
+        return None
+    if any(not part or part.startswith('.') or '\\' in part or '\x00' in part for part in parts):
+        return None
+    path = root.joinpath(*parts)
+    try:
+        path.resolve().relative_to(root.resolve())
+    except ValueError:
+        return None
+    return path
+
+
+def choose_encoding(accept_encoding: Optional[str], available: Dict[str, bytes]) -> Optional[str]:
+    """The best of the available encodings the client accepts, or None for identity."""
+    if not accept_encoding or not available:
+        return None
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.partition(';')
+        weight = 1.0
+        match = re.search(r'q\s*=\s*([0-9.]+)', params)
+        if match:
+            try:
+                weight = float(match.group(1))
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    for encoding in ('br', 'gzip'):
+        if encoding in available and weights.get(encoding, weights.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    First and last byte of a single `bytes=` range.
+
+    Returns None for headers to ignore (malformed or several ranges), which
+    are answered with the whole file.
+
+    Raises:
+        ValueError: If the range is not satisfiable
+    """
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', header.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if match.group(1):
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else size - 1
+        if end < start and match.group(2):
+            return None
+        if start >= size:
+            raise ValueError(header)
+        return start, min(end, size - 1)
+    suffix = int(match.group(2))
+    if suffix == 0 or size == 0:
+        raise ValueError(header)
+    return max(0, size - suffix), size - 1
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match list with an entry's tag, in any encoding."""
+    if if_none_match.strip() == '*':
+        return True
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        if tag.split('-', 1)[0] == etag:
+            return True
+    return False
+
+
+class DocsRequestHandler(BaseHTTPRequestHandler):
+    """Answers GET and HEAD requests for pages, indexes and combined documents."""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'docs-serve'
+
+    def do_GET(self) -> None:
+        self._serve(head=False)
+
+    def do_HEAD(self) -> None:
+        self._serve(head=True)
+
+    def log_message(self, format, *args) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _serve(self, head: bool) -> None:
+        METRICS.incr('serve_requests')
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+        if not parts:
+            self._send_listing(head)
+            return
+        site = self.server.sites.get(parts[0])
+        if site is None:
+            self.send_error(404, "Unknown site")
+            return
+
+        rest = parts[1:] or ['INDEX.md']
+        if rest[0] == 'combined':
+            root, rest = site.combined_dir, rest[1:]
+        else:
+            root = Path(site.output_dir)
+        path = resolve_path(root, rest)
+        if path is None:
+            self.send_error(404)
+            return
+
+        query = parse_qs(url.query)
+        selectors = [name for name in SECTION_SELECTORS if name in query]
+        try:
+            if selectors and root == site.combined_dir:
+                selector = selectors[0]
+                value = query[selector][0]
+                if selector == 'section' and not value.isdigit():
+                    self.send_error(400, "section must be a position (0, 1, ...)")
+                    return
+                entry = self.server.cache.get(
+                    (str(path), selector, value), path, lambda: _load_section(path, selector, value)
+                )
+            else:
+                entry = self.server.cache.get((str(path),), path, lambda: _load_file(path))
+        except FileNotFoundError:
+            self.send_error(404)
+            return
+        except KeyError:
+            self.send_error(404, "No such section")
+            return
+        except ValueError:
+            # The combiner is rewriting the document; its new index follows shortly
+            self.send_response(503)
+            self.send_header('Retry-After', '1')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self._send_entry(entry, head)
+
+    def _common_headers(self, entry: CacheEntry, etag: str) -> None:
+        self.send_header('ETag', f'"{etag}"')
+        self.send_header('Last-Modified', formatdate(entry.modified, usegmt=True))
+        max_age = self.server.max_age
+        self.send_header('Cache-Control', f'max-age={max_age}' if max_age else 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Accept-Ranges', 'bytes')
+
+    def _not_modified(self, entry: CacheEntry) -> bool:
+        """True if the client's copy, named by its validators, is current."""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return etag_matches(if_none_match, entry.etag)
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(entry.modified) <= since
+        return False
+
+    def _range(self, entry: CacheEntry) -> Optional[Tuple[int, int]]:
+        header = self.headers.get('Range')
+        if not header:
+            return None
+        if_range = self.headers.get('If-Range')
+        if if_range is not None:
+            # Only a strong match of the uncompressed representation counts
+            current = f'"{entry.etag}"' if if_range.strip().startswith('"') else formatdate(entry.modified, usegmt=True)
+            if if_range.strip() != current:
+                return None
+        return parse_range(header, len(entry.body))
+
+    def _send_entry(self, entry: CacheEntry, head: bool) -> None:
+        if self._not_modified(entry):
+            METRICS.incr('serve_not_modified')
+            self.send_response(304)
+            self._common_headers(entry, entry.etag)
+            self.end_headers()
+            return
+
+        try:
+            byte_range = self._range(entry)
+        except ValueError:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{len(entry.body)}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if byte_range is not None:
+            start, end = byte_range
+            body = entry.body[start:end + 1]
+            self.send_response(206)
+            self._common_headers(entry, entry.etag)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(entry.body)}')
+        else:
+            encoding = choose_encoding(self.headers.get('Accept-Encoding'), entry.variants)
+            body = entry.variants[encoding] if encoding else entry.body
+            self.send_response(200)
+            self._common_headers(entry, f'{entry.etag}-{encoding}' if encoding else entry.etag)
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+            METRICS.incr('serve_bytes_sent', len(body))
+
+    def _send_listing(self, head: bool) -> None:
+        """Markdown list of the served sites and their combined documents."""
+        lines = ["# Documentation", ""]
+        for name, site in sorted(self.server.sites.items()):
+            lines.append(f"- [{site.index_title or name}](/{quote(name)}/) - `{site.base_url}`")
+            for c in site.categories:
+                if (site.combined_dir / c['filename']).exists():
+                    lines.append(f"  - [{c.get('label', c['name'])}](/{quote(name)}/combined/{quote(c['filename'])})")
+        body = ('\n'.join(lines) + '\n').encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+
+class DocsHTTPServer(ThreadingHTTPServer):
+    """HTTP server for the docs of several sites, sharing one cache."""
+
+    daemon_threads = True
+    # Many clients may connect at once
+    request_queue_size = 128
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        sites: Dict[str, SiteConfig],
+        cache: DocsCache,
+        max_age: int = 0,
+        quiet: bool = False,
+    ):
+        self.sites = sites
+        self.cache = cache
+        self.max_age = max_age
+        self.quiet = quiet
+        super().__init__(address, DocsRequestHandler)
+
+
+def main():
+    """Main entry point."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve crawled pages, INDEX.md and combined documents over HTTP")
+    parser.add_argument('sites', nargs='*', help='Sites to serve (default: every site in sites.toml)')
+    parser.add_argument('--config', default=None, help='Site registry file (default: sites.toml next to this script)')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--cache-size', default=DEFAULT_CACHE_SIZE,
+                        help=f'Memory for cached files and their compressed variants (default: {DEFAULT_CACHE_SIZE})')
+    parser.add_argument('--check-interval', type=float, default=1.0,
+                        help='Seconds a cached file is served before checking whether it changed on disk (default: 1)')
+    parser.add_argument('--max-age', type=int, default=0,
+                        help='Seconds clients may use a response without revalidating (default: 0, always revalidate)')
+    parser.add_argument('--quiet', action='store_true', help='Do not log requests')
+    add_metrics_arguments(parser)
+
+    args = parser.parse_args()
+    try:
+        registry = load_sites(args.config)
+        cache_size = parse_size(args.cache_size)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        exit(1)
+    unknown = [n for n in args.sites if n not in registry]
+    if unknown:
+        print(f"Error: unknown site(s): {', '.join(unknown)}")
+        print(f"Known sites: {', '.join(sorted(registry))}")
+        exit(1)
+    sites = {name: registry[name] for name in (args.sites or sorted(registry))}
+
+    try:
+        server = DocsHTTPServer(
+            (args.host, args.port), sites, DocsCache(cache_size, args.check_interval), args.max_age, args.quiet
+        )
+    except OSError as e:
+        print(f"Error: cannot listen on {args.host}:{args.port} ({e})")
+        exit(1)
+
+    encodings = 'gzip, br' if brotli is not None else 'gzip'
+    print(f"Serving {', '.join(sites)} on http://{args.host}:{args.port}/ ({encodings}; Ctrl-C to stop)")
+    with run_report(args, 'docs_serve'):
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nStopped")
+        finally:
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Firecrawl v1 API.
+
+Serves the endpoints the crawlers use (POST /v1/crawl, GET /v1/crawl/<id>,
+POST /v1/scrape and POST /v1/map) from a synthetic site of any size, or
+replays a directory of previously crawled pages. GET /sitemap.xml lists the
+site's pages with a <lastmod> for planned crawls. Latency, the speed at
+which crawl jobs complete and the share of requests answered with 429 are
+configurable, so crawler throughput can be measured and regression-tested
+without spending credits or touching the network. GET /stats returns
+request counters.
+
+Usage:
+    python3 fake_firecrawl.py --pages 10000 --latency 0.02 --rate-limit 0.05
+    python3 fake_firecrawl.py --replay archive_docs --port 3002
+    python3 crawl_archive_docs.py --api-url http://127.0.0.1:3002 --api-key fake --stream
+    python3 docs_crawl.py archive --api-url http://127.0.0.1:3002 --api-key fake \
+        --sitemap http://127.0.0.1:3002/sitemap.xml
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_BASE_URL = 'https://docs.example.com/'
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_LASTMOD = '2025-01-01T00:00:00Z'
+
+WORDS = (
+    "archive item metadata upload search scrape crawl token request response "
+    "collection identifier file format download api key endpoint header query "
+    "result page limit offset cursor status error retry rate bucket session"
+).split()
+
+
+class SyntheticSite:
+    """Deterministic generated pages; nothing is kept in memory."""
+
+    def __init__(self, pages: int = 1000, base_url: str = DEFAULT_BASE_URL, page_words: int = 600, seed: int = 1):
+        self.size = pages
+        self.base_url = base_url.rstrip('/') + '/'
+        self.page_words = page_words
+        self.seed = seed
+
+    def url(self, i: int) -> str:
+        return f"{self.base_url}section-{i // 50}/page-{i}.html"
+
+    def index_of(self, url: str) -> Optional[int]:
+        match = re.search(r'/page-(\d+)\.html$', url)
+        if match and url.startswith(self.base_url) and int(match.group(1)) < self.size:
+            return int(match.group(1))
+        return None
+
+    def page(self, i: int) -> dict:
+        rng = random.Random(self.seed * 1_000_003 + i)
+        title = f"Page {i}: {' '.join(rng.choice(WORDS) for _ in range(3)).title()}"
+        lines = [
+            "* [Home](/)\n* [Guides](/guides)\n* [API Reference](/api)",
+            "",
+            f"# {title}",
+            "",
+        ]
+        remaining = self.page_words
+        section = 0
+        while remaining > 0:
+            words = min(remaining, rng.randint(60, 200))
+            remaining -= words
+            lines += [f"## Section {section}", "", ' '.join(rng.choice(WORDS) for _ in range(words)), ""]
+            if section % 2:
+                lines += ["```python", f"client.get('{rng.choice(WORDS)}', limit={rng.randint(1, 100)})", "```", ""]
+            section += 1
+        lines.append("Was this page helpful? Yes No")
+        return {
+            'markdown': '\n'.join(lines),
+            'metadata': {
+                'title': title,
+                'description': f"Synthetic documentation page {i}",
+                'sourceURL': self.url(i),
+                'statusCode': 200,
+            },
+        }
+
+
+class ReplaySite:
+    """Pages replayed from a crawler output directory."""
+
+    def __init__(self, directory: Path):
+        from frontmatter import iter_page_files, read_frontmatter
+
+        self.paths = [
+            p for p in iter_page_files(directory)
+            if not p.name.startswith('combined_') and not p.name.startswith('0')
+        ]
+        self.urls = [read_frontmatter(p).source_url or p.as_uri() for p in self.paths]
+        self.by_url = {url: i for i, url in enumerate(self.urls)}
+        self.size = len(self.paths)
+        self.base_url = self.urls[0] if self.urls else DEFAULT_BASE_URL
+
+    def url(self, i: int) -> str:
+        return self.urls[i]
+
+    def index_of(self, url: str) -> Optional[int]:
+        return self.by_url.get(url)
+
+    def page(self, i: int) -> dict:
+        from frontmatter import read_page
+
+        meta, body = read_page(self.paths[i])
+        return {
+            'markdown': body.lstrip('\n'),
+            'metadata': {
+                'title': meta.title,
+                'description': meta.description,
+                'sourceURL': self.urls[i],
+                'statusCode': 200,
+            },
+        }
+
+
+class FakeFirecrawl:
+    """In-process fake Firecrawl server."""
+
+    def __init__(
+        self,
+        site=None,
+        latency: float = 0.0,
+        rate_limit_ratio: float = 0.0,
+        retry_after: float = 1.0,
+        crawl_rate: float = 0.0,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        seed: int = 1,
+        lastmod: str = DEFAULT_LASTMOD,
+    ):
+        """
+        Args:
+            site: SyntheticSite or ReplaySite (default: 1000 synthetic pages)
+            latency: Seconds added to every response
+            rate_limit_ratio: Share of requests answered with 429
+            retry_after: Retry-After sent with each 429, in seconds
+            crawl_rate: Pages per second a crawl job completes (0: instantly)
+            batch_size: Pages per crawl status response
+            seed: Seed for the 429 injection
+            lastmod: <lastmod> of every page in the sitemap; set
+                updated[i] to give page i another one
+        """
+        self.site = site or SyntheticSite()
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.crawl_rate = crawl_rate
+        self.batch_size = batch_size
+        self.lastmod = lastmod
+        self.updated = {}
+        self.stats = Counter()
+        self.jobs = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server: Optional[ThreadingHTTPServer] = None
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Serve in a background thread; returns the API base URL."""
+        fake = self
+
+        class Handler(FakeFirecrawlHandler):
+            server_state = fake
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self) -> None:
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += n
+
+    def should_rate_limit(self) -> bool:
+        if not self.rate_limit_ratio:
+            return False
+        with self._lock:
+            return self._random.random() < self.rate_limit_ratio
+
+    def start_job(self, params: dict) -> str:
+        job_id = str(uuid.uuid4())
+        total = self.site.size
+        if params.get('limit'):
+            total = min(total, int(params['limit']))
+        with self._lock:
+            self.jobs[job_id] = {'created': time.monotonic(), 'total': total}
+        return job_id
+
+    def job_progress(self, job_id: str) -> Optional[Tuple[int, int]]:
+        """(completed, total) pages of a job, or None if unknown."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        total = job['total']
+        if not self.crawl_rate:
+            return total, total
+        done = int((time.monotonic() - job['created']) * self.crawl_rate)
+        return min(done, total), total
+
+    def links(self, limit: Optional[int] = None) -> List[str]:
+        count = min(self.site.size, limit) if limit else self.site.size
+        return [self.site.url(i) for i in range(count)]
+
+    def sitemap(self) -> bytes:
+        urls = ''.join(
+            f"<url><loc>{self.site.url(i)}</loc><lastmod>{self.updated.get(i, self.lastmod)}</lastmod></url>"
+            for i in range(self.site.size)
+        )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'
+        ).encode('utf-8')
+
+
+class FakeFirecrawlHandler(BaseHTTPRequestHandler):
+    """Request handler; server_state is set on a subclass per server."""
+
+    server_state: FakeFirecrawl = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict, headers: Optional[dict] = None) -> None:
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def _begin(self, endpoint: str) -> bool:
+        """Account for a request; returns False if it was answered with 429."""
+        state = self.server_state
+        state.count(f"{self.command} {endpoint}")
+        if state.latency:
+            time.sleep(state.latency)
+        if endpoint != '/stats' and state.should_rate_limit():
+            state.count('rate_limited')
+            self._send(429, {'success': False, 'error': 'Rate limit exceeded'},
+                       {'Retry-After': f"{state.retry_after:g}"})
+            return False
+        return True
+
+    def do_GET(self):
+        state = self.server_state
+        parsed = urlparse(self.path)
+        if parsed.path == '/stats':
+            self._begin('/stats')
+            self._send(200, dict(state.stats))
+            return
+        if parsed.path == '/sitemap.xml':
+            state.count('GET /sitemap.xml')
+            data = state.sitemap()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/xml')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        match = re.fullmatch(r'/v1/crawl/([\w-]+)', parsed.path)
+        if not match:
+            self._send(404, {'success': False, 'error': 'Not found'})
+            return
+        if not self._begin('/v1/crawl/<id>'):
+            return
+
+        job_id = match.group(1)
+        progress = state.job_progress(job_id)
+        if progress is None:
+            self._send(404, {'success': False, 'error': 'Job not found'})
+            return
+        completed, total = progress
+        skip = int(parse_qs(parsed.query).get('skip', ['0'])[0])
+        end = min(completed, skip + state.batch_size)
+        data = [state.site.page(i) for i in range(skip, end)]
+        state.count('pages_served', len(data))
+        body = {
+            'success': True,
+            'status': 'completed' if completed >= total else 'scraping',
+            'total': total,
+            'completed': completed,
+            'creditsUsed': completed,
+            'expiresAt': '2099-01-01T00:00:00.000Z',
+            'data': data,
+        }
+        if end < completed:
+            body['next'] = f"{state.url}/v1/crawl/{job_id}?skip={end}"
+        self._send(200, body)
+
+    def do_POST(self):
+        state = self.server_state
+        path = urlparse(self.path).path
+        if path not in ('/v1/crawl', '/v1/scrape', '/v1/map'):
+            self._send(404, {'success': False, 'error': 'Not found'})
+            return
+        payload = self._read_json()
+        if not self._begin(path):
+            return
+
+        if path == '/v1/crawl':
+            job_id = state.start_job(payload)
+            self._send(200, {'success': True, 'id': job_id, 'url': f"{state.url}/v1/crawl/{job_id}"})
+        elif path == '/v1/map':
+            self._send(200, {'success': True, 'links': state.links(payload.get('limit'))})
+        else:
+            index = state.site.index_of(payload.get('url', ''))
+            if index is None:
+                self._send(404, {'success': False, 'error': 'Page not found'})
+                return
+            state.count('pages_served')
+            self._send(200, {'success': True, 'data': state.site.page(index)})
+
+
+def main():
+    """Run the fake server until interrupted."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Firecrawl API")
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=3002, help='Port to listen on (default: 3002)')
+    parser.add_argument('--pages', type=int, default=1000, help='Size of the synthetic site (default: 1000)')
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL, help=f'Base URL of the synthetic site (default: {DEFAULT_BASE_URL})')
+    parser.add_argument('--page-words', type=int, default=600, help='Words per synthetic page (default: 600)')
+    parser.add_argument('--replay', default=None, help='Serve the pages of this crawler output directory instead')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response (default: 0)')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Share of requests answered with 429 (default: 0)')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds sent with 429s (default: 1)')
+    parser.add_argument('--crawl-rate', type=float, default=0.0, help='Pages per second crawl jobs complete (default: instantly)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help=f'Pages per crawl status response (default: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--lastmod', default=DEFAULT_LASTMOD, help=f'<lastmod> of the pages in /sitemap.xml (default: {DEFAULT_LASTMOD})')
+
+    args = parser.parse_args()
+
+    if args.replay:
+        site = ReplaySite(Path(args.replay))
+        print(f"Replaying {site.size} pages from {args.replay}")
+    else:
+        site = SyntheticSite(args.pages, args.base_url, args.page_words)
+        print(f"Serving {site.size} synthetic pages under {site.base_url}")
+
+    fake = FakeFirecrawl(
+        site,
+        latency=args.latency,
+        rate_limit_ratio=args.rate_limit,
+        retry_after=args.retry_after,
+        crawl_rate=args.crawl_rate,
+        batch_size=args.batch_size,
+        lastmod=args.lastmod,
+    )
+    url = fake.start(args.host, args.port)
+    print(f"Fake Firecrawl API listening on {url} (Ctrl-C to stop)")
+    try:
+        fake.thread.join()
+    except KeyboardInterrupt:
+        fake.stop()
+        print(f"\nRequests: {dict(fake.stats)}")
+
+
+if __name__ == "__main__":
+    main()
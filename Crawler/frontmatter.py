@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Frontmatter reading and writing for crawled markdown pages.
+
+Pages are written as a `---` delimited header of `key: value` lines followed
+by the markdown body. The reader only consumes the header lines and records
+the byte offset where the body starts, so metadata-only work (indexes,
+categorization by title or URL) never loads page bodies. The header must be
+closed by a line that is exactly `---`; horizontal rules in the body are
+never mistaken for the end of the header.
+"""
+
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from layout import iter_markdown_files
+
+# Headers larger than this are treated as "no frontmatter"
+MAX_HEADER_BYTES = 64 * 1024
+
+
+@dataclass
+class PageMeta:
+    """Frontmatter of one page file."""
+
+    path: Path
+    source_url: str = ''
+    crawled_at: str = ''
+    title: str = ''
+    description: str = ''
+    fields: Dict[str, str] = field(default_factory=dict)
+    body_offset: int = 0
+    size: int = 0
+
+    @property
+    def filename(self) -> str:
+        return self.path.name
+
+    @property
+    def has_frontmatter(self) -> bool:
+        return self.body_offset > 0
+
+
+def render_frontmatter(url: str, metadata: Optional[dict] = None, crawled_at: Optional[str] = None) -> str:
+    """Render the frontmatter header written before a page body."""
+    lines = [
+        "---",
+        f"source_url: {url}",
+        f"crawled_at: {crawled_at or time.strftime('%Y-%m-%d %H:%M:%S')}",
+    ]
+
+    if metadata:
+        if metadata.get('title'):
+            # Values must stay on one line to keep the header parseable
+            title = str(metadata.get('title')).replace('\n', ' ')
+            lines.append(f"title: {title}")
+        if metadata.get('description'):
+            desc = str(metadata.get('description', '')).replace('\n', ' ')
+            lines.append(f"description: {desc}")
+
+    lines.append("---")
+    return "\n".join(lines) + "\n\n"
+
+
+def _parse_header(f: BinaryIO, path: Path, size: int) -> PageMeta:
+    """Parse the header from an open file positioned at its start."""
+    first = f.readline()
+    if first.rstrip(b'\r\n') != b'---':
+        return PageMeta(path=path, size=size)
+
+    fields: Dict[str, str] = {}
+    consumed = len(first)
+    while consumed < MAX_HEADER_BYTES:
+        line = f.readline()
+        if not line:
+            # Unterminated header: the whole file is body
+            return PageMeta(path=path, size=size)
+        consumed += len(line)
+        text = line.decode('utf-8', errors='replace').rstrip('\r\n')
+        if text.strip() == '---':
+            return PageMeta(
+                path=path,
+                source_url=fields.get('source_url', ''),
+                crawled_at=fields.get('crawled_at', ''),
+                title=fields.get('title', ''),
+                description=fields.get('description', ''),
+                fields=fields,
+                body_offset=consumed,
+                size=size,
+            )
+        if ':' in text:
+            key, value = text.split(':', 1)
+            fields[key.strip()] = value.strip()
+    return PageMeta(path=path, size=size)
+
+
+def read_frontmatter(path: Path) -> PageMeta:
+    """Read only the frontmatter of a page file."""
+    path = Path(path)
+    with path.open('rb') as f:
+        return _parse_header(f, path, os.fstat(f.fileno()).st_size)
+
+
+def read_page(path: Path) -> Tuple[PageMeta, str]:
+    """
+    Read a page's frontmatter and body.
+
+    Returns:
+        (metadata, body) where body is the text after the header, unstripped
+    """
+    path = Path(path)
+    with path.open('rb') as f:
+        meta = _parse_header(f, path, os.fstat(f.fileno()).st_size)
+        f.seek(meta.body_offset)
+        body = f.read().decode('utf-8')
+    return meta, body
+
+
+def read_body(meta: PageMeta) -> str:
+    """Load the body of a page whose header was read earlier."""
+    with meta.path.open('rb') as f:
+        f.seek(meta.body_offset)
+        return f.read().decode('utf-8')
+
+
+def iter_page_files(directory: Path, exclude: Iterable[str] = ('INDEX.md',)) -> Iterator[Path]:
+    """Yield the page files of an output directory (either layout) in sorted order."""
+    excluded = set(exclude)
+    for name, path in iter_markdown_files(directory):
+        if name not in excluded:
+            yield path
+
+
+def scan_directory(directory: Path, exclude: Iterable[str] = ('INDEX.md',)) -> List[PageMeta]:
+    """Read the frontmatter of every page in a directory."""
+    return [read_frontmatter(path) for path in iter_page_files(directory, exclude)]
+
+
+class MetadataIndex:
+    """In-memory metadata of a directory of pages, by filename and by URL."""
+
+    def __init__(self, pages: List[PageMeta]):
+        self.pages = pages
+        self.by_filename = {p.filename: p for p in pages}
+        self.by_url = {p.source_url: p for p in pages if p.source_url}
+
+    @classmethod
+    def scan(cls, directory: Path, exclude: Iterable[str] = ('INDEX.md',)) -> 'MetadataIndex':
+        return cls(scan_directory(directory, exclude))
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def __iter__(self) -> Iterator[PageMeta]:
+        return iter(self.pages)
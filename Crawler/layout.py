@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Page file layouts of a crawler output directory.
+
+flat (default)
+    One file per page directly in the output directory, named after the URL
+    path: https://archive.org/developers/foo/bar.html -> developers_foo_bar.md.
+    Query strings are ignored and long paths are cut at 200 characters, so
+    distinct URLs can map to the same file.
+
+sharded
+    Each name is a readable slug of the URL path plus a short hash of the
+    whole URL, stored in one of 256 shard directories named after the first
+    two hex digits of the hash:
+    https://archive.org/developers/foo/bar.html -> 3f/developers_foo_bar-3f9a0c2e71d4.md.
+    Names are stable and distinct for distinct URLs, and no directory holds
+    more than a few hundred files even for a very large corpus.
+
+Filenames are stored relative to the output directory everywhere (manifest,
+catalog, search index, INDEX.md). When a page moves to another name, for
+example after switching layouts, the old name is kept in the catalog's alias
+table so links using it still resolve (`catalog.py <dir> resolve <name>`).
+
+Usage:
+    python3 layout.py archive_docs --to sharded
+    python3 layout.py archive_docs --to flat --dry-run
+"""
+
+import hashlib
+import os
+import re
+from pathlib import Path, PurePosixPath
+from typing import Iterator, Tuple
+from urllib.parse import urlparse
+
+LAYOUTS = ('flat', 'sharded')
+HASH_CHARS = 12
+MAX_SLUG_CHARS = 120
+MAX_FLAT_CHARS = 200
+
+_SHARD_DIR = re.compile(r'[0-9a-f]{2}')
+_SHARDED_NAME = re.compile(r'(.+)-[0-9a-f]{%d,64}\.md' % HASH_CHARS)
+
+
+def url_slug(url: str) -> str:
+    """Readable name of a URL path: developers/foo/bar.html -> developers_foo_bar."""
+    parsed = urlparse(url)
+    path = parsed.path.strip('/').replace('/', '_')
+    if not path:
+        path = 'index'
+    # Remove or replace invalid filename characters
+    path = path.replace('?', '_').replace('&', '_').replace('=', '_')
+    # Remove file extensions like .html
+    if path.endswith('.html'):
+        path = path[:-5]
+    return path
+
+
+def flat_filename(url: str) -> str:
+    """Name of a page in the flat layout."""
+    return f"{url_slug(url)[:MAX_FLAT_CHARS]}.md"
+
+
+def sharded_filename(url: str, hash_chars: int = HASH_CHARS) -> str:
+    """Name of a page in the sharded layout, relative to the output directory."""
+    digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    slug = re.sub(r'[^A-Za-z0-9._-]+', '_', url_slug(url))[:MAX_SLUG_CHARS]
+    return f"{digest[:2]}/{slug}-{digest[:hash_chars]}.md"
+
+
+def page_filename(url: str, layout: str = 'flat') -> str:
+    """Name of a page in a layout."""
+    if layout == 'sharded':
+        return sharded_filename(url)
+    if layout == 'flat':
+        return flat_filename(url)
+    raise ValueError(f"Unknown layout: {layout!r} (use one of {', '.join(LAYOUTS)})")
+
+
+def is_shard_dir(name: str) -> bool:
+    return bool(_SHARD_DIR.fullmatch(name))
+
+
+def display_name(filename) -> str:
+    """
+    A page's name without shard directory and hash (the flat-style name).
+
+    Categorization rules and titles derived from filenames use this, so they
+    work the same in both layouts.
+    """
+    path = PurePosixPath(str(filename).replace(os.sep, '/'))
+    if is_shard_dir(path.parent.name):
+        match = _SHARDED_NAME.fullmatch(path.name)
+        if match:
+            return f"{match.group(1)}.md"
+    return path.name
+
+
+def relative_filename(path: Path, directory: Path) -> str:
+    """Name of a page file as stored in the manifest and catalog."""
+    return Path(path).relative_to(directory).as_posix()
+
+
+def iter_markdown_files(directory: Path) -> Iterator[Tuple[str, Path]]:
+    """
+    (relative filename, path) of every .md file in the top level and shard directories.
+
+    Uses os.scandir, which returns file types with the directory listing, so
+    listing a large corpus does not stat every file.
+    """
+    directory = Path(directory)
+    found = []
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.name.endswith('.md') and entry.is_file():
+            found.append((entry.name, Path(entry.path)))
+        elif is_shard_dir(entry.name) and entry.is_dir():
+            for child in os.scandir(entry.path):
+                if child.name.endswith('.md') and child.is_file():
+                    found.append((f"{entry.name}/{child.name}", Path(child.path)))
+    found.sort()
+    yield from found
+
+
+def migrate(output_dir: Path, layout: str, dry_run: bool = False) -> int:
+    """
+    Move the pages of an output directory into another layout.
+
+    The manifest, catalog and search index are updated, old names are
+    recorded as aliases in the catalog and the links in INDEX.md are
+    rewritten.
+
+    Returns:
+        Number of pages moved
+
+    Raises:
+        ValueError: If two pages would get the same name in the new layout
+    """
+    from catalog import DocsCatalog
+    from frontmatter import read_frontmatter
+    from manifest import CrawlManifest
+    from search_index import SearchIndex
+
+    output_dir = Path(output_dir)
+    moves = []
+    targets = {}
+    for name, path in iter_markdown_files(output_dir):
+        if name == 'INDEX.md':
+            continue
+        url = read_frontmatter(path).source_url
+        if not url:
+            continue
+        target = page_filename(url, layout)
+        if targets.get(target, url) != url:
+            raise ValueError(f"{url} and {targets[target]} would both be stored as {target}")
+        targets[target] = url
+        if target != name:
+            moves.append((url, name, target))
+
+    if dry_run:
+        for url, name, target in moves:
+            print(f"  {name} -> {target}")
+        return len(moves)
+
+    manifest = CrawlManifest(output_dir)
+    catalog = DocsCatalog.for_directory(output_dir)
+    search_index = None
+    if (output_dir / '.search.sqlite').exists():
+        search_index = SearchIndex.for_directory(output_dir)
+    renamed = {}
+    try:
+        for url, name, target in moves:
+            destination = output_dir / target
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(output_dir / name, destination)
+            if manifest.get(url):
+                manifest.update(url, filename=target)
+            catalog.upsert(url, filename=target)
+            catalog.add_alias(name, url)
+            if search_index:
+                search_index.rename_page(url, target)
+            renamed[name] = target
+        manifest.compact()
+    finally:
+        catalog.close()
+        if search_index:
+            search_index.close()
+
+    # Emptied shard directories are removed
+    for entry in os.scandir(output_dir):
+        if is_shard_dir(entry.name) and entry.is_dir() and not any(os.scandir(entry.path)):
+            os.rmdir(entry.path)
+
+    index_path = output_dir / 'INDEX.md'
+    if renamed and index_path.exists():
+        from page_writer import write_atomic
+
+        text = index_path.read_text(encoding='utf-8')
+        text = re.sub(r'\]\(([^)]+)\)', lambda m: f"]({renamed.get(m.group(1), m.group(1))})", text)
+        write_atomic(index_path, text.encode('utf-8'))
+    return len(moves)
+
+
+def main():
+    """Move an output directory to another layout."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Move crawled pages into another file layout")
+    parser.add_argument('output_dir', help='Crawler output directory (e.g. archive_docs)')
+    parser.add_argument('--to', choices=LAYOUTS, required=True, help='Layout to move the pages into')
+    parser.add_argument('--dry-run', action='store_true', help='Only print the moves')
+
+    args = parser.parse_args()
+    output_dir = Path(args.output_dir)
+    if not output_dir.exists():
+        print(f"Error: {output_dir} directory not found")
+        exit(1)
+
+    try:
+        moved = migrate(output_dir, args.to, args.dry_run)
+    except ValueError as e:
+        print(f"Error: {e}")
+        exit(1)
+    verb = 'Would move' if args.dry_run else 'Moved'
+    print(f"{verb} {moved} pages to the {args.to} layout")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Per-URL crawl manifest used for incremental re-crawls.
+
+The manifest lives next to the crawled markdown as a JSON-lines file. Every
+save appends one record, so a crash never loses earlier entries; the file is
+compacted to one line per URL when a run finishes. Each record holds the
+content hash of the page markdown, the ETag/Last-Modified validators seen on
+the live page and the crawl timestamps.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+MANIFEST_FILENAME = '.crawl_manifest.jsonl'
+
+
+def content_hash(content: str) -> str:
+    """Return the SHA-256 hex digest of page markdown."""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Parse a duration such as "30m", "12h" or "7d" into seconds (None if it is not one)."""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([smhd])', value.strip())
+    if not match:
+        return None
+    return float(match.group(1)) * {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+
+
+def parse_since(value: str) -> float:
+    """
+    Parse a --since value into a UNIX timestamp.
+
+    Accepts relative durations such as "30m", "12h" or "7d", and absolute
+    dates such as "2025-11-01" or "2025-11-01T06:00:00".
+    """
+    seconds = parse_duration(value)
+    if seconds is not None:
+        return time.time() - seconds
+
+    for fmt in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return time.mktime(time.strptime(value.strip(), fmt))
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid --since value: {value!r} (use e.g. 12h, 7d or 2025-11-01)")
+
+
+class CrawlManifest:
+    """Persistent per-URL record of what was crawled and when."""
+
+    def __init__(self, output_dir: Path):
+        self.path = Path(output_dir) / MANIFEST_FILENAME
+        self.entries: Dict[str, dict] = {}
+        self._dirty = False
+        # (mtime, size) of the file as last read or written by us
+        self._stamp: Optional[Tuple[int, int]] = None
+        self.load()
+
+    def _disk_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> None:
+        """Load the manifest, letting later records override earlier ones."""
+        self._stamp = self._disk_stamp()
+        if not self.path.exists():
+            return
+        with self.path.open('r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash mid-append can leave a truncated last line
+                    continue
+                if record.get('url'):
+                    self.entries[record['url']] = record
+
+    def changed_on_disk(self) -> bool:
+        """
+        True if another process wrote the manifest since we last loaded or compacted it.
+
+        Only meaningful after a compact(); our own appends change the file too.
+        """
+        return self._disk_stamp() != self._stamp
+
+    def reload(self) -> None:
+        """Read the manifest from disk again, dropping what is only in memory."""
+        self.entries = {}
+        self._dirty = False
+        self.load()
+
+    def get(self, url: str) -> Optional[dict]:
+        """Return the manifest record for a URL, if any."""
+        return self.entries.get(url)
+
+    def is_unchanged(self, url: str, digest: str, filepath: Path) -> bool:
+        """True if the page was already saved with the same content hash."""
+        entry = self.entries.get(url)
+        return bool(entry) and entry.get('content_hash') == digest and filepath.exists()
+
+    def update(self, url: str, **fields) -> dict:
+        """Merge fields into the record for a URL and append it to disk."""
+        entry = dict(self.entries.get(url, {'url': url}))
+        entry.update({k: v for k, v in fields.items() if v is not None})
+        self.entries[url] = entry
+
+        with self.path.open('a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._dirty = True
+        return entry
+
+    def stale_urls(self, since: Optional[float] = None) -> List[str]:
+        """
+        Return URLs that were last checked before `since`.
+
+        With no `since`, every known URL is returned.
+        """
+        return sorted(
+            url for url, entry in self.entries.items()
+            if since is None or entry.get('checked_at', 0) < since
+        )
+
+    def fresh_urls(self, since: float) -> List[str]:
+        """Return URLs that were checked at or after `since`."""
+        return sorted(
+            url for url, entry in self.entries.items()
+            if entry.get('checked_at', 0) >= since
+        )
+
+    def merge(self, other: 'CrawlManifest') -> int:
+        """
+        Take over the records of another manifest, e.g. a queue worker's.
+
+        A record replaces ours only if it was checked at least as recently.
+
+        Returns:
+            Number of records taken over
+        """
+        taken = []
+        for url, entry in other.entries.items():
+            mine = self.entries.get(url)
+            if mine is None or entry.get('checked_at', 0) >= mine.get('checked_at', 0):
+                self.entries[url] = entry
+                taken.append(entry)
+        if taken:
+            with self.path.open('a', encoding='utf-8') as f:
+                for entry in taken:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._dirty = True
+        return len(taken)
+
+    def compact(self) -> None:
+        """Rewrite the manifest with exactly one line per URL."""
+        if not self._dirty:
+            return
+        tmp_path = self.path.with_suffix('.tmp')
+        with tmp_path.open('w', encoding='utf-8') as f:
+            for url in sorted(self.entries):
+                f.write(json.dumps(self.entries[url], ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+        self._stamp = self._disk_stamp()
+
+
+def fetch_validators(session, url: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Fetch the ETag/Last-Modified validators the live site reports for a page.
+
+    Sends a plain HEAD request, so that pages saved by a full crawl can be
+    probed conditionally by the next incremental re-crawl.
+
+    Returns:
+        (etag, last_modified), each None if the site does not report it
+
+    Raises:
+        requests.RequestException: If the site cannot be reached
+    """
+    response = session.head(url, allow_redirects=True, timeout=30)
+    if response.status_code != 200:
+        return None, None
+    return response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+
+def probe_changed(session, url: str, entry: Optional[dict]) -> Tuple[bool, Optional[str], Optional[str]]:
+    """
+    Ask the live site whether a page changed since it was last crawled.
+
+    Sends a conditional HEAD request with the stored ETag/Last-Modified
+    validators. This costs no Firecrawl credits.
+
+    Args:
+        session: requests.Session to send the probe with
+        url: Page URL
+        entry: Manifest record for the page, if any
+
+    Returns:
+        (changed, etag, last_modified) where the validators are the ones
+        reported by the site, or the stored ones if the probe failed
+    """
+    entry = entry or {}
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+
+    try:
+        response = session.head(url, headers=headers, allow_redirects=True, timeout=30)
+    except Exception:
+        # Can't tell, so assume it changed and let Firecrawl re-scrape it
+        return True, entry.get('etag'), entry.get('last_modified')
+
+    etag = response.headers.get('ETag') or entry.get('etag')
+    last_modified = response.headers.get('Last-Modified') or entry.get('last_modified')
+
+    if response.status_code == 304:
+        return False, etag, last_modified
+    if not headers:
+        return True, etag, last_modified
+    # Servers that ignore conditional headers still let us compare validators
+    if response.status_code == 200:
+        if entry.get('etag') and response.headers.get('ETag') == entry['etag']:
+            return False, etag, last_modified
+        if entry.get('last_modified') and response.headers.get('Last-Modified') == entry['last_modified']:
+            return False, etag, last_modified
+    return True, etag, last_modified
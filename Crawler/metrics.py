@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Run metrics for the crawlers and combiners.
+
+Code is instrumented with timing spans and counters on the process-wide
+METRICS registry:
+
+    with METRICS.span('save_markdown.write'):
+        ...
+
+    @METRICS.timed('create_index')
+    def create_index(...):
+        ...
+
+    METRICS.incr('pages_saved')
+
+At the end of a run the registry is written as a JSON report and,
+optionally, as a Prometheus textfile (for node_exporter's textfile
+collector). --profile additionally dumps cProfile statistics and the top
+tracemalloc allocation sites.
+
+Spans recorded in worker processes (combine_docs.py with process workers)
+are not collected; the enclosing span in the main process still is.
+"""
+
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+PROMETHEUS_PREFIX = 'docs_crawl'
+
+
+class Metrics:
+    """Thread-safe registry of timing spans and counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget everything recorded so far and restart the run clock."""
+        with self._lock:
+            self.started_at = time.time()
+            self._start = time.perf_counter()
+            self.spans: Dict[str, list] = {}
+            self.counters: Dict[str, float] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        """Add one timed call to a span."""
+        with self._lock:
+            span = self.spans.get(name)
+            if span is None:
+                # [calls, total seconds, max seconds]
+                self.spans[name] = [1, seconds, seconds]
+            else:
+                span[0] += 1
+                span[1] += seconds
+                if seconds > span[2]:
+                    span[2] = seconds
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time the enclosed block under name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name: str):
+        """Decorator timing every call of a function under name."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def incr(self, name: str, amount: float = 1) -> None:
+        """Add to a counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self, labels: Optional[dict] = None) -> dict:
+        """The run so far as a JSON-serializable report."""
+        with self._lock:
+            spans = {
+                name: {
+                    'calls': calls,
+                    'total_seconds': round(total, 6),
+                    'mean_seconds': round(total / calls, 6),
+                    'max_seconds': round(longest, 6),
+                }
+                for name, (calls, total, longest) in sorted(self.spans.items())
+            }
+            return {
+                'labels': dict(labels or {}),
+                'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started_at)),
+                'duration_seconds': round(time.perf_counter() - self._start, 6),
+                'spans': spans,
+                'counters': dict(sorted(self.counters.items())),
+            }
+
+    def write_json(self, path: Path, labels: Optional[dict] = None) -> dict:
+        """Write the JSON run report; returns it."""
+        report = self.snapshot(labels)
+        _atomic_write(Path(path), json.dumps(report, indent=2) + '\n')
+        return report
+
+    def write_prometheus(self, path: Path, labels: Optional[dict] = None) -> None:
+        """Write the metrics in the Prometheus text exposition format."""
+        report = self.snapshot(labels)
+        base = _label_pairs(report['labels'])
+        p = PROMETHEUS_PREFIX
+
+        def sample(metric: str, value: float, extra: Optional[dict] = None) -> str:
+            pairs = base + _label_pairs(extra or {})
+            label_text = '{' + ','.join(pairs) + '}' if pairs else ''
+            value = value if isinstance(value, int) else round(value, 6)
+            return f"{metric}{label_text} {value}"
+
+        lines = [
+            f"# HELP {p}_run_duration_seconds Wall time of the run",
+            f"# TYPE {p}_run_duration_seconds gauge",
+            sample(f"{p}_run_duration_seconds", report['duration_seconds']),
+            f"# HELP {p}_run_timestamp_seconds When the run finished",
+            f"# TYPE {p}_run_timestamp_seconds gauge",
+            sample(f"{p}_run_timestamp_seconds", round(time.time())),
+            f"# HELP {p}_phase_seconds_total Time spent in each phase",
+            f"# TYPE {p}_phase_seconds_total counter",
+        ]
+        lines += [sample(f"{p}_phase_seconds_total", s['total_seconds'], {'phase': n}) for n, s in report['spans'].items()]
+        lines += [
+            f"# HELP {p}_phase_calls_total Calls of each phase",
+            f"# TYPE {p}_phase_calls_total counter",
+        ]
+        lines += [sample(f"{p}_phase_calls_total", s['calls'], {'phase': n}) for n, s in report['spans'].items()]
+        lines += [
+            f"# HELP {p}_phase_max_seconds Longest single call of each phase",
+            f"# TYPE {p}_phase_max_seconds gauge",
+        ]
+        lines += [sample(f"{p}_phase_max_seconds", s['max_seconds'], {'phase': n}) for n, s in report['spans'].items()]
+        lines += [
+            f"# HELP {p}_events_total Run counters (pages saved, retries, ...)",
+            f"# TYPE {p}_events_total counter",
+        ]
+        lines += [sample(f"{p}_events_total", v, {'event': n}) for n, v in report['counters'].items()]
+        _atomic_write(Path(path), '\n'.join(lines) + '\n')
+
+
+def _label_pairs(labels: dict) -> list:
+    pairs = []
+    for key, value in labels.items():
+        key = re.sub(r'[^a-zA-Z0-9_]', '_', str(key))
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return pairs
+
+
+def _atomic_write(path: Path, text: str) -> None:
+    # Collectors and schedulers must never see a half-written file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(text, encoding='utf-8')
+    os.replace(tmp, path)
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def profiling(output_dir: Path, name: str = 'run', top: int = 30) -> Iterator[None]:
+    """
+    Profile the enclosed block with cProfile and tracemalloc.
+
+    Writes <name>.pstats (load with `python3 -m pstats`) and <name>.txt with
+    the top functions by cumulative time and the top allocation sites.
+    cProfile only sees the calling thread; tracemalloc sees every thread.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    profiler = cProfile.Profile()
+    tracemalloc.start(10)
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profiler.dump_stats(str(output_dir / f"{name}.pstats"))
+        text = io.StringIO()
+        stats = pstats.Stats(profiler, stream=text)
+        stats.sort_stats('cumulative').print_stats(top)
+        text.write(f"\nTraced memory: current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB\n")
+        text.write(f"\nTop {top} allocation sites:\n")
+        for stat in snapshot.statistics('lineno')[:top]:
+            text.write(f"{stat}\n")
+        (output_dir / f"{name}.txt").write_text(text.getvalue(), encoding='utf-8')
+        print(f"Profile written to {output_dir / name}.pstats and {name}.txt")
+
+
+def add_metrics_arguments(parser) -> None:
+    """Add --metrics-json, --metrics-prom and --profile to a parser."""
+    parser.add_argument(
+        '--metrics-json',
+        default=None,
+        help='Write a JSON report of phase timings and counters to this file'
+    )
+    parser.add_argument(
+        '--metrics-prom',
+        default=None,
+        help='Write the metrics as a Prometheus textfile (for the node_exporter textfile collector)'
+    )
+    parser.add_argument(
+        '--profile',
+        default=None,
+        metavar='DIR',
+        help='Write cProfile and tracemalloc results for the run to this directory'
+    )
+
+
+@contextmanager
+def run_report(args, name: str, labels: Optional[dict] = None) -> Iterator[None]:
+    """
+    Collect metrics for a command line run and write the requested reports.
+
+    Args:
+        args: Parsed arguments from add_metrics_arguments
+        name: Name of the run (also the profile file name)
+        labels: Extra labels for the reports, e.g. the site
+    """
+    labels = dict({'run': name}, **(labels or {}))
+    METRICS.reset()
+    profile = profiling(Path(args.profile), name) if getattr(args, 'profile', None) else None
+    try:
+        if profile:
+            with profile:
+                yield
+        else:
+            yield
+    finally:
+        write_reports(args, labels)
+
+
+def write_reports(args, labels: Optional[dict] = None) -> None:
+    """Write the --metrics-json and --metrics-prom reports, if requested."""
+    if getattr(args, 'metrics_json', None):
+        METRICS.write_json(Path(args.metrics_json), labels)
+        print(f"Metrics written to {args.metrics_json}")
+    if getattr(args, 'metrics_prom', None):
+        METRICS.write_prometheus(Path(args.metrics_prom), labels)
+        print(f"Prometheus metrics written to {args.metrics_prom}")
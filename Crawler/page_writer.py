@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Background, atomic file writer for crawled pages.
+
+Pages are queued to writer threads so disk I/O overlaps with polling,
+scraping and parsing in the main thread. Every file is written to a hidden
+temporary file in the same directory and moved into place with os.replace,
+so readers (and a crash) only ever see the old or the new file, never a
+truncated one. Writes are done in batches: all files of a batch are written,
+fsynced together, renamed, and the directory is fsynced once.
+
+Finished writes are not reported through callbacks; the owner drains them
+with completed() on its own thread, which keeps SQLite connections and the
+manifest single-threaded.
+"""
+
+import itertools
+import os
+import queue
+import threading
+import zlib
+from collections import deque
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_MAX_PENDING = 256
+
+# (path, tag, error) of a finished write; error is None on success
+WriteResult = Tuple[Path, Any, Optional[Exception]]
+
+_STOP = object()
+_SEQUENCE = itertools.count()
+
+
+def temp_path(path: Path) -> Path:
+    """Hidden temporary name next to path, never matched by *.md globs."""
+    return path.with_name(f".{path.name}.{os.getpid()}.{next(_SEQUENCE)}.tmp")
+
+
+def _discard(tmp: Path) -> None:
+    try:
+        tmp.unlink()
+    except OSError:
+        pass
+
+
+def fsync_directory(directory: Path) -> None:
+    """Make renames in a directory durable (no-op where unsupported)."""
+    try:
+        fd = os.open(str(directory), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_atomic(path: Path, data: bytes, fsync: bool = True) -> None:
+    """Write one file through a temporary file and os.replace."""
+    path = Path(path)
+    tmp = temp_path(path)
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        _discard(tmp)
+        raise
+    if fsync:
+        fsync_directory(path.parent)
+
+
+class PageWriter:
+    """Pool of writer threads with atomic writes and batched fsyncs."""
+
+    def __init__(
+        self,
+        workers: int = 2,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        fsync: bool = True,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ):
+        """
+        Args:
+            workers: Number of writer threads
+            batch_size: Most files written between two fsyncs
+            fsync: Whether to fsync files and directories at all
+            max_pending: Queued writes per thread before write() blocks
+        """
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self._done: deque = deque()
+        self._closed = False
+        # Each path always goes to the same thread, so two writes of the
+        # same file can never be reordered
+        self._queues = [queue.Queue(maxsize=max_pending) for _ in range(max(1, workers))]
+        self._threads = [
+            threading.Thread(target=self._run, args=(q,), name=f'page-writer-{i}', daemon=True)
+            for i, q in enumerate(self._queues)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def write(self, path: Path, data: bytes, tag: Any = None) -> None:
+        """
+        Queue a file write; blocks while the thread's queue is full.
+
+        Args:
+            path: Destination file
+            data: Complete file contents
+            tag: Returned with the result by completed()
+        """
+        if self._closed:
+            raise RuntimeError("PageWriter is closed")
+        path = Path(path)
+        index = zlib.crc32(str(path).encode('utf-8')) % len(self._queues)
+        self._queues[index].put((path, data, tag))
+
+    def completed(self) -> List[WriteResult]:
+        """Take the results of every write finished since the last call."""
+        results = []
+        while True:
+            try:
+                results.append(self._done.popleft())
+            except IndexError:
+                return results
+
+    def flush(self) -> List[WriteResult]:
+        """Wait until every queued write is on disk; returns completed()."""
+        for q in self._queues:
+            q.join()
+        return self.completed()
+
+    def close(self) -> List[WriteResult]:
+        """Flush, stop the writer threads and return the last results."""
+        if self._closed:
+            return self.completed()
+        results = self.flush()
+        self._closed = True
+        for q in self._queues:
+            q.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        return results
+
+    def _run(self, q: queue.Queue) -> None:
+        while True:
+            item = q.get()
+            if item is _STOP:
+                q.task_done()
+                return
+            batch = [item]
+            # Take whatever else is already waiting, up to a batch
+            while len(batch) < self.batch_size:
+                try:
+                    item = q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    # Put it back behind the batch; it is the last item
+                    q.task_done()
+                    q.put(_STOP)
+                    break
+                batch.append(item)
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    q.task_done()
+
+    def _write_batch(self, batch: List[Tuple[Path, bytes, Any]]) -> None:
+        results: List[WriteResult] = []
+        staged = []
+        for path, data, tag in batch:
+            tmp = temp_path(path)
+            try:
+                f = open(tmp, 'wb')
+                try:
+                    f.write(data)
+                    f.flush()
+                except BaseException:
+                    f.close()
+                    raise
+                staged.append((path, tmp, f, tag))
+            except Exception as e:
+                _discard(tmp)
+                results.append((path, tag, e))
+
+        directories = set()
+        for path, tmp, f, tag in staged:
+            try:
+                try:
+                    if self.fsync:
+                        os.fsync(f.fileno())
+                finally:
+                    f.close()
+                os.replace(tmp, path)
+                directories.add(path.parent)
+                results.append((path, tag, None))
+            except Exception as e:
+                _discard(tmp)
+                results.append((path, tag, e))
+
+        if self.fsync:
+            for directory in directories:
+                fsync_directory(directory)
+        # Only report writes once they are durable
+        self._done.extend(results)
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Crawl planning from the site's sitemap.
+
+Instead of handing Firecrawl only a base URL, the planner lists the site's
+pages from its sitemap (found through robots.txt or at the usual places,
+falling back to a Firecrawl map call), keeps the ones that pass the
+include/exclude path globs and the depth limit, and compares each page's
+<lastmod> with when it was last scraped. Only new and updated pages, and
+pages the sitemap gives no date for, are scraped.
+
+Path globs are matched against the URL path: `*` matches within one path
+segment, `**` across segments and `?` one character, e.g.
+`/developers/changelog/**` or `**/ja/**`.
+
+Fetching the sitemap costs no Firecrawl credits and is sent without the
+Firecrawl API key.
+"""
+
+import gzip
+import re
+import xml.etree.ElementTree as ET
+from calendar import timegm
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+# Firecrawl bills one credit per scraped page and one per map call
+CREDITS_PER_PAGE = 1
+CREDITS_PER_MAP = 1
+MAX_SITEMAPS = 50
+
+
+@dataclass
+class SitemapEntry:
+    """One <url> of a sitemap."""
+
+    url: str
+    lastmod: Optional[float] = None
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a sitemap <lastmod> (W3C datetime) into a UNIX timestamp.
+
+    Accepts dates (2025-11-01) and date-times with an optional fraction and
+    a Z or +hh:mm offset. Returns None for anything else.
+    """
+    if not value:
+        return None
+    match = re.fullmatch(
+        r'(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.\d+)?)?)?\s*(Z|[+-]\d{2}:?\d{2})?',
+        value.strip(),
+    )
+    if not match:
+        return None
+    year, month, day, hour, minute, second, zone = match.groups()
+    try:
+        timestamp = timegm((int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0)))
+    except ValueError:
+        return None
+    if zone and zone != 'Z':
+        sign = -1 if zone[0] == '-' else 1
+        digits = zone[1:].replace(':', '')
+        timestamp -= sign * (int(digits[:2]) * 3600 + int(digits[2:]) * 60)
+    return float(timestamp)
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_sitemap(data: bytes) -> Tuple[List[SitemapEntry], List[str]]:
+    """
+    Parse a sitemap or sitemap index (optionally gzipped).
+
+    Returns:
+        (page entries, URLs of child sitemaps)
+    """
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+    root = ET.fromstring(data)
+    entries, children = [], []
+    for node in root:
+        values = {_local(child.tag): (child.text or '').strip() for child in node}
+        loc = values.get('loc')
+        if not loc:
+            continue
+        if _local(node.tag) == 'sitemap':
+            children.append(loc)
+        elif _local(node.tag) == 'url':
+            entries.append(SitemapEntry(loc, parse_lastmod(values.get('lastmod'))))
+    return entries, children
+
+
+def sitemap_candidates(base_url: str, robots_txt: str = '') -> List[str]:
+    """Sitemap URLs to try for a site: robots.txt entries, then the usual places."""
+    parts = urlsplit(base_url)
+    root = f"{parts.scheme}://{parts.netloc}/"
+    candidates = [
+        line.split(':', 1)[1].strip()
+        for line in robots_txt.splitlines()
+        if line.lower().startswith('sitemap:')
+    ]
+    base = base_url if base_url.endswith('/') else base_url + '/'
+    for url in (urljoin(base, 'sitemap.xml'), urljoin(root, 'sitemap.xml'), urljoin(root, 'sitemap_index.xml')):
+        if url not in candidates:
+            candidates.append(url)
+    return candidates
+
+
+def fetch_sitemap(
+    session,
+    base_url: str,
+    sitemap_url: Optional[str] = None,
+    before_request: Optional[Callable[[str], None]] = None,
+    max_sitemaps: int = MAX_SITEMAPS,
+) -> Tuple[Optional[str], List[SitemapEntry]]:
+    """
+    Download a site's sitemap, following sitemap indexes.
+
+    Args:
+        session: requests.Session without Firecrawl credentials
+        base_url: Page the crawl starts from
+        sitemap_url: Sitemap to use instead of looking for one
+        before_request: Called with every URL before it is fetched (rate limiting)
+        max_sitemaps: Most sitemap files to download
+
+    Returns:
+        (URL of the sitemap used, its entries); (None, []) if none was found
+    """
+    def get(url: str):
+        if before_request:
+            before_request(url)
+        try:
+            response = session.get(url, timeout=30)
+        except Exception:
+            return None
+        return response if response.status_code == 200 else None
+
+    if sitemap_url:
+        candidates = [sitemap_url]
+    else:
+        parts = urlsplit(base_url)
+        robots = get(f"{parts.scheme}://{parts.netloc}/robots.txt")
+        candidates = sitemap_candidates(base_url, robots.text if robots is not None else '')
+
+    for candidate in candidates:
+        response = get(candidate)
+        if response is None:
+            continue
+        try:
+            entries, pending = parse_sitemap(response.content)
+        except (ET.ParseError, OSError):
+            continue
+        seen = {candidate}
+        while pending and len(seen) < max_sitemaps:
+            child = pending.pop(0)
+            if child in seen:
+                continue
+            seen.add(child)
+            response = get(child)
+            if response is None:
+                continue
+            try:
+                child_entries, grandchildren = parse_sitemap(response.content)
+            except (ET.ParseError, OSError):
+                continue
+            entries.extend(child_entries)
+            pending.extend(grandchildren)
+        if entries:
+            return candidate, entries
+    return None, []
+
+
+def glob_to_regex(pattern: str) -> str:
+    """
+    Translate a path glob into an anchored regular expression.
+
+    The result is also valid as a Firecrawl includePaths/excludePaths entry.
+    """
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return '^' + ''.join(parts) + '$'
+
+
+class PathFilter:
+    """Include/exclude path globs and a depth limit below the base URL."""
+
+    def __init__(
+        self,
+        base_url: str,
+        include: Iterable[str] = (),
+        exclude: Iterable[str] = (),
+        max_depth: Optional[int] = None,
+    ):
+        base = urlsplit(base_url)
+        self.host = base.netloc.lower()
+        self.base_path = base.path.rstrip('/')
+        self.include = list(include)
+        self.exclude = list(exclude)
+        self.max_depth = max_depth
+        self._include = [re.compile(glob_to_regex(p)) for p in self.include]
+        self._exclude = [re.compile(glob_to_regex(p)) for p in self.exclude]
+
+    @property
+    def active(self) -> bool:
+        return bool(self.include or self.exclude or self.max_depth is not None)
+
+    def under_base(self, path: str) -> bool:
+        """True if a path is the base URL's path or below it, e.g. not /developers-old for /developers."""
+        return path == self.base_path or path.startswith(self.base_path + '/')
+
+    def depth(self, path: str) -> int:
+        """Number of path segments below the base URL's path."""
+        below = path[len(self.base_path):] if self.under_base(path) else path
+        return len([segment for segment in below.split('/') if segment])
+
+    def rejects(self, url: str) -> Optional[str]:
+        """Why a URL is out of scope ('site', 'excluded', 'depth'), or None."""
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.netloc.lower() != self.host or not self.under_base(path):
+            return 'site'
+        if self._include and not any(p.match(path) for p in self._include):
+            return 'excluded'
+        if any(p.match(path) for p in self._exclude):
+            return 'excluded'
+        if self.max_depth is not None and self.depth(path) > self.max_depth:
+            return 'depth'
+        return None
+
+    def crawl_params(self) -> dict:
+        """The same scope as Firecrawl crawl job parameters."""
+        params = {}
+        if self.include:
+            params['includePaths'] = [glob_to_regex(p) for p in self.include]
+        if self.exclude:
+            params['excludePaths'] = [glob_to_regex(p) for p in self.exclude]
+        if self.max_depth is not None:
+            params['maxDepth'] = self.max_depth
+        return params
+
+
+@dataclass
+class CrawlPlan:
+    """What a planned crawl would scrape, and why the rest is skipped."""
+
+    source: str
+    discovered: int = 0
+    urls: List[str] = field(default_factory=list)
+    to_scrape: List[str] = field(default_factory=list)
+    # <lastmod> of the pages to scrape, where the sitemap has one
+    lastmod: Dict[str, float] = field(default_factory=dict)
+    out_of_site: int = 0
+    excluded: int = 0
+    too_deep: int = 0
+    new: int = 0
+    updated: int = 0
+    undated: int = 0
+    unchanged: int = 0
+    map_calls: int = 0
+
+    @property
+    def credits(self) -> int:
+        """Estimated Firecrawl credits for carrying out the plan."""
+        return len(self.to_scrape) * CREDITS_PER_PAGE + self.map_calls * CREDITS_PER_MAP
+
+    @property
+    def full_credits(self) -> int:
+        """Estimated credits for scraping every in-scope page instead."""
+        return len(self.urls) * CREDITS_PER_PAGE + self.map_calls * CREDITS_PER_MAP
+
+    def summary(self) -> str:
+        lines = [
+            f"Crawl plan from {self.source}",
+            f"  Discovered:        {self.discovered}",
+            f"  Outside base URL:  {self.out_of_site}",
+            f"  Excluded by path:  {self.excluded}",
+            f"  Beyond max depth:  {self.too_deep}",
+            f"  In scope:          {len(self.urls)}",
+            f"  Unchanged:         {self.unchanged}",
+            f"  To scrape:         {len(self.to_scrape)} "
+            f"({self.new} new, {self.updated} updated, {self.undated} without lastmod)",
+            f"  Estimated credits: {self.credits} (full crawl of the scope: {self.full_credits})",
+        ]
+        return '\n'.join(lines)
+
+
+def plan_crawl(
+    entries: Iterable[SitemapEntry],
+    path_filter: PathFilter,
+    manifest,
+    output_dir,
+    source: str,
+    limit: Optional[int] = None,
+    skip_unchanged: bool = True,
+) -> CrawlPlan:
+    """
+    Decide which pages to scrape.
+
+    A page is unchanged if the manifest has it, its file still exists and
+    its <lastmod> is not later than the one recorded at its last scrape (or,
+    without one, than when it was last checked).
+
+    Args:
+        entries: Sitemap entries (or map results without lastmod)
+        path_filter: Scope of the crawl
+        manifest: CrawlManifest of the output directory
+        output_dir: Crawler output directory
+        source: Where the entries came from, for the summary
+        limit: Most pages to scrape
+        skip_unchanged: Compare lastmod with the manifest at all
+    """
+    plan = CrawlPlan(source=source)
+    seen = set()
+    for entry in entries:
+        url = entry.url.strip()
+        if not url or url in seen:
+            continue
+        seen.add(url)
+        plan.discovered += 1
+        reason = path_filter.rejects(url)
+        if reason == 'site':
+            plan.out_of_site += 1
+            continue
+        if reason == 'excluded':
+            plan.excluded += 1
+            continue
+        if reason == 'depth':
+            plan.too_deep += 1
+            continue
+        plan.urls.append(url)
+
+        record = manifest.get(url)
+        if not skip_unchanged or not record or not record.get('filename') \
+                or not (output_dir / record['filename']).exists():
+            plan.new += 1
+        elif entry.lastmod is None:
+            plan.undated += 1
+        elif entry.lastmod > record.get('lastmod', record.get('checked_at', 0)):
+            plan.updated += 1
+        else:
+            plan.unchanged += 1
+            continue
+        if limit is None or len(plan.to_scrape) < limit:
+            plan.to_scrape.append(url)
+            if entry.lastmod is not None:
+                plan.lastmod[url] = entry.lastmod
+    return plan
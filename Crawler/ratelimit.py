@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Rate limiting helpers shared by the crawlers.
+
+Requests are paced by token buckets, one per host. Buckets adapt to the
+server: a 429 halves the bucket's rate and pauses everyone sharing it until
+the Retry-After time has passed, and successful requests slowly raise the
+rate back to the configured maximum. Buckets are shared by every crawler in
+a process, and optionally by several processes through lock files.
+"""
+
+import asyncio
+import email.utils
+import json
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: file-based sharing is unavailable
+    fcntl = None
+
+# Status codes worth retrying: rate limits, timeouts and transient server errors
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Fraction of the maximum rate regained after each successful request
+RATE_INCREASE = 0.05
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header value into seconds from now.
+
+    Accepts both delay-seconds and HTTP-date forms.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def retry_after_from_headers(headers) -> Optional[float]:
+    """
+    Work out how long the server asked us to wait.
+
+    Uses Retry-After first, then the common rate-limit reset headers, which
+    carry either seconds to wait or a UNIX timestamp.
+    """
+    if not headers:
+        return None
+    delay = parse_retry_after(headers.get('Retry-After'))
+    if delay is not None:
+        return delay
+
+    remaining = headers.get('X-RateLimit-Remaining') or headers.get('RateLimit-Remaining')
+    reset = headers.get('X-RateLimit-Reset') or headers.get('RateLimit-Reset')
+    if reset and (remaining is None or remaining.strip() == '0'):
+        try:
+            reset_value = float(reset)
+        except ValueError:
+            return None
+        # Large values are absolute timestamps, small ones are deltas
+        if reset_value > 1e9:
+            return max(0.0, reset_value - time.time())
+        return max(0.0, reset_value)
+    return None
+
+
+def error_info(error: Exception) -> Tuple[Optional[int], Optional[float]]:
+    """
+    Extract (status_code, retry_after) from an exception.
+
+    Understands requests' HTTPError (which the Firecrawl client raises with
+    the response attached) and errors carrying status_code/retry_after
+    attributes. Clients that only put the status in the message are
+    recognised as a last resort.
+    """
+    status = getattr(error, 'status_code', None)
+    retry_after = getattr(error, 'retry_after', None)
+
+    response = getattr(error, 'response', None)
+    if response is not None:
+        status = status or getattr(response, 'status_code', None)
+        if retry_after is None:
+            retry_after = retry_after_from_headers(getattr(response, 'headers', None))
+
+    if status is None:
+        message = str(error)
+        if 'Rate limit' in message or re.search(r'\b429\b', message):
+            status = 429
+        else:
+            match = re.search(r'[Ss]tatus code (\d{3})', message)
+            if match:
+                status = int(match.group(1))
+    return status, retry_after
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for rate limits, transient server errors and network failures."""
+    status, _ = error_info(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    try:
+        import requests
+    except ImportError:
+        return False
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 120.0) -> float:
+    """Exponential backoff with full jitter for the given 0-based attempt."""
+    return random.uniform(base / 2, min(cap, base * (2 ** attempt)))
+
+
+def retry_delay(error: Exception, attempt: int, base: float = 1.0, cap: float = 120.0) -> float:
+    """Seconds to wait before retrying after `error`."""
+    _, retry_after = error_info(error)
+    delay = backoff_delay(attempt, base, cap)
+    if retry_after is not None:
+        # Honour the server, plus a little jitter so clients don't stampede
+        delay = retry_after + random.uniform(0, min(1.0, base))
+    return delay
+
+
+class TokenBucket:
+    """
+    Thread-safe adaptive token bucket.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. Callers
+    reserve a token and get back how long they must wait before using it, so
+    the bucket works from both threads and asyncio tasks.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, min_rate: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("Token bucket rate must be positive")
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 16
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Take tokens now and return the seconds to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            # Negative balance: the caller waits until the debt is refilled
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Block the current thread until tokens are available."""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens: float = 1.0) -> None:
+        """Wait in the event loop until tokens are available."""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def on_success(self) -> None:
+        """Additively raise the rate back towards the configured maximum."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_INCREASE)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> None:
+        """Halve the rate and pause everyone sharing the bucket."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+
+
+class FileTokenBucket(TokenBucket):
+    """
+    Token bucket whose state lives in a file, shared by several processes.
+
+    Every operation takes an exclusive flock on the state file, so all
+    processes pointing at the same file draw from one budget.
+    """
+
+    def __init__(self, path: Path, rate: float, capacity: Optional[float] = None, min_rate: Optional[float] = None):
+        if fcntl is None:
+            raise RuntimeError("File-based rate limiting requires fcntl (not available on this platform)")
+        super().__init__(rate, capacity, min_rate)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def _state(self):
+        """Lock the state file and yield its contents for update."""
+        with self.path.open('a+', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                try:
+                    state = json.loads(raw) if raw else {}
+                except json.JSONDecodeError:
+                    state = {}
+                now = time.time()
+                state.setdefault('tokens', self.capacity)
+                state.setdefault('updated', now)
+                state.setdefault('rate', self.max_rate)
+                state.setdefault('blocked_until', 0.0)
+                yield state, now
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        with self._state() as (state, now):
+            rate = state['rate']
+            state['tokens'] = min(self.capacity, state['tokens'] + (now - state['updated']) * rate)
+            state['updated'] = now
+            state['tokens'] -= tokens
+            wait = -state['tokens'] / rate if state['tokens'] < 0 else 0.0
+            return max(wait, state['blocked_until'] - now)
+
+    def on_success(self) -> None:
+        with self._state() as (state, now):
+            state['rate'] = min(self.max_rate, state['rate'] + self.max_rate * RATE_INCREASE)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> None:
+        with self._state() as (state, now):
+            state['rate'] = max(self.min_rate, state['rate'] / 2)
+            state['tokens'] = min(state['tokens'], 0.0)
+            if retry_after:
+                state['blocked_until'] = max(state['blocked_until'], now + retry_after)
+
+
+class HostRateLimiter:
+    """
+    One token bucket per host, created on first use.
+
+    With `lock_dir`, buckets are FileTokenBuckets in that directory so that
+    separate processes share them.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, lock_dir: Optional[str] = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.lock_dir = Path(lock_dir) if lock_dir else None
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> TokenBucket:
+        """Return the bucket for a host."""
+        with self._lock:
+            if host not in self._buckets:
+                if self.lock_dir:
+                    safe = re.sub(r'[^A-Za-z0-9._-]', '_', host) or 'default'
+                    self._buckets[host] = FileTokenBucket(self.lock_dir / f"{safe}.bucket", self.rate, self.capacity)
+                else:
+                    self._buckets[host] = TokenBucket(self.rate, self.capacity)
+            return self._buckets[host]
+
+
+_shared_limiters: Dict[Tuple[float, Optional[str]], HostRateLimiter] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_limiter(rate: float, lock_dir: Optional[str] = None) -> HostRateLimiter:
+    """Return the process-wide limiter for a rate (and optional lock directory)."""
+    key = (rate, str(lock_dir) if lock_dir else None)
+    with _shared_lock:
+        if key not in _shared_limiters:
+            _shared_limiters[key] = HostRateLimiter(rate, lock_dir=lock_dir)
+        return _shared_limiters[key]
+
+
+def call_with_backoff(
+    fn: Callable[[], object],
+    bucket: Optional[TokenBucket] = None,
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 120.0,
+    on_retry: Optional[Callable[[int, float, Exception], None]] = None,
+):
+    """
+    Call `fn`, pacing it through `bucket` and retrying transient failures.
+
+    Rate limits feed back into the bucket so every caller sharing it slows
+    down. Non-retryable errors and the last failure are re-raised.
+
+    Args:
+        fn: Zero-argument callable making one request
+        bucket: Token bucket to pace the calls with
+        max_retries: Retries after the first attempt
+        base_delay: Initial backoff in seconds
+        max_delay: Backoff cap in seconds
+        on_retry: Called as on_retry(attempt, delay, error) before sleeping
+    """
+    for attempt in range(max_retries + 1):
+        if bucket:
+            bucket.acquire()
+        try:
+            result = fn()
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            status, retry_after = error_info(e)
+            if bucket and status == 429:
+                bucket.on_rate_limited(retry_after)
+            delay = retry_delay(e, attempt, base_delay, max_delay)
+            if on_retry:
+                on_retry(attempt, delay, e)
+            time.sleep(delay)
+        else:
+            if bucket:
+                bucket.on_success()
+            return result
+    raise RuntimeError("unreachable")
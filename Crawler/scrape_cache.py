@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+"""
+Disk cache of Firecrawl responses.
+
+Rerunning a crawler while tuning categories, page formatting or combining
+would scrape the same pages again. With --cache-mode the crawlers keep
+every Firecrawl response (single-page scrapes, map calls and whole crawl
+jobs) in a cache directory and serve later runs from it, so those runs take
+seconds, work offline and cost no credits.
+
+Responses are stored content-addressed: each distinct response body is one
+zlib-compressed JSON file named after its SHA-256, shared by every request
+that returned it. An SQLite index maps each request (kind, URL and request
+parameters) to its bodies, with when it was stored and last used. Entries
+older than the TTL are not served, and once the bodies take more than the
+size limit the least recently used entries are evicted.
+
+Modes:
+    off      Do not use the cache
+    read     Serve cached responses; fetch misses but do not store them
+    write    Serve cached responses; fetch and store misses
+    refresh  Fetch everything and replace the cached responses
+
+Usage:
+    python3 scrape_cache.py stats
+    python3 scrape_cache.py evict --max-size 500MB --ttl 7d
+    python3 scrape_cache.py clear
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from metrics import METRICS
+from page_writer import write_atomic
+
+CACHE_MODES = ('off', 'read', 'write', 'refresh')
+DEFAULT_CACHE_DIR = Path(__file__).parent / '.firecrawl_cache'
+INDEX_FILENAME = 'index.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    url TEXT NOT NULL,
+    digest TEXT,
+    size INTEGER NOT NULL DEFAULT 0,
+    complete INTEGER NOT NULL DEFAULT 1,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS members (
+    key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (key, position)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+CREATE INDEX IF NOT EXISTS members_digest ON members (digest);
+CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest);
+"""
+
+
+def parse_size(value: str) -> int:
+    """Parse a size such as "500MB", "2G" or "1048576" into bytes."""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?', value.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid size: {value!r} (use e.g. 500MB or 2GB)")
+    return int(float(match.group(1)) * 1024 ** ' kmgt'.index(match.group(2) or ' '))
+
+
+def request_key(kind: str, url: str, params: Optional[dict] = None) -> str:
+    """Cache key of a request: its kind, URL and parameters."""
+    text = json.dumps([kind, url, params or {}], sort_keys=True)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ScrapeCache:
+    """Content-addressed response store with TTL and LRU size eviction."""
+
+    def __init__(
+        self,
+        directory: Path = DEFAULT_CACHE_DIR,
+        mode: str = 'write',
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        """
+        Args:
+            directory: Cache directory
+            mode: 'read', 'write' or 'refresh' (see the module docstring)
+            ttl: Seconds a response is served after it was stored (None: forever)
+            max_bytes: Evict least recently used entries beyond this many bytes
+        """
+        if mode not in CACHE_MODES or mode == 'off':
+            raise ValueError(f"Invalid cache mode: {mode!r}")
+        self.directory = Path(directory)
+        self.mode = mode
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.objects = self.directory / 'objects'
+        self.objects.mkdir(parents=True, exist_ok=True)
+        # Scrape engine workers and parallel site crawls share one cache
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            str(self.directory / INDEX_FILENAME), check_same_thread=False, isolation_level=None
+        )
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    @property
+    def readable(self) -> bool:
+        return self.mode in ('read', 'write')
+
+    @property
+    def writable(self) -> bool:
+        return self.mode in ('write', 'refresh')
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / f"{digest}.json.z"
+
+    def _fresh(self, stored_at: float) -> bool:
+        return self.ttl is None or time.time() - stored_at <= self.ttl
+
+    def _load(self, digest: str) -> Optional[Any]:
+        try:
+            return json.loads(zlib.decompress(self._blob_path(digest).read_bytes()))
+        except (OSError, ValueError, zlib.error):
+            return None
+
+    def _store_blob(self, value: Any) -> Tuple[str, int]:
+        """Store a body unless it is already there; returns its digest and size."""
+        data = json.dumps(value, sort_keys=True).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        row = self.conn.execute("SELECT size FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        if row:
+            return digest, row[0]
+        compressed = zlib.compress(data, 6)
+        path = self._blob_path(digest)
+        path.parent.mkdir(exist_ok=True)
+        # A cache only has to be consistent, not durable
+        write_atomic(path, compressed, fsync=False)
+        self.conn.execute("INSERT INTO blobs (digest, size) VALUES (?, ?)", (digest, len(compressed)))
+        self.total_bytes += len(compressed)
+        return digest, len(compressed)
+
+    def get(self, kind: str, url: str, params: Optional[dict] = None) -> Optional[Any]:
+        """Cached response of a request, or None on a miss (or when not readable)."""
+        if not self.readable:
+            return None
+        key = request_key(kind, url, params)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT digest, stored_at FROM entries WHERE key = ? AND complete = 1", (key,)
+            ).fetchone()
+            value = self._load(row[0]) if row and self._fresh(row[1]) else None
+            if value is None:
+                METRICS.incr('cache_misses')
+                return None
+            self.conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        METRICS.incr('cache_hits')
+        return value
+
+    def put(self, kind: str, url: str, value: Any, params: Optional[dict] = None) -> None:
+        """Store the response of a request (when writable)."""
+        if not self.writable:
+            return
+        key = request_key(kind, url, params)
+        now = time.time()
+        with self._lock:
+            digest, size = self._store_blob(value)
+            self.conn.execute("DELETE FROM members WHERE key = ?", (key,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, kind, url, digest, size, complete, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, 1, ?, ?)",
+                (key, kind, url, digest, size, now, now),
+            )
+            METRICS.incr('cache_stores')
+            self._evict_if_full()
+
+    def job_pages(self, url: str, params: Optional[dict] = None) -> Optional[List[str]]:
+        """
+        Body digests of the pages of a completed, cached crawl job.
+
+        Returns:
+            The digests in crawl order (load them with iter_job), or None
+        """
+        if not self.readable:
+            return None
+        key = request_key('crawl', url, params)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT stored_at FROM entries WHERE key = ? AND complete = 1", (key,)
+            ).fetchone()
+            if not row or not self._fresh(row[0]):
+                METRICS.incr('cache_misses')
+                return None
+            self.conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            digests = [d for (d,) in self.conn.execute(
+                "SELECT digest FROM members WHERE key = ? ORDER BY position", (key,)
+            )]
+        METRICS.incr('cache_hits')
+        return digests
+
+    def iter_job(self, digests: List[str]) -> Iterator[dict]:
+        """Pages of a cached crawl job, skipping bodies that went missing."""
+        for digest in digests:
+            page = self._load(digest)
+            if page is not None:
+                yield page
+
+    def begin_job(self, url: str, params: Optional[dict] = None) -> Optional[str]:
+        """
+        Start recording a crawl job; its pages are added with add_job_page.
+
+        The entry is not served until finish_job, so an interrupted crawl is
+        never replayed as a complete one.
+
+        Returns:
+            The entry key, or None when not writable
+        """
+        if not self.writable:
+            return None
+        key = request_key('crawl', url, params)
+        now = time.time()
+        with self._lock:
+            self.conn.execute("DELETE FROM members WHERE key = ?", (key,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, kind, url, digest, complete, stored_at, accessed_at) "
+                "VALUES (?, 'crawl', ?, NULL, 0, ?, ?)",
+                (key, url, now, now),
+            )
+        return key
+
+    def add_job_page(self, key: Optional[str], position: int, page: dict) -> None:
+        """Record one page of a crawl job started with begin_job."""
+        if key is None:
+            return
+        with self._lock:
+            digest, size = self._store_blob(page)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO members (key, position, digest) VALUES (?, ?, ?)",
+                (key, position, digest),
+            )
+            self.conn.execute("UPDATE entries SET size = size + ? WHERE key = ?", (size, key))
+
+    def finish_job(self, key: Optional[str]) -> None:
+        """Mark a recorded crawl job complete, so later runs can replay it."""
+        if key is None:
+            return
+        with self._lock:
+            self.conn.execute(
+                "UPDATE entries SET complete = 1, stored_at = ?, accessed_at = ? WHERE key = ?",
+                (time.time(), time.time(), key),
+            )
+            METRICS.incr('cache_stores')
+            self._evict_if_full()
+
+    def _evict_if_full(self) -> None:
+        if self.max_bytes is not None and self.total_bytes > self.max_bytes:
+            # Evict a little more than needed so the next stores do not evict again
+            self._evict(int(self.max_bytes * 0.9))
+
+    def evict(self, max_bytes: Optional[int] = None, expired: bool = True) -> int:
+        """
+        Drop expired entries and least recently used ones beyond a size.
+
+        Args:
+            max_bytes: Size to shrink to (default: the cache's limit)
+            expired: Also drop entries older than the TTL
+
+        Returns:
+            Number of entries dropped
+        """
+        with self._lock:
+            dropped = 0
+            if expired and self.ttl is not None:
+                keys = [k for (k,) in self.conn.execute(
+                    "SELECT key FROM entries WHERE stored_at < ?", (time.time() - self.ttl,)
+                )]
+                dropped += self._drop(keys)
+            limit = self.max_bytes if max_bytes is None else max_bytes
+            if limit is not None:
+                dropped += self._evict(limit)
+            else:
+                self._collect()
+            return dropped
+
+    def _evict(self, target: int) -> int:
+        dropped = 0
+        while self.total_bytes > target:
+            # Entry sizes overstate what dropping frees when bodies are
+            # shared, so drop the oldest entries that should be enough and
+            # look again
+            keys, freed = [], 0
+            for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+                keys.append(key)
+                freed += size
+                if self.total_bytes - freed <= target:
+                    break
+            if not keys:
+                break
+            dropped += self._drop(keys)
+        return dropped
+
+    def _drop(self, keys: List[str]) -> int:
+        if not keys:
+            return 0
+        self.conn.execute("BEGIN")
+        for key in keys:
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.conn.execute("DELETE FROM members WHERE key = ?", (key,))
+        self.conn.execute("COMMIT")
+        METRICS.incr('cache_evictions', len(keys))
+        self._collect()
+        return len(keys)
+
+    def _collect(self) -> None:
+        """Delete bodies no entry refers to any more."""
+        orphans = self.conn.execute(
+            "SELECT digest, size FROM blobs b WHERE "
+            "NOT EXISTS (SELECT 1 FROM entries e WHERE e.digest = b.digest) AND "
+            "NOT EXISTS (SELECT 1 FROM members m WHERE m.digest = b.digest)"
+        ).fetchall()
+        for digest, size in orphans:
+            try:
+                self._blob_path(digest).unlink()
+            except OSError:
+                pass
+            self.conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+            self.total_bytes -= size
+            METRICS.incr('cache_bytes_evicted', size)
+
+    def clear(self) -> None:
+        """Drop every cached response."""
+        with self._lock:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.execute("DELETE FROM members")
+            self._collect()
+
+    def stats(self) -> dict:
+        """Entry counts by kind and the size of the stored bodies."""
+        with self._lock:
+            kinds = dict(self.conn.execute(
+                "SELECT kind, COUNT(*) FROM entries WHERE complete = 1 GROUP BY kind"
+            ).fetchall())
+            blobs = self.conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+        return {'entries': kinds, 'bodies': blobs, 'bytes': self.total_bytes}
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class CachedClient:
+    """CrawlClient whose scrape and map calls go through a ScrapeCache."""
+
+    def __init__(self, client, cache: ScrapeCache):
+        self.client = client
+        self.cache = cache
+        self.api_url = client.api_url
+
+    def async_crawl_url(self, url: str, params: Optional[dict] = None) -> dict:
+        return self.client.async_crawl_url(url, params=params)
+
+    def scrape_url(self, url: str, params: Optional[dict] = None) -> dict:
+        page = self.cache.get('scrape', url, params)
+        if page is None:
+            page = self.client.scrape_url(url, params=params)
+            if page:
+                self.cache.put('scrape', url, page, params)
+        return page
+
+    def map_url(self, url: str, params: Optional[dict] = None) -> dict:
+        result = self.cache.get('map', url, params)
+        if result is None:
+            result = self.client.map_url(url, params=params)
+            if result:
+                self.cache.put('map', url, result, params)
+        return result
+
+
+_shared_caches: Dict[Tuple[str, str, Optional[float], Optional[int]], ScrapeCache] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_cache(
+    directory: Path,
+    mode: str = 'write',
+    ttl: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+) -> ScrapeCache:
+    """Return the process-wide cache for a directory and settings."""
+    key = (str(Path(directory).resolve()), mode, ttl, max_bytes)
+    with _shared_lock:
+        if key not in _shared_caches:
+            _shared_caches[key] = ScrapeCache(directory, mode, ttl, max_bytes)
+        return _shared_caches[key]
+
+
+def add_cache_arguments(parser) -> None:
+    """Add --cache-mode, --cache-dir, --cache-ttl and --cache-max-size to a parser."""
+    parser.add_argument(
+        '--cache-mode',
+        choices=CACHE_MODES,
+        default='off',
+        help='Firecrawl response cache: read (use only), write (use and fill), '
+             'refresh (re-fetch and replace) or off (default)'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        default=str(DEFAULT_CACHE_DIR),
+        help=f'Directory of the response cache (default: {DEFAULT_CACHE_DIR.name} next to the scripts)'
+    )
+    parser.add_argument(
+        '--cache-ttl',
+        default=None,
+        help='Do not serve cached responses older than this, e.g. 12h or 7d (default: no expiry)'
+    )
+    parser.add_argument(
+        '--cache-max-size',
+        default=None,
+        help='Evict least recently used responses beyond this size, e.g. 500MB (default: no limit)'
+    )
+
+
+def cache_from_args(args) -> Optional[ScrapeCache]:
+    """
+    The cache selected on the command line, or None with --cache-mode off.
+
+    Crawlers of several sites in one process share the same cache.
+
+    Raises:
+        ValueError: If --cache-ttl or --cache-max-size cannot be parsed
+    """
+    from manifest import parse_duration
+
+    if getattr(args, 'cache_mode', 'off') == 'off':
+        return None
+    ttl = None
+    if args.cache_ttl:
+        ttl = parse_duration(args.cache_ttl)
+        if ttl is None:
+            raise ValueError(f"Invalid --cache-ttl value: {args.cache_ttl!r} (use e.g. 12h or 7d)")
+    max_bytes = parse_size(args.cache_max_size) if args.cache_max_size else None
+    return shared_cache(Path(args.cache_dir), args.cache_mode, ttl, max_bytes)
+
+
+def main():
+    """Inspect or trim the response cache."""
+    import argparse
+
+    from manifest import parse_duration
+
+    parser = argparse.ArgumentParser(description="Inspect or trim the Firecrawl response cache")
+    parser.add_argument('--cache-dir', default=str(DEFAULT_CACHE_DIR), help='Cache directory')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    sub.add_parser('stats', help='Entries and size of the cache')
+
+    evict_parser = sub.add_parser('evict', help='Drop expired and least recently used responses')
+    evict_parser.add_argument('--max-size', default=None, help='Shrink the cache to this size, e.g. 500MB')
+    evict_parser.add_argument('--ttl', default=None, help='Drop responses older than this, e.g. 7d')
+
+    sub.add_parser('clear', help='Drop every cached response')
+
+    args = parser.parse_args()
+    if not Path(args.cache_dir).exists():
+        print(f"Error: {args.cache_dir} directory not found")
+        exit(1)
+
+    try:
+        ttl = parse_duration(args.ttl) if getattr(args, 'ttl', None) else None
+        max_bytes = parse_size(args.max_size) if getattr(args, 'max_size', None) else None
+    except ValueError as e:
+        print(f"Error: {e}")
+        exit(1)
+    cache = ScrapeCache(Path(args.cache_dir), 'write', ttl, max_bytes)
+
+    try:
+        if args.command == 'stats':
+            stats = cache.stats()
+            for kind, count in sorted(stats['entries'].items()):
+                print(f"{kind:<8} {count:>8} entries")
+            print(f"{'bodies':<8} {stats['bodies']:>8} ({stats['bytes'] / 1e6:.1f} MB)")
+        elif args.command == 'evict':
+            dropped = cache.evict()
+            print(f"Dropped {dropped} entries; {cache.total_bytes / 1e6:.1f} MB left")
+        elif args.command == 'clear':
+            cache.clear()
+            print(f"Cleared {args.cache_dir}")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
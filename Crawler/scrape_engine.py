@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Concurrent per-URL scrape engine.
+
+Scrapes a list of URLs through Firecrawl's single-page scrape endpoint with a
+bounded number of requests in flight. All workers share one pooled HTTP
+session and the Firecrawl API host's token bucket, which crawl job calls in
+the same process use too. Failures are retried per URL so one slow or broken
+page never holds up the rest. With a
+ScrapeCache, cached pages are returned without a request or a rate token.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import METRICS
+from ratelimit import (
+    RETRYABLE_STATUS,
+    HostRateLimiter,
+    retry_after_from_headers,
+    retry_delay,
+    shared_limiter,
+)
+
+
+class ScrapeError(Exception):
+    """A single-page scrape failed."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code is None or self.status_code in RETRYABLE_STATUS
+
+
+def load_seed_file(path: str) -> List[str]:
+    """Read one URL per line, ignoring blank lines and # comments."""
+    urls = []
+    for line in Path(path).read_text(encoding='utf-8').splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            urls.append(line)
+    return urls
+
+
+class ScrapeEngine:
+    """Scrape many URLs concurrently through the Firecrawl API."""
+
+    def __init__(
+        self,
+        api_key: str,
+        api_url: str = "https://api.firecrawl.dev",
+        concurrency: int = 8,
+        rate_per_host: float = 5.0,
+        max_retries: int = 3,
+        scrape_params: Optional[dict] = None,
+        rate_limiter: Optional[HostRateLimiter] = None,
+        cache=None,
+    ):
+        self.api_url = api_url.rstrip('/')
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.scrape_params = scrape_params or {'formats': ['markdown']}
+        self.limiter = rate_limiter or shared_limiter(rate_per_host)
+        # Every request goes to the API, whichever site the URL is on
+        self.api_host = urlparse(self.api_url).netloc
+        # Optional scrape_cache.ScrapeCache
+        self.cache = cache
+
+        # One pooled session shared by every worker thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {api_key}',
+        })
+
+    @METRICS.timed('api.scrape')
+    def scrape(self, url: str) -> dict:
+        """
+        Scrape a single URL (blocking).
+
+        Returns:
+            The page dictionary with `markdown` and `metadata`
+
+        Raises:
+            ScrapeError: If the request fails or returns no data
+        """
+        try:
+            response = self.session.post(
+                f"{self.api_url}/v1/scrape",
+                json={'url': url, **self.scrape_params},
+                timeout=120,
+            )
+        except requests.RequestException as e:
+            raise ScrapeError(f"Request failed: {e}")
+
+        if response.status_code != 200:
+            raise ScrapeError(
+                f"Scrape failed with status {response.status_code}: {response.text[:200]}",
+                status_code=response.status_code,
+                retry_after=retry_after_from_headers(response.headers),
+            )
+        body = response.json()
+        if not body.get('success') or 'data' not in body:
+            raise ScrapeError(f"Scrape failed: {body.get('error', 'no data returned')}", status_code=200)
+
+        page = body['data']
+        page.setdefault('metadata', {}).setdefault('sourceURL', url)
+        return page
+
+    async def _scrape_with_retry(self, url: str, executor: ThreadPoolExecutor) -> dict:
+        """Scrape a URL in the worker pool, retrying transient failures."""
+        loop = asyncio.get_running_loop()
+        if self.cache is not None:
+            page = await loop.run_in_executor(executor, self.cache.get, 'scrape', url, self.scrape_params)
+            if page is not None:
+                return page
+        bucket = self.limiter.bucket(self.api_host)
+
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire_async()
+            try:
+                page = await loop.run_in_executor(executor, self.scrape, url)
+            except ScrapeError as e:
+                if not e.retryable or attempt == self.max_retries:
+                    raise
+                if e.status_code == 429:
+                    # Slow down every request to the API, not just this engine's
+                    bucket.on_rate_limited(e.retry_after)
+                    METRICS.incr('rate_limited')
+                # Jittered exponential backoff (or Retry-After), only this URL waits
+                delay = retry_delay(e, attempt)
+                METRICS.incr('retries')
+                METRICS.incr('retry_wait_seconds', delay)
+                await asyncio.sleep(delay)
+            else:
+                bucket.on_success()
+                if self.cache is not None:
+                    await loop.run_in_executor(executor, self.cache.put, 'scrape', url, page, self.scrape_params)
+                return page
+        raise ScrapeError("Retries exhausted")
+
+    async def run(
+        self,
+        urls: List[str],
+        on_result: Callable[[str, Optional[dict], Optional[Exception]], None],
+    ) -> None:
+        """
+        Scrape all URLs and report each result as soon as it completes.
+
+        Args:
+            urls: URLs to scrape
+            on_result: Called as on_result(url, page, error) from the event
+                loop thread, with exactly one of page/error set
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            async def worker(url: str) -> None:
+                async with semaphore:
+                    try:
+                        page = await self._scrape_with_retry(url, executor)
+                    except Exception as e:
+                        on_result(url, None, e)
+                    else:
+                        on_result(url, page, None)
+
+            await asyncio.gather(*(worker(url) for url in urls))
+
+    def close(self) -> None:
+        """Close the shared HTTP session."""
+        self.session.close()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Full-text search index over crawled markdown pages.
+
+Every output directory gets a `.search.sqlite` database holding an SQLite
+FTS5 index of its pages, split at markdown headings so hits point at a
+section rather than a whole page. The crawlers update it from save_markdown
+as pages are written; pages whose content did not change are not reindexed.
+docs_search.py queries one or more of these indexes.
+"""
+
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List
+
+SEARCH_FILENAME = '.search.sqlite'
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS sections USING fts5(
+    url UNINDEXED,
+    filename UNINDEXED,
+    anchor UNINDEXED,
+    page_title,
+    heading,
+    body,
+    tokenize = 'porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS indexed_pages (
+    url TEXT PRIMARY KEY,
+    content_hash TEXT
+);
+"""
+
+# bm25() weights for page_title, heading and body (UNINDEXED columns count too)
+RANK_WEIGHTS = (0.0, 0.0, 0.0, 5.0, 3.0, 1.0)
+
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+FENCE_RE = re.compile(r'^\s*(```|~~~)')
+
+
+@dataclass
+class Section:
+    """One heading-level section of a page."""
+
+    heading: str
+    anchor: str
+    body: str
+
+
+@dataclass
+class SearchHit:
+    """One ranked search result."""
+
+    url: str
+    filename: str
+    anchor: str
+    page_title: str
+    heading: str
+    snippet: str
+    score: float
+    source: str = ''
+
+    @property
+    def link(self) -> str:
+        """Source URL pointing at the matching section."""
+        return f"{self.url}#{self.anchor}" if self.anchor else self.url
+
+
+def slugify(heading: str) -> str:
+    """GitHub-style anchor for a heading."""
+    slug = re.sub(r'[^\w\- ]', '', heading.lower()).strip()
+    return slug.replace(' ', '-')
+
+
+def split_sections(markdown: str) -> List[Section]:
+    """
+    Split a markdown page at its headings.
+
+    Text before the first heading becomes a section with an empty heading.
+    Lines inside fenced code blocks are never treated as headings.
+    """
+    sections = []
+    heading, anchor, lines = '', '', []
+    in_fence = False
+    for line in markdown.splitlines():
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING_RE.match(line)
+        if match:
+            if heading or any(l.strip() for l in lines):
+                sections.append(Section(heading, anchor, '\n'.join(lines).strip()))
+            heading = match.group(2)
+            anchor = slugify(heading)
+            lines = []
+        else:
+            lines.append(line)
+    if heading or any(l.strip() for l in lines):
+        sections.append(Section(heading, anchor, '\n'.join(lines).strip()))
+    return sections
+
+
+def build_match_query(query: str) -> str:
+    """
+    Turn free text into an FTS5 query.
+
+    Every word is quoted so punctuation such as '-' or ':' cannot be read as
+    FTS5 syntax; the last word is matched as a prefix.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return ''
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class SearchIndex:
+    """FTS5 index of the pages in one output directory."""
+
+    def __init__(self, path: Path, commit_every: int = 100):
+        self.path = Path(path)
+        self.commit_every = commit_every
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        # Raises sqlite3.OperationalError if SQLite was built without FTS5
+        self.conn.executescript(SCHEMA)
+
+    @classmethod
+    def for_directory(cls, output_dir: Path) -> 'SearchIndex':
+        """Open the search index of a crawler output directory."""
+        return cls(Path(output_dir) / SEARCH_FILENAME)
+
+    def is_current(self, url: str, digest: str) -> bool:
+        """True if the page is indexed with this content hash."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT content_hash FROM indexed_pages WHERE url = ?", (url,)
+            ).fetchone()
+        return row is not None and row[0] == digest
+
+    def index_page(self, url: str, filename: str, title: str, content: str, digest: str = '') -> int:
+        """
+        Replace the indexed sections of a page.
+
+        Returns:
+            Number of sections indexed
+        """
+        rows = [
+            (url, filename, s.anchor, title, s.heading, s.body)
+            for s in split_sections(content)
+        ]
+        with self._lock:
+            self.conn.execute("DELETE FROM sections WHERE url = ?", (url,))
+            self.conn.executemany(
+                "INSERT INTO sections (url, filename, anchor, page_title, heading, body) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO indexed_pages (url, content_hash) VALUES (?, ?)",
+                (url, digest),
+            )
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self.conn.commit()
+                self._pending = 0
+        return len(rows)
+
+    def remove_page(self, url: str) -> None:
+        """Drop a page from the index."""
+        with self._lock:
+            self.conn.execute("DELETE FROM sections WHERE url = ?", (url,))
+            self.conn.execute("DELETE FROM indexed_pages WHERE url = ?", (url,))
+
+    def rename_page(self, url: str, filename: str) -> None:
+        """Record that a page's file moved."""
+        with self._lock:
+            self.conn.execute("UPDATE sections SET filename = ? WHERE url = ?", (filename, url))
+
+    def merge(self, path: Path) -> int:
+        """
+        Take over the pages indexed in another search index, e.g. a queue worker's.
+
+        Returns:
+            Number of pages taken over
+        """
+        with self._lock:
+            self.conn.commit()
+            self.conn.execute("ATTACH DATABASE ? AS other", (str(path),))
+            try:
+                merged = self.conn.execute("SELECT COUNT(*) FROM other.indexed_pages").fetchone()[0]
+                self.conn.execute("DELETE FROM sections WHERE url IN (SELECT url FROM other.indexed_pages)")
+                self.conn.execute(
+                    "INSERT INTO sections (url, filename, anchor, page_title, heading, body) "
+                    "SELECT url, filename, anchor, page_title, heading, body FROM other.sections"
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO indexed_pages (url, content_hash) "
+                    "SELECT url, content_hash FROM other.indexed_pages"
+                )
+                self.conn.commit()
+            finally:
+                self.conn.execute("DETACH DATABASE other")
+            self._pending = 0
+        return merged
+
+    def indexed_urls(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT url FROM indexed_pages")]
+
+    def search(self, query: str, limit: int = 10, raw: bool = False) -> List[SearchHit]:
+        """
+        Return the best matching sections, best first.
+
+        Args:
+            query: Free text, or an FTS5 query when raw is set
+            limit: Maximum number of hits
+            raw: Pass the query to FTS5 unchanged
+
+        Raises:
+            ValueError: If a raw query is not valid FTS5 syntax
+        """
+        match = query if raw else build_match_query(query)
+        if not match:
+            return []
+        sql = (
+            "SELECT url, filename, anchor, page_title, heading, "
+            "snippet(sections, 5, '**', '**', ' … ', 16), "
+            f"bm25(sections, {', '.join(str(w) for w in RANK_WEIGHTS)}) AS score "
+            "FROM sections WHERE sections MATCH ? ORDER BY score LIMIT ?"
+        )
+        try:
+            with self._lock:
+                rows = self.conn.execute(sql, (match, limit)).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Invalid search query: {e}")
+        return [
+            SearchHit(
+                url=url, filename=filename, anchor=anchor, page_title=title,
+                heading=heading, snippet=' '.join(snippet.split()), score=score,
+                source=self.path.parent.name,
+            )
+            for url, filename, anchor, title, heading, snippet, score in rows
+        ]
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM indexed_pages").fetchone()[0]
+
+    def commit(self) -> None:
+        """Commit pending writes."""
+        with self._lock:
+            self.conn.commit()
+            self._pending = 0
+
+    def optimize(self) -> None:
+        """Merge the FTS5 b-trees after a large rebuild."""
+        with self._lock:
+            self.conn.execute("INSERT INTO sections (sections) VALUES ('optimize')")
+            self.conn.commit()
+
+    def close(self) -> None:
+        """Commit and close the database."""
+        self.commit()
+        self.conn.close()
+
+
+def iter_indexable_pages(output_dir: Path) -> Iterator[Path]:
+    """Page files of an output directory, without generated documents."""
+    from frontmatter import iter_page_files
+
+    for path in iter_page_files(output_dir):
+        if path.name.startswith('combined_') or path.name.startswith('0'):
+            continue
+        yield path
+
+
+def rebuild_search_index(output_dir: Path) -> int:
+    """
+    Index every page of an existing output directory.
+
+    Pages already indexed with the same content are skipped, and pages
+    whose files are gone are dropped from the index.
+
+    Returns:
+        Number of pages (re)indexed
+    """
+    from frontmatter import read_page
+    from layout import relative_filename
+    from manifest import content_hash
+
+    output_dir = Path(output_dir)
+    index = SearchIndex.for_directory(output_dir)
+    seen = set()
+    count = 0
+    for path in iter_indexable_pages(output_dir):
+        meta, body = read_page(path)
+        url = meta.source_url or str(path)
+        seen.add(url)
+        # save_markdown separates header and content with one blank line
+        content = body[1:] if meta.has_frontmatter and body.startswith('\n') else body
+        digest = content_hash(content)
+        if index.is_current(url, digest):
+            continue
+        index.index_page(url, relative_filename(path, output_dir), meta.title, content, digest)
+        count += 1
+    for url in index.indexed_urls():
+        if url not in seen:
+            index.remove_page(url)
+    index.optimize()
+    index.close()
+    return count
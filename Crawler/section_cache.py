@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Section cache for incremental combining.
+
+The combiners keep `.sections.sqlite` next to the combined documents. For
+every source (a page file or URL) it stores the hash of the source, its
+candidate boilerplate blocks, and the rendered section with its category and
+duplicate fingerprint together with the render settings used to build it.
+For every combined document it stores the ordered list of sections it was
+built from.
+
+On a rerun only sources whose hash or render settings changed are parsed
+and rendered again. A document whose section list did not change is left
+alone; the others are rebuilt by splicing the cached section bodies, so a
+run costs time in proportion to what changed rather than to the corpus.
+"""
+
+import hashlib
+import json
+import sqlite3
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from combined_writer import CombinedDocumentWriter
+from dedup import Deduplicator, Fingerprint
+from metrics import METRICS
+from section_index import index_path
+
+SECTION_CACHE_FILENAME = '.sections.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sections (
+    key TEXT PRIMARY KEY,
+    source_hash TEXT NOT NULL,
+    stamp TEXT,
+    block_keys TEXT,
+    settings TEXT,
+    category TEXT,
+    source_url TEXT,
+    content_hash TEXT,
+    signature BLOB,
+    section TEXT
+);
+CREATE TABLE IF NOT EXISTS documents (
+    filename TEXT PRIMARY KEY,
+    settings TEXT NOT NULL,
+    sections TEXT NOT NULL
+);
+"""
+
+
+@dataclass
+class CachedSection:
+    """A rendered section and what it was built from."""
+
+    key: str
+    category: str
+    section: str
+    source_url: str = ''
+    fingerprint: Optional[Fingerprint] = None
+
+
+@dataclass
+class SourceState:
+    """What the cache knows about a source without its section body."""
+
+    source_hash: str
+    stamp: Optional[str]
+    settings: Optional[str]
+    has_block_keys: bool
+
+
+def settings_key(**settings) -> str:
+    """Stable hash of the settings a section or document was rendered with."""
+    text = json.dumps(settings, sort_keys=True, default=sorted)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+def file_stamp(path: Path) -> str:
+    """Cheap change marker of a file: its size and modification time."""
+    st = path.stat()
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def _pack_signature(signature: Tuple[int, ...]) -> bytes:
+    return struct.pack(f'<{len(signature)}Q', *signature)
+
+
+def _unpack_signature(data: Optional[bytes]) -> Tuple[int, ...]:
+    if not data:
+        return ()
+    return struct.unpack(f'<{len(data) // 8}Q', data)
+
+
+class SectionCache:
+    """Rendered sections and document layouts stored in an SQLite database."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    @classmethod
+    def for_directory(cls, output_dir: Path) -> 'SectionCache':
+        """Open the section cache of a combined documents directory."""
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        return cls(output_dir / SECTION_CACHE_FILENAME)
+
+    def states(self) -> Dict[str, SourceState]:
+        """Hash, stamp and render settings of every cached source."""
+        rows = self.conn.execute(
+            "SELECT key, source_hash, stamp, settings, block_keys IS NOT NULL FROM sections"
+        )
+        return {key: SourceState(h, stamp, settings, bool(blocks)) for key, h, stamp, settings, blocks in rows}
+
+    def put_source(
+        self,
+        key: str,
+        source_hash: str,
+        stamp: Optional[str] = None,
+        block_keys: Optional[Set[str]] = None,
+    ) -> None:
+        """Record a scanned source; its section is dropped if the hash changed."""
+        blocks = json.dumps(sorted(block_keys)) if block_keys is not None else None
+        self.conn.execute(
+            "INSERT INTO sections (key, source_hash, stamp, block_keys) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            "settings = CASE WHEN source_hash = excluded.source_hash THEN settings END, "
+            "block_keys = CASE WHEN source_hash = excluded.source_hash "
+            "THEN COALESCE(excluded.block_keys, block_keys) ELSE excluded.block_keys END, "
+            "source_hash = excluded.source_hash, stamp = excluded.stamp",
+            (key, source_hash, stamp, blocks),
+        )
+
+    def put_section(self, entry: CachedSection, settings: str) -> None:
+        """Store the rendered section of a source recorded with put_source."""
+        fp = entry.fingerprint
+        self.conn.execute(
+            "UPDATE sections SET settings = ?, category = ?, source_url = ?, "
+            "content_hash = ?, signature = ?, section = ? WHERE key = ?",
+            (
+                settings,
+                entry.category,
+                entry.source_url,
+                fp.content_hash if fp else None,
+                _pack_signature(fp.signature) if fp else None,
+                entry.section,
+                entry.key,
+            ),
+        )
+
+    def iter_block_keys(self, keys: Iterable[str]) -> Iterator[Set[str]]:
+        """Cached boilerplate block keys of the given sources."""
+        wanted = set(keys)
+        for key, blocks in self.conn.execute("SELECT key, block_keys FROM sections"):
+            if key in wanted:
+                yield set(json.loads(blocks)) if blocks else set()
+
+    def rendered(self, settings: str) -> Dict[str, Tuple[str, str, Optional[Fingerprint]]]:
+        """(category, source URL, fingerprint) of every section rendered with settings."""
+        rows = self.conn.execute(
+            "SELECT key, category, source_url, content_hash, signature FROM sections WHERE settings = ?",
+            (settings,),
+        )
+        return {
+            key: (category, source_url, Fingerprint(h, _unpack_signature(sig)) if h else None)
+            for key, category, source_url, h, sig in rows
+        }
+
+    def section_text(self, key: str) -> str:
+        """Rendered section body of a source."""
+        row = self.conn.execute("SELECT section FROM sections WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else ''
+
+    def document(self, filename: str) -> Optional[Tuple[str, list]]:
+        """Settings and section list a combined document was last built from."""
+        row = self.conn.execute(
+            "SELECT settings, sections FROM documents WHERE filename = ?", (filename,)
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def set_document(self, filename: str, settings: str, sections: list) -> None:
+        """Record what a combined document was built from."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO documents (filename, settings, sections) VALUES (?, ?, ?)",
+            (filename, settings, json.dumps(sections)),
+        )
+
+    def prune(self, keys: Iterable[str]) -> int:
+        """Forget every source not in keys (removed pages); returns how many."""
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS live (key TEXT PRIMARY KEY)")
+        self.conn.execute("DELETE FROM live")
+        self.conn.executemany("INSERT OR IGNORE INTO live VALUES (?)", ((k,) for k in keys))
+        cursor = self.conn.execute("DELETE FROM sections WHERE key NOT IN (SELECT key FROM live)")
+        return cursor.rowcount
+
+    def clear(self) -> None:
+        """Drop every cached section and document."""
+        self.conn.execute("DELETE FROM sections")
+        self.conn.execute("DELETE FROM documents")
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+
+# A scan result: (key, source hash, stamp, block keys or None)
+ScanResult = Tuple[str, str, Optional[str], Optional[Set[str]]]
+
+
+@METRICS.timed('combine.incremental')
+def combine_cached(
+    keys: List[str],
+    output_dir: Path,
+    categories: List[dict],
+    settings: dict,
+    scan: Callable[[List[str], bool], Iterable[ScanResult]],
+    render: Callable[[List[str], Optional[Set[str]]], Iterable[CachedSection]],
+    stamps: Optional[Dict[str, str]] = None,
+    deduplicator: Optional[Deduplicator] = None,
+    full: bool = False,
+    skip_empty: bool = False,
+) -> Dict[str, int]:
+    """
+    Build combined documents, reusing every cached section that is still valid.
+
+    Args:
+        keys: Source keys (filenames or URLs) in output order; with
+            deduplication the first of two duplicates is kept
+        output_dir: Directory of the combined documents and the cache
+        categories: The site's categories (name, filename, title, description)
+        settings: Everything besides the source that affects rendering
+        scan: Called with the keys to (re)scan and whether block keys are
+            needed; yields ScanResults
+        render: Called with the keys to render and the boilerplate blocks to
+            strip; yields CachedSections, skipping sources that failed
+        stamps: Cheap change markers (e.g. file_stamp) by key; sources whose
+            stamp is unchanged are not scanned. Without stamps every source
+            is scanned.
+        deduplicator: Drop duplicates and strip boilerplate with this
+        full: Ignore the cache and rebuild everything
+        skip_empty: Do not write documents without sections
+
+    Returns:
+        The number of sections in each category's document
+    """
+    output_dir = Path(output_dir)
+    cache = SectionCache.for_directory(output_dir)
+    try:
+        if full:
+            cache.clear()
+        need_blocks = deduplicator is not None
+
+        # 1. Find changed sources: by stamp where there is one, else by hash
+        states = cache.states()
+        to_scan = [
+            key for key in keys
+            if stamps is None
+            or key not in states
+            or states[key].stamp != stamps.get(key)
+            or (need_blocks and not states[key].has_block_keys)
+        ]
+        with METRICS.span('combine.scan'):
+            for key, source_hash, stamp, block_keys in scan(to_scan, need_blocks):
+                cache.put_source(key, source_hash, stamp, block_keys)
+
+        # 2. Boilerplate is learned from the cached block keys of every source
+        boilerplate = None
+        if deduplicator:
+            with METRICS.span('combine.boilerplate'):
+                boilerplate = deduplicator.learn_boilerplate(cache.iter_block_keys(keys))
+
+        render_settings = settings_key(settings=settings, boilerplate=boilerplate)
+
+        # 3. Render the sources whose hash or settings changed
+        states = cache.states()
+        dirty = [key for key in keys if key in states and states[key].settings != render_settings]
+        for entry in render(dirty, boilerplate):
+            cache.put_section(entry, render_settings)
+            METRICS.incr('sections_rendered')
+        cache.commit()
+        print(f"Sections: {len(keys) - len(dirty)} cached, {len(dirty)} rendered")
+
+        # 4. Assign sections to documents in source order
+        rendered = cache.rendered(render_settings)
+        states = cache.states()
+        members: Dict[str, list] = {c['name']: [] for c in categories}
+        for key in keys:
+            if key not in rendered:
+                continue
+            category, source_url, fp = rendered[key]
+            if deduplicator and fp and deduplicator.check(source_url or key, fp):
+                METRICS.incr('duplicates_dropped')
+                continue
+            if category not in members:
+                print(f"Warning: {key} matched unknown category '{category}', skipping")
+                continue
+            members[category].append([key, states[key].source_hash])
+
+        # 5. Rebuild only the documents whose sections changed
+        for c in categories:
+            path = output_dir / c['filename']
+            doc_settings = settings_key(
+                sections=render_settings, title=c['title'], description=c['description']
+            )
+            sections = members[c['name']]
+            if skip_empty and not sections:
+                continue
+            if (path.exists() and index_path(path).exists()
+                    and cache.document(c['filename']) == (doc_settings, sections)):
+                print(f"= Unchanged: {c['filename']}")
+                continue
+            with METRICS.span('combine.write'):
+                with CombinedDocumentWriter(path, c['title'], c['description']) as writer:
+                    for key, _ in sections:
+                        writer.write_section(cache.section_text(key), rendered[key][1], c['name'])
+                        METRICS.incr('sections_written')
+            cache.set_document(c['filename'], doc_settings, sections)
+            print(f"✓ Created {c['filename']} with {len(sections)} sections")
+
+        cache.prune(keys)
+        cache.commit()
+        return {name: len(sections) for name, sections in members.items()}
+    finally:
+        cache.close()
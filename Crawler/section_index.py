@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Section offset index of combined documents, and a memory-mapped reader.
+
+Finding one section in a combined document otherwise means reading the whole
+file and scanning it for the section's heading. That is also ambiguous,
+because pages contain `##` headings of their own. When a combined document is
+written, a sidecar file next to it records every section: its title, source
+URL and category, its byte offset and length in the document, and the
+SHA-256 of those bytes:
+
+    combined_docs/01_getting_started.md
+    combined_docs/01_getting_started.sections.json
+
+CombinedDocument memory-maps the document and looks sections up in the
+sidecar by title, source URL or position. The sections come back as
+memoryview slices of the mapping, without copying. A lookup costs the same
+however large the document is, and the OS pages in only the bytes that are
+read.
+
+A section's bytes run from its `## ` heading through its closing `---`
+separator line.
+
+Usage:
+    python3 section_index.py combined_docs/01_getting_started.md --list
+    python3 section_index.py combined_docs/01_getting_started.md --title "Quick Start"
+    python3 section_index.py combined_docs/02_tutorials.md --url https://archive.org/developers/tutorial.html
+    python3 section_index.py combined_docs/02_tutorials.md --position 0
+"""
+
+import hashlib
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from page_writer import write_atomic
+
+INDEX_SUFFIX = '.sections.json'
+INDEX_VERSION = 1
+
+
+class SectionEntry(NamedTuple):
+    """Where one section is stored in a combined document."""
+
+    position: int
+    title: str
+    source_url: str
+    category: str
+    offset: int
+    length: int
+    sha256: str
+
+
+def index_path(document: Path) -> Path:
+    """Sidecar index of a combined document: 01_x.md -> 01_x.sections.json."""
+    document = Path(document)
+    return document.with_name(document.stem + INDEX_SUFFIX)
+
+
+def section_title(text: str) -> str:
+    """Title of a rendered section, from its `## ` heading."""
+    heading = text.lstrip('\n').split('\n', 1)[0]
+    return heading[3:].strip() if heading.startswith('## ') else heading.strip()
+
+
+def write_index(document: Path, size: int, sections: List[dict]) -> None:
+    """
+    Write the sidecar index of a combined document.
+
+    Args:
+        document: The combined document
+        size: Its size in bytes, used to detect a stale index
+        sections: title, source_url, category, offset, length and sha256 of
+            every section, in document order
+    """
+    data = {
+        'version': INDEX_VERSION,
+        'document': Path(document).name,
+        'size': size,
+        'sections': sections,
+    }
+    write_atomic(index_path(document), json.dumps(data, ensure_ascii=False).encode('utf-8'), fsync=False)
+
+
+class CombinedDocument:
+    """
+    A combined document, memory-mapped, with random access to its sections.
+
+    The memoryviews returned by read() point into the mapping. Release them
+    (or copy them with bytes()) before closing the document.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Raises:
+            FileNotFoundError: If the document or its index does not exist
+            ValueError: If the index is unreadable or does not match the
+                document, e.g. the document was written without one
+        """
+        self.path = Path(path)
+        self.index_path = index_path(self.path)
+        try:
+            data = json.loads(self.index_path.read_text(encoding='utf-8'))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Unreadable section index {self.index_path}: {e}")
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported section index version in {self.index_path}")
+
+        with self.path.open('rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size != data.get('size'):
+                raise ValueError(f"Section index {self.index_path} is out of date; combine the documents again")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._view = memoryview(self._mmap) if self._mmap is not None else memoryview(b'')
+
+        self.sections = [SectionEntry(position=i, **entry) for i, entry in enumerate(data['sections'])]
+        # The first section wins when titles or URLs repeat
+        self._by_title: Dict[str, SectionEntry] = {}
+        self._by_url: Dict[str, SectionEntry] = {}
+        for entry in self.sections:
+            self._by_title.setdefault(entry.title, entry)
+            if entry.source_url:
+                self._by_url.setdefault(entry.source_url, entry)
+
+    def __len__(self) -> int:
+        return len(self.sections)
+
+    def __iter__(self) -> Iterator[SectionEntry]:
+        return iter(self.sections)
+
+    def entry(self, position: int) -> SectionEntry:
+        """The section at a position (0-based; negative counts from the end)."""
+        return self.sections[position]
+
+    def find_title(self, title: str) -> Optional[SectionEntry]:
+        """The first section with a title."""
+        return self._by_title.get(title)
+
+    def find_url(self, url: str) -> Optional[SectionEntry]:
+        """The section rendered from a source URL."""
+        return self._by_url.get(url)
+
+    def read(self, entry: SectionEntry) -> memoryview:
+        """A section's bytes, as a view into the mapped document."""
+        return self._view[entry.offset:entry.offset + entry.length]
+
+    def text(self, entry: SectionEntry) -> str:
+        """A section decoded as text."""
+        return str(self.read(entry), 'utf-8')
+
+    def verify(self, entry: SectionEntry) -> bool:
+        """True if a section's bytes still match the hash in the index."""
+        return hashlib.sha256(self.read(entry)).hexdigest() == entry.sha256
+
+    def close(self) -> None:
+        """Unmap the document."""
+        self._view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self) -> 'CombinedDocument':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def main():
+    """Print one section, or list the sections, of a combined document."""
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Read sections of a combined document through its section index")
+    parser.add_argument('document', help='Combined document, e.g. combined_docs/01_getting_started.md')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--list', action='store_true', help='List the sections')
+    group.add_argument('--title', default=None, help='Print the first section with this title')
+    group.add_argument('--url', default=None, help='Print the section of this source URL')
+    group.add_argument('--position', type=int, default=None, help='Print the section at this position (0-based)')
+    parser.add_argument('--verify', action='store_true', help='Check every section against its hash')
+
+    args = parser.parse_args()
+    try:
+        document = CombinedDocument(Path(args.document))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        exit(1)
+
+    with document:
+        if args.list:
+            for entry in document:
+                status = ''
+                if args.verify:
+                    status = '✓ ' if document.verify(entry) else '✗ '
+                print(f"{status}{entry.position:>5} {entry.offset:>10} {entry.length:>8}  "
+                      f"{entry.category:<16} {entry.title}  {entry.source_url}")
+            return
+
+        if args.position is not None:
+            entry = document.entry(args.position) if -len(document) <= args.position < len(document) else None
+        elif args.title is not None:
+            entry = document.find_title(args.title)
+        else:
+            entry = document.find_url(args.url)
+        if entry is None:
+            print(f"Error: no such section in {args.document}")
+            exit(1)
+        if args.verify and not document.verify(entry):
+            print(f"Error: section {entry.position} does not match its hash; combine the documents again")
+            exit(1)
+        view = document.read(entry)
+        sys.stdout.buffer.write(view)
+        view.release()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Site registry for the documentation crawlers.
+
+Sites are configured in sites.toml next to this file: where to crawl, where
+to write, how to categorize pages and how to lay out the combined documents.
+"""
+
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from functools import cached_property
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
+
+from dedup import DEFAULT_BOILERPLATE_RATIO, DEFAULT_THRESHOLD, Deduplicator
+from manifest import parse_duration
+
+SITES_FILE = Path(__file__).with_name('sites.toml')
+
+CATEGORY_FIELDS = ('url', 'title', 'filename', 'content')
+# Joins the values of many pages into one string for batch matching; it
+# never occurs in keywords, so no keyword matches across two pages
+RECORD_SEPARATOR = '\x00'
+
+
+class KeywordMatcher:
+    """
+    Find which of a set of keywords occur in a text.
+
+    Results are bit masks over the keyword indexes the matcher was built
+    with, so a rule is checked with one AND against its own mask.
+    """
+
+    def __init__(self, keywords: Dict[str, int]):
+        self.keywords = [(keyword, 1 << index) for keyword, index in keywords.items()]
+
+    def match(self, text: str) -> int:
+        """Bit mask of the keywords found in a lowercased text."""
+        found = 0
+        for keyword, bit in self.keywords:
+            if keyword in text:
+                found |= bit
+        return found
+
+    def match_many(self, texts: List[str]) -> List[int]:
+        """
+        match() for many texts at once.
+
+        The texts are joined into one column and each keyword is searched
+        for across all of them, skipping to the next text after a hit, so
+        the cost grows with the column size and not with how often a
+        keyword repeats within a page.
+        """
+        starts, offset = [], 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + 1
+        starts.append(offset)
+        column = RECORD_SEPARATOR.join(texts)
+        found = [0] * len(texts)
+        for keyword, bit in self.keywords:
+            pos = column.find(keyword)
+            while pos != -1:
+                i = bisect_right(starts, pos) - 1
+                found[i] |= bit
+                pos = column.find(keyword, starts[i + 1])
+        return found
+
+
+class Categorizer:
+    """
+    Assign pages to categories using keyword rules from sites.toml.
+
+    By default rules are checked in order and the first one with a keyword
+    in one of its fields (and none of its exclude keywords) wins. If any
+    rule has a weight, every matching rule instead adds its weight (default
+    1) to its category and the highest total wins, ties going to the
+    category whose rule comes first.
+    """
+
+    def __init__(self, rules: List[dict], default: str, content_chars: int = 500):
+        self.default = default
+        self.content_chars = content_chars
+        self.weighted = any('weight' in rule for rule in rules)
+
+        keywords: Dict[str, int] = {}
+        field_keywords: Dict[str, set] = {f: set() for f in CATEGORY_FIELDS}
+
+        def mask(words: List[str], fields: Tuple[str, ...]) -> int:
+            bits = 0
+            for word in words:
+                word = word.lower()
+                if not word or RECORD_SEPARATOR in word:
+                    continue
+                bits |= 1 << keywords.setdefault(word, len(keywords))
+                for f in fields:
+                    field_keywords[f].add(word)
+            return bits
+
+        self.rules = []
+        for rule in rules:
+            fields = tuple(rule.get('fields', CATEGORY_FIELDS))
+            unknown = set(fields) - set(CATEGORY_FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown category rule fields: {sorted(unknown)}")
+            self.rules.append((
+                rule['category'],
+                fields,
+                mask(rule.get('keywords', []), fields),
+                mask(rule.get('exclude', []), fields),
+                float(rule.get('weight', 1)),
+            ))
+
+        # One matcher per field, over just the keywords of rules using it
+        self.matchers = {
+            f: KeywordMatcher({k: keywords[k] for k in words})
+            for f, words in field_keywords.items() if words
+        }
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        """Fields any rule looks at."""
+        return tuple(f for f in CATEGORY_FIELDS if f in self.matchers)
+
+    @property
+    def needs_content(self) -> bool:
+        """True if any rule looks at page content (not just metadata)."""
+        return 'content' in self.matchers
+
+    def _prepare(self, field_name: str, value: str) -> str:
+        # Only the head of the body is ever checked, so only lowercase that
+        if field_name == 'content':
+            value = value[:self.content_chars]
+        return value.lower()
+
+    def _decide(self, found: Dict[str, int]) -> str:
+        best, best_score = self.default, 0.0
+        scores: Dict[str, float] = {}
+        for category, fields, keywords, exclude, weight in self.rules:
+            hay = 0
+            for f in fields:
+                hay |= found.get(f, 0)
+            if hay & keywords and not hay & exclude:
+                if not self.weighted:
+                    return category
+                scores[category] = scores.get(category, 0.0) + weight
+                # Only a strictly higher total displaces an earlier rule
+                if scores[category] > best_score:
+                    best, best_score = category, scores[category]
+        return best
+
+    def categorize(self, url: str = '', title: str = '', filename: str = '', content: str = '') -> str:
+        """Return the category of a page."""
+        values = {'url': url, 'title': title, 'filename': filename, 'content': content}
+        found = {
+            f: matcher.match(self._prepare(f, values[f]))
+            for f, matcher in self.matchers.items()
+        }
+        return self._decide(found)
+
+    def categorize_many(self, pages: Iterable[dict]) -> List[str]:
+        """
+        Categorize many pages in one pass per field.
+
+        Args:
+            pages: Dicts with any of the keys url, title, filename and content
+
+        Returns:
+            The category of every page, in order
+        """
+        pages = list(pages)
+        columns = {
+            f: matcher.match_many([self._prepare(f, page.get(f) or '') for page in pages])
+            for f, matcher in self.matchers.items()
+        }
+        return [
+            self._decide({f: column[i] for f, column in columns.items()})
+            for i in range(len(pages))
+        ]
+
+
+@dataclass
+class SiteConfig:
+    """One documentation site from sites.toml."""
+
+    name: str
+    base_url: str
+    output_dir: str
+    index_title: Optional[str] = None
+    write_index: bool = True
+    combiner: str = 'clanker'
+    combine_dir: Optional[str] = None
+    default_category: str = 'other'
+    content_chars: int = 500
+    limit: Optional[int] = None
+    include_paths: List[str] = field(default_factory=list)
+    exclude_paths: List[str] = field(default_factory=list)
+    max_depth: Optional[int] = None
+    layout: str = 'flat'
+    chunk_tokens: Optional[int] = None
+    dedup: bool = False
+    duplicate_threshold: float = DEFAULT_THRESHOLD
+    boilerplate_ratio: float = DEFAULT_BOILERPLATE_RATIO
+    schedule: Optional[str] = None
+    categories: List[dict] = field(default_factory=list)
+    rules: List[dict] = field(default_factory=list)
+
+    @cached_property
+    def categorizer(self) -> Categorizer:
+        """The site's compiled categorization rules."""
+        return Categorizer(self.rules, self.default_category, self.content_chars)
+
+    @property
+    def deduplicator(self) -> Deduplicator:
+        """A fresh duplicate filter with this site's settings."""
+        return Deduplicator(self.duplicate_threshold, self.boilerplate_ratio)
+
+    @property
+    def combined_dir(self) -> Path:
+        return Path(self.combine_dir) if self.combine_dir else Path(self.output_dir) / 'combined'
+
+
+def load_sites(path: Optional[Path] = None) -> Dict[str, SiteConfig]:
+    """Load every site from the registry file."""
+    path = Path(path) if path else SITES_FILE
+    with path.open('rb') as f:
+        data = tomllib.load(f)
+
+    sites = {}
+    for name, options in data.get('sites', {}).items():
+        try:
+            site = SiteConfig(name=name, **options)
+        except TypeError as e:
+            raise ValueError(f"Invalid configuration for site '{name}' in {path}: {e}")
+        names = {c['name'] for c in site.categories}
+        unknown = ({r['category'] for r in site.rules} | {site.default_category}) - names
+        if names and unknown:
+            raise ValueError(f"Site '{name}' in {path} has rules for unknown categories: {sorted(unknown)}")
+        if site.schedule is not None and not parse_duration(site.schedule):
+            raise ValueError(f"Site '{name}' in {path} has an invalid schedule: {site.schedule!r} (use e.g. 6h or 1d)")
+        sites[name] = site
+    return sites
+
+
+def get_site(name: str, path: Optional[Path] = None) -> SiteConfig:
+    """Load a single site by name."""
+    sites = load_sites(path)
+    if name not in sites:
+        raise KeyError(f"Unknown site '{name}'. Known sites: {', '.join(sorted(sites))}")
+    return sites[name]
@@ -0,0 +1,86 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from base_crawler import BaseDocsCrawler
+from ratelimit import HostRateLimiter
+from scrape_engine import ScrapeEngine
+
+
+class DocsHandler(BaseHTTPRequestHandler):
+    """A docs site whose pages never change: every page has a fixed ETag."""
+
+    def do_HEAD(self):
+        etag = f'"{self.path}-v1"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+        else:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+        self.send_header('ETag', etag)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class FailingClient:
+    """Firecrawl client that fails the test if a page is scraped."""
+
+    api_url = 'http://firecrawl.test'
+
+    def __init__(self):
+        self.scraped = []
+
+    def scrape_url(self, url, params=None):
+        self.scraped.append(url)
+        raise AssertionError(f"{url} was re-scraped")
+
+
+@pytest.fixture
+def docs_site():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), DocsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def _crawler(base_url, output_dir, **options):
+    return BaseDocsCrawler(
+        base_url=base_url,
+        output_dir=str(output_dir),
+        api_key='test-key',
+        rate_limiter=HostRateLimiter(rate=1000.0),
+        write_index=False,
+        fsync=False,
+        **options,
+    )
+
+
+def test_changed_only_after_a_full_crawl_scrapes_nothing(docs_site, tmp_path, monkeypatch):
+    urls = [f"{docs_site}guide/page-{i}.html" for i in range(5)]
+
+    def scrape(self, url):
+        return {'markdown': f"# Page\n\nContent of {url}\n", 'metadata': {'sourceURL': url, 'title': 'Page'}}
+
+    monkeypatch.setattr(ScrapeEngine, 'scrape', scrape)
+    crawler = _crawler(docs_site, tmp_path, api_url='http://firecrawl.test')
+    try:
+        assert len(crawler._scrape_urls(urls)) == len(urls)
+        assert all(crawler.manifest.get(url).get('etag') for url in urls)
+    finally:
+        crawler.close()
+
+    client = FailingClient()
+    crawler = _crawler(docs_site, tmp_path, client=client)
+    try:
+        crawler.crawl_changed()
+    finally:
+        crawler.close()
+
+    assert client.scraped == []
+    assert crawler.unchanged == len(urls)
+    assert crawler.failed_urls == []
@@ -0,0 +1,39 @@
+import pytest
+
+from chunker import chunk_document, estimate_tokens
+
+
+def _document(paragraphs: int) -> str:
+    words = ' '.join(['endpoint', 'request', 'archive', 'item', 'metadata'] * 16)
+    body = '\n\n'.join(f"{i} {words}" for i in range(paragraphs))
+    return (
+        "# Reference\n\n"
+        "## Items API With A Fairly Long Page Title\n\n"
+        "*Source: https://docs.example.com/reference/items-api-with-a-long-url.html*\n\n"
+        "Introduction.\n\n"
+        f"{body}\n\n"
+        "### Errors\n\n"
+        f"{body}\n\n"
+        "---\n\n"
+    )
+
+
+@pytest.mark.parametrize('max_tokens', [100, 300, 500, 1000])
+def test_every_part_fits_the_budget(max_tokens):
+    text = _document(60)
+    assert estimate_tokens(text) > 5 * max_tokens
+
+    chunks = chunk_document(text, 'Reference', max_tokens, estimate_tokens)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert estimate_tokens(chunk.text) <= max_tokens
+        assert chunk.tokens <= max_tokens
+
+
+def test_continued_parts_repeat_the_page_heading():
+    chunks = chunk_document(_document(60), 'Reference', 300, estimate_tokens)
+
+    for chunk in chunks[1:]:
+        assert "## Items API With A Fairly Long Page Title (continued)" in chunk.text
+        assert "*Source: https://docs.example.com/reference/items-api-with-a-long-url.html*" in chunk.text
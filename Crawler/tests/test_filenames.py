@@ -0,0 +1,64 @@
+from base_crawler import BaseDocsCrawler
+from metrics import METRICS
+from ratelimit import HostRateLimiter
+
+
+def _crawler(tmp_path, layout):
+    return BaseDocsCrawler(
+        base_url='https://docs.example.com/',
+        output_dir=str(tmp_path / 'docs'),
+        api_key='test-key',
+        api_url='http://firecrawl.test',
+        rate_limiter=HostRateLimiter(rate=1000.0),
+        write_index=False,
+        fsync=False,
+        layout=layout,
+    )
+
+
+def _collisions() -> float:
+    return METRICS.counters.get('filename_collisions', 0)
+
+
+def test_flat_collision_in_one_batch_is_reported(tmp_path, capsys):
+    crawler = _crawler(tmp_path, 'flat')
+    before = _collisions()
+    try:
+        # Both are queued before either write finishes, so the catalog knows neither
+        assert crawler.save_markdown('https://docs.example.com/a/b.html', 'first')
+        assert crawler.save_markdown('https://docs.example.com/a_b.html', 'second')
+    finally:
+        crawler.close()
+
+    assert _collisions() == before + 1
+    assert 'are both saved as a_b.md' in capsys.readouterr().out
+
+
+def test_sharded_collision_in_one_batch_keeps_both_pages(tmp_path, monkeypatch):
+    # Force the short names to collide
+    monkeypatch.setattr('base_crawler.page_filename', lambda url, layout: 'ab/page-abcdef.md')
+    crawler = _crawler(tmp_path, 'sharded')
+    try:
+        crawler.save_markdown('https://docs.example.com/one.html', 'first')
+        crawler.save_markdown('https://docs.example.com/two.html', 'second')
+        crawler._flush_writes()
+        names = {crawler.manifest.get(url)['filename'] for url in (
+            'https://docs.example.com/one.html', 'https://docs.example.com/two.html')}
+    finally:
+        crawler.close()
+
+    assert len(names) == 2
+    for name in names:
+        assert (tmp_path / 'docs' / name).exists()
+
+
+def test_same_url_saved_twice_is_not_a_collision(tmp_path):
+    crawler = _crawler(tmp_path, 'flat')
+    before = _collisions()
+    try:
+        crawler.save_markdown('https://docs.example.com/a/b.html', 'first')
+        crawler.save_markdown('https://docs.example.com/a/b.html', 'second')
+    finally:
+        crawler.close()
+
+    assert _collisions() == before
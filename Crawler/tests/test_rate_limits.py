@@ -0,0 +1,67 @@
+from base_crawler import BaseDocsCrawler
+from ratelimit import HostRateLimiter
+from scrape_engine import ScrapeEngine
+
+API_URL = 'http://firecrawl.test:3002'
+
+
+class RecordingLimiter(HostRateLimiter):
+    """HostRateLimiter that records which host every bucket is taken for."""
+
+    def __init__(self, rate: float):
+        super().__init__(rate)
+        self.hosts = []
+
+    def bucket(self, host: str):
+        self.hosts.append(host)
+        return super().bucket(host)
+
+
+def _crawler(tmp_path, limiter):
+    return BaseDocsCrawler(
+        base_url='https://docs.example.com/',
+        output_dir=str(tmp_path / 'docs'),
+        api_key='test-key',
+        api_url=API_URL,
+        rate_limiter=limiter,
+        write_index=False,
+        fsync=False,
+    )
+
+
+def test_concurrent_scrapes_and_crawl_jobs_share_the_api_bucket(tmp_path, monkeypatch):
+    def scrape(self, url):
+        return {'markdown': f"# {url}\n", 'metadata': {'sourceURL': url, 'title': url}}
+
+    monkeypatch.setattr(ScrapeEngine, 'scrape', scrape)
+    limiter = RecordingLimiter(rate=1000.0)
+    crawler = _crawler(tmp_path, limiter)
+    try:
+        crawler._submit_with_retry(lambda params: {'id': 'job'}, {})
+        saved = crawler._scrape_urls([
+            'https://docs.example.com/a.html',
+            'https://other.example.org/b.html',
+        ])
+    finally:
+        crawler.close()
+
+    assert len(saved) == 2
+    # One crawl job call and two scrapes; the docs hosts are only probed for validators
+    assert limiter.hosts.count('firecrawl.test:3002') == 3
+
+
+def test_engine_rate_limits_consume_the_crawler_bucket(tmp_path, monkeypatch):
+    def scrape(self, url):
+        return {'markdown': 'text', 'metadata': {'sourceURL': url}}
+
+    monkeypatch.setattr(ScrapeEngine, 'scrape', scrape)
+    limiter = HostRateLimiter(rate=1.0, capacity=10.0)
+    crawler = _crawler(tmp_path, limiter)
+    try:
+        bucket = crawler._api_bucket()
+        crawler._scrape_urls([f'https://docs.example.com/{i}.html' for i in range(4)])
+        bucket.reserve(0)
+        # Four scrapes took four of the ten tokens, give or take the refill since
+        assert bucket._tokens < 7.0
+    finally:
+        crawler.close()
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Durable work queue for crawling one site with several worker processes.
+
+A coordinator plans the crawl and puts the URLs to scrape into
+`.work_queue.sqlite` in the output directory. Worker processes, on this
+machine or on others sharing the directory, claim batches of URLs by
+leasing them, scrape them and save the pages into the output directory.
+Each worker keeps its own manifest, catalog and search index under
+`.workers/<worker id>/`, which the coordinator merges into the directory's
+own once the queue is drained.
+
+A lease expires unless its worker keeps renewing it, so the URLs of a worker
+that dies are claimed again by the others. A URL that fails max_attempts
+times is marked failed.
+
+The queue uses SQLite's rollback journal rather than WAL, which needs shared
+memory and does not work on network filesystems.
+
+Usage:
+    python3 work_queue.py archive_docs status
+    python3 work_queue.py archive_docs retry-failed
+    python3 work_queue.py archive_docs clear
+"""
+
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from metrics import METRICS
+
+QUEUE_FILENAME = '.work_queue.sqlite'
+WORKERS_DIRNAME = '.workers'
+DEFAULT_LEASE = 300.0
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    url TEXT PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'pending',
+    fields TEXT,
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, lease_expires);
+CREATE INDEX IF NOT EXISTS tasks_worker ON tasks (worker);
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    host TEXT,
+    pid INTEGER,
+    started_at REAL,
+    seen_at REAL,
+    stopped_at REAL,
+    lease REAL,
+    done INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class Task(NamedTuple):
+    """One leased URL."""
+
+    url: str
+    fields: dict
+    attempts: int
+
+
+def default_worker_id() -> str:
+    """Worker ID unique across the machines sharing a queue."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def worker_state_dir(output_dir: Path, worker: str) -> Path:
+    """Where a worker keeps its manifest, catalog and search index."""
+    return Path(output_dir) / WORKERS_DIRNAME / worker
+
+
+class WorkQueue:
+    """URLs to scrape, leased to worker processes."""
+
+    def __init__(self, path: Path, lease_seconds: float = DEFAULT_LEASE, max_attempts: int = MAX_ATTEMPTS):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # Transactions are explicit; BEGIN IMMEDIATE takes the write lock up
+        # front so two workers never claim the same rows
+        self.conn = sqlite3.connect(
+            str(self.path), timeout=60, isolation_level=None, check_same_thread=False,
+        )
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=DELETE')
+        self.conn.executescript(SCHEMA)
+
+    @classmethod
+    def for_directory(cls, output_dir: Path, **options) -> 'WorkQueue':
+        """Open the queue of a crawler output directory."""
+        return cls(Path(output_dir) / QUEUE_FILENAME, **options)
+
+    def _transaction(self, statements) -> List[sqlite3.Row]:
+        """Run (sql, params) pairs in one write transaction; returns the rows of the first."""
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = None
+                for sql, params in statements:
+                    result = self.conn.execute(sql, params).fetchall()
+                    if rows is None:
+                        rows = result
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+        return rows or []
+
+    def enqueue(self, urls: Iterable[str], fields: Optional[Dict[str, dict]] = None) -> int:
+        """
+        Add URLs to scrape.
+
+        URLs already pending or leased are left alone; finished or failed
+        ones are queued again.
+
+        Returns:
+            Number of URLs queued
+        """
+        fields = fields or {}
+        now = time.time()
+        rows = [(url, json.dumps(fields[url]) if url in fields else None, now) for url in urls]
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                before = self.conn.total_changes
+                self.conn.executemany(
+                    "INSERT INTO tasks (url, fields, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(url) DO UPDATE SET state = 'pending', fields = excluded.fields, "
+                    "worker = NULL, lease_expires = NULL, attempts = 0, error = NULL, "
+                    "updated_at = excluded.updated_at "
+                    "WHERE tasks.state IN ('done', 'failed')",
+                    rows,
+                )
+                queued = self.conn.total_changes - before
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+        return queued
+
+    def claim(self, worker: str, limit: int) -> List[Task]:
+        """
+        Lease up to `limit` URLs to a worker.
+
+        Pending URLs come first, then URLs whose lease expired (their worker
+        died or hung). Expired URLs that already used all their attempts are
+        marked failed instead.
+        """
+        now = time.time()
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.execute(
+                    "UPDATE tasks SET state = 'failed', error = 'lease expired', worker = NULL, updated_at = ? "
+                    "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                    (now, now, self.max_attempts),
+                )
+                rows = self.conn.execute(
+                    "SELECT url, fields, attempts, state FROM tasks "
+                    "WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?) "
+                    "ORDER BY state = 'leased', rowid LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                self.conn.executemany(
+                    "UPDATE tasks SET state = 'leased', worker = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated_at = ? WHERE url = ?",
+                    [(worker, now + self.lease_seconds, now, row['url']) for row in rows],
+                )
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+        requeued = sum(1 for row in rows if row['state'] == 'leased')
+        METRICS.incr('queue_claimed', len(rows))
+        if requeued:
+            METRICS.incr('queue_requeued', requeued)
+            print(f"  Reclaimed {requeued} URLs whose lease expired")
+        return [Task(row['url'], json.loads(row['fields']) if row['fields'] else {}, row['attempts'] + 1)
+                for row in rows]
+
+    def heartbeat(self, worker: str) -> None:
+        """Renew every lease a worker holds and mark it alive."""
+        now = time.time()
+        self._transaction([
+            ("UPDATE tasks SET lease_expires = ? WHERE worker = ? AND state = 'leased'",
+             (now + self.lease_seconds, worker)),
+            ("UPDATE workers SET seen_at = ? WHERE worker = ?", (now, worker)),
+        ])
+
+    def complete(self, worker: str, urls: List[str]) -> None:
+        """Mark URLs a worker scraped as done."""
+        now = time.time()
+        self._transaction([
+            ("UPDATE workers SET done = done + ?, seen_at = ? WHERE worker = ?", (len(urls), now, worker)),
+        ] + [
+            ("UPDATE tasks SET state = 'done', lease_expires = NULL, error = NULL, updated_at = ? "
+             "WHERE url = ? AND worker = ?", (now, url, worker))
+            for url in urls
+        ])
+
+    def fail(self, worker: str, urls: List[str], error: str) -> None:
+        """Give URLs back for another attempt, or mark them failed after max_attempts."""
+        now = time.time()
+        self._transaction([
+            ("UPDATE workers SET failed = failed + ?, seen_at = ? WHERE worker = ?", (len(urls), now, worker)),
+        ] + [
+            ("UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+             "worker = NULL, lease_expires = NULL, error = ?, updated_at = ? WHERE url = ? AND worker = ?",
+             (self.max_attempts, error, now, url, worker))
+            for url in urls
+        ])
+
+    def release(self, worker: str) -> None:
+        """Hand a stopping worker's leases back without counting the attempt."""
+        self._transaction([
+            ("UPDATE tasks SET state = 'pending', worker = NULL, lease_expires = NULL, "
+             "attempts = MAX(attempts - 1, 0), updated_at = ? WHERE worker = ? AND state = 'leased'",
+             (time.time(), worker)),
+        ])
+
+    def register_worker(self, worker: str) -> None:
+        now = time.time()
+        self._transaction([
+            ("INSERT INTO workers (worker, host, pid, started_at, seen_at, lease) VALUES (?, ?, ?, ?, ?, ?) "
+             "ON CONFLICT(worker) DO UPDATE SET seen_at = excluded.seen_at, stopped_at = NULL, "
+             "lease = excluded.lease",
+             (worker, socket.gethostname(), os.getpid(), now, now, self.lease_seconds)),
+        ])
+
+    def stop_worker(self, worker: str) -> None:
+        now = time.time()
+        self._transaction([
+            ("UPDATE workers SET stopped_at = ?, seen_at = ? WHERE worker = ?", (now, now, worker)),
+        ])
+
+    def _query(self, sql: str, params: Iterable = ()) -> List[dict]:
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(sql, tuple(params))]
+
+    def counts(self) -> Dict[str, int]:
+        """Number of URLs per state (pending, leased, done, failed)."""
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        for row in self._query("SELECT state, COUNT(*) AS n FROM tasks GROUP BY state"):
+            counts[row['state']] = row['n']
+        return counts
+
+    def drained(self) -> bool:
+        """True once no URL is pending or leased."""
+        counts = self.counts()
+        return not counts['pending'] and not counts['leased']
+
+    def failed(self) -> List[dict]:
+        return self._query("SELECT url, attempts, error FROM tasks WHERE state = 'failed' ORDER BY url")
+
+    def workers(self) -> List[dict]:
+        return self._query("SELECT * FROM workers ORDER BY started_at")
+
+    def is_gone(self, worker: dict) -> bool:
+        """True if a worker stopped, or stopped renewing its leases."""
+        lease = worker['lease'] or self.lease_seconds
+        return bool(worker['stopped_at']) or time.time() - (worker['seen_at'] or 0) > lease
+
+    def live_workers(self) -> List[dict]:
+        return [w for w in self.workers() if not self.is_gone(w)]
+
+    def retry_failed(self) -> int:
+        """Queue failed URLs again."""
+        rows = self._transaction([
+            ("SELECT COUNT(*) FROM tasks WHERE state = 'failed'", ()),
+            ("UPDATE tasks SET state = 'pending', attempts = 0, error = NULL, updated_at = ? "
+             "WHERE state = 'failed'", (time.time(),)),
+        ])
+        return rows[0][0]
+
+    def clear(self) -> None:
+        """Drop every task and worker."""
+        self._transaction([("DELETE FROM tasks", ()), ("DELETE FROM workers", ())])
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class LeaseKeeper:
+    """Background thread renewing a worker's leases while it scrapes."""
+
+    def __init__(self, queue: WorkQueue, worker: str):
+        self.queue = queue
+        self.worker = worker
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'lease-{worker}', daemon=True)
+
+    def _run(self) -> None:
+        # Renew well before expiry so a busy filesystem cannot cost the lease
+        interval = max(1.0, self.queue.lease_seconds / 3)
+        while not self._stop.wait(interval):
+            try:
+                self.queue.heartbeat(self.worker)
+            except sqlite3.Error as e:
+                print(f"  Warning: could not renew leases ({e})")
+
+    def __enter__(self) -> 'LeaseKeeper':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def worker_dirs(output_dir: Path) -> List[Path]:
+    """State directories of the workers that crawled into an output directory."""
+    root = Path(output_dir) / WORKERS_DIRNAME
+    if not root.is_dir():
+        return []
+    return sorted(p for p in root.iterdir() if p.is_dir())
+
+
+def remove_worker_dir(path: Path) -> None:
+    shutil.rmtree(path, ignore_errors=True)
+    try:
+        path.parent.rmdir()
+    except OSError:
+        # Other workers' directories are still there
+        pass
+
+
+def main():
+    """Inspect or reset the work queue of an output directory."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect the work queue of a crawler output directory")
+    parser.add_argument('output_dir', help='Crawler output directory (e.g. archive_docs)')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('status', help='URLs per state and the workers')
+    sub.add_parser('failed', help='List the URLs that failed')
+    sub.add_parser('retry-failed', help='Queue the failed URLs again')
+    sub.add_parser('clear', help='Drop every task and worker')
+
+    args = parser.parse_args()
+    path = Path(args.output_dir) / QUEUE_FILENAME
+    if not path.exists():
+        print(f"Error: no work queue in {args.output_dir}")
+        exit(1)
+
+    queue = WorkQueue(path)
+    try:
+        if args.command == 'status':
+            for state, n in queue.counts().items():
+                print(f"{state:<10} {n:>8}")
+            print()
+            for w in queue.workers():
+                seen = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(w['seen_at']))
+                status = 'stopped' if w['stopped_at'] else ('gone' if queue.is_gone(w) else 'running')
+                print(f"{w['worker']:<32} {status:<8} {w['done']:>7} done {w['failed']:>5} failed  seen {seen}")
+        elif args.command == 'failed':
+            rows = queue.failed()
+            for row in rows:
+                print(f"{row['attempts']:>2}x  {row['url']}  ({row['error']})")
+            print(f"\n{len(rows)} URL(s)")
+        elif args.command == 'retry-failed':
+            print(f"Queued {queue.retry_failed()} failed URLs again")
+        elif args.command == 'clear':
+            queue.clear()
+            print(f"Cleared {path}")
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()